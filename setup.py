@@ -23,6 +23,7 @@ INSTALL_REQUIRES = [
     "humanfriendly==6.1",
     "jsonschema_serialize_fork==2.1.1",
     "loremipsum==1.0.5",
+    "openpyxl==3.0.9",
     "passlib==1.7.2",
     "psutil==5.6.7",
     "psycopg2==2.8.4",
@@ -87,15 +88,19 @@ setup(
         es-index-listener = snovault.elasticsearch.es_index_listener:main
 
         add-date-created = encoded.commands.add_date_created:main
+        benchmark-s3-signer = encoded.commands.benchmark_s3_signer:main
         check-rendering = encoded.commands.check_rendering:main
         deploy = encoded.commands.deploy:main
         extract_test_data = encoded.commands.extract_test_data:main
         es-index-data = encoded.commands.es_index_data:main
         generate-ontology = encoded.commands.generate_ontology:main
+        build-ontology-store = encoded.ontology_store:main
         import-data = encoded.commands.import_data:main
         jsonld-rdf = encoded.commands.jsonld_rdf:main
         migrate-files-aws = encoded.commands.migrate_files_aws:main
         profile = encoded.commands.profile:main
+        replay-benchmark = encoded.commands.replay_benchmark:main
+        upgrade-stale = encoded.commands.upgrade_stale:main
         spreadsheet-to-json = encoded.commands.spreadsheet_to_json:main
         migrate-attachments-aws = encoded.commands.migrate_attachments_aws:main
         migrate-dataset-type = encoded.commands.migrate_dataset_type:main
@@ -28,6 +28,7 @@ from snovault.elasticsearch import (
     TimedUrllib3HttpConnection,
 )
 from snovault.json_renderer import json_renderer
+from encoded.ontology_store import load_ontology
 from elasticsearch import Elasticsearch
 STATIC_MAX_AGE = 0
 
@@ -131,15 +132,22 @@ def configure_dbsession(config):
     config.registry[DBSESSION] = DBSession
 
 
-def load_workbook(app, workbook_filename, docsdir, test=False):
-    from .loadxl import load_all
+def load_workbook(app, workbook_filename, docsdir, test=False, workers=0, batchsize=100):
+    from .loadxl import (
+        load_all,
+        load_all_parallel,
+    )
     from webtest import TestApp
     environ = {
         'HTTP_ACCEPT': 'application/json',
         'REMOTE_USER': 'IMPORT',
     }
     testapp = TestApp(app, environ)
-    load_all(testapp, workbook_filename, docsdir, test=test)
+    if workers:
+        load_all_parallel(
+            testapp, workbook_filename, docsdir, test=test, workers=workers, batchsize=batchsize)
+    else:
+        load_all(testapp, workbook_filename, docsdir, test=test)
 
 
 def json_from_path(path, default=None):
@@ -204,7 +212,10 @@ def main(global_config, **local_config):
     settings['snovault.jsonld.terms_prefix'] = 'encode'
     settings['snovault.elasticsearch.index'] = 'snovault'
 
-    config = Configurator(settings=settings)
+    from encoded.startup_timing import STARTUP_TIMING, StartupTiming
+    timing = StartupTiming()
+    config = timing.wrap_include(Configurator(settings=settings))
+    config.registry[STARTUP_TIMING] = timing
     from snovault.elasticsearch import APP_FACTORY
     config.registry[APP_FACTORY] = main  # used by mp_indexer
     config.include(app_version)
@@ -224,21 +235,31 @@ def main(global_config, **local_config):
     config.include('.renderers')
     config.include('.authentication')
     config.include('.server_defaults')
+    config.include('.s3_signer')
     config.include('.types')
     config.include('.root')
+    config.include('.memlimit')
+    config.include('.sampling_profiler')
+    config.include('.startup_timing')
+    config.include('.sql_stats')
     # Must include before anything that uses, or imports from something that uses, cache.
     config.include('.searches.caches')
+    config.include('.searches.local_cache')
     config.include('.batch_download')
     config.include('.reports.batch_download')
     config.include('.reports.metadata')
     config.include('.visualization')
     config.include('.glossary')
+    config.include('.loadxl')
 
     if 'elasticsearch.server' in config.registry.settings:
         config.include('snovault.elasticsearch')
+        config.include('.fork_indexer')
         config.include('.vis_indexer')
         config.include('.cart_view')
         config.include('encoded.search_views')
+        config.include('encoded.searches.materialized')
+        config.include('encoded.searches.profiler')
 
     if 'snp_search.server' in config.registry.settings:
         addresses = aslist(
@@ -257,9 +278,8 @@ def main(global_config, **local_config):
     config.include(static_resources)
     config.include(changelogs)
     ontology_path = Path(__file__).resolve().parents[2] / "ontology.json"
-    config.registry['ontology'] = (
-        json_from_path(str(ontology_path)) if ontology_path.exists() else {}
-    )
+    config.registry['ontology'] = timing.time(
+        'load_ontology', load_ontology, ontology_path, settings.get('ontology_store'))
 
     if asbool(settings.get('testing', False)):
         config.include('.tests.testing_views')
@@ -271,7 +291,8 @@ def main(global_config, **local_config):
     config.include('.searches.configs')
 
 
-    app = config.make_wsgi_app()
+    timing.time('commit', config.commit)
+    app = timing.time('make_wsgi_app', config.make_wsgi_app)
 
     workbook_filename = settings.get('load_workbook', '')
     load_test_only = asbool(settings.get('load_test_only', False))
@@ -279,6 +300,14 @@ def main(global_config, **local_config):
     if docsdir is not None:
         docsdir = [path.strip() for path in docsdir.strip().split('\n')]
     if workbook_filename:
-        load_workbook(app, workbook_filename, docsdir, test=load_test_only)
+        load_workbook(
+            app, workbook_filename, docsdir, test=load_test_only,
+            workers=int(settings.get('load_workers', 0)),
+            batchsize=int(settings.get('load_batchsize', 100)),
+        )
 
+    timing.finish()
+    timing.log()
+    from encoded.fork_indexer import fork_workers
+    fork_workers(app)
     return app
@@ -1,5 +1,4 @@
 from collections import OrderedDict
-from pyramid.compat import bytes_
 from pyramid.httpexceptions import HTTPBadRequest
 from pyramid.view import view_config
 from pyramid.response import Response
@@ -119,37 +118,93 @@ def peak_metadata(context, request):
     )
 
 
-def lookup_column_value(value, path):
-    nodes = [value]
-    names = path.split('.')
-    for name in names:
-        nextnodes = []
-        for node in nodes:
-            if name not in node:
-                continue
-            value = node[name]
-            if isinstance(value, list):
-                nextnodes.extend(value)
-            else:
-                nextnodes.append(value)
-        nodes = nextnodes
-        if not nodes:
-            return ''
+def _dedupe(nodes):
+    # Ordered set; fall back to a linear scan for unhashable values.
+    try:
+        return list(dict.fromkeys(nodes))
+    except TypeError:
+        deduped_nodes = []
+        for n in nodes:
+            if n not in deduped_nodes:
+                deduped_nodes.append(n)
+        return deduped_nodes
+
+
+def _format_nodes(nodes):
     # if we ended with an embedded object, show the @id
-    if nodes and hasattr(nodes[0], '__contains__') and '@id' in nodes[0]:
+    if isinstance(nodes[0], dict) and '@id' in nodes[0]:
         nodes = [node['@id'] for node in nodes]
-    deduped_nodes = []
-    for n in nodes:
-        if isinstance(n, dict):
-            n = str(n)
-        if n not in deduped_nodes:
-            deduped_nodes.append(n)
-    return u','.join(u'{}'.format(n) for n in deduped_nodes)
+    if len(nodes) == 1:
+        node = nodes[0]
+        return node if isinstance(node, str) else str(node)
+    nodes = _dedupe([str(n) if isinstance(n, dict) else n for n in nodes])
+    return ','.join([n if isinstance(n, str) else str(n) for n in nodes])
+
+
+def compile_column_accessor(path):
+    """ Return a function of an item giving the report cell for path
+
+    The dotted path is split once per report rather than once per cell.
+    """
+    names = tuple(path.split('.'))
+
+    if len(names) == 1:
+        name = names[0]
+
+        def accessor(value):
+            if name not in value:
+                return ''
+            value = value[name]
+            if not isinstance(value, list):
+                value = [value]
+            elif not value:
+                return ''
+            return _format_nodes(value)
+
+        return accessor
+
+    def accessor(value):
+        nodes = [value]
+        for name in names:
+            nextnodes = []
+            for node in nodes:
+                if name not in node:
+                    continue
+                value = node[name]
+                if isinstance(value, list):
+                    nextnodes.extend(value)
+                else:
+                    nextnodes.append(value)
+            nodes = nextnodes
+            if not nodes:
+                return ''
+        return _format_nodes(nodes)
+
+    return accessor
+
+
+def lookup_column_value(value, path):
+    return compile_column_accessor(path)(value)
 
 
 def format_row(columns):
     """Format a list of text columns as a tab-separated byte string."""
-    return b'\t'.join([bytes_(" ".join(c.strip('\t\n\r').split()), 'utf-8') for c in columns]) + b'\r\n'
+    return ('\t'.join([' '.join(c.split()) for c in columns]) + '\r\n').encode('utf-8')
+
+
+def chunked(rows, size=64 * 1024):
+    """ Join byte strings into chunks of at least size bytes """
+    buffer = []
+    length = 0
+    for row in rows:
+        buffer.append(row)
+        length += len(row)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
 
 
 def _convert_camel_to_snake(type_str):
@@ -212,12 +267,13 @@ def report_download(context, request):
 
     header = [column.get('title') or field for field, column in columns.items()]
 
+    accessors = [compile_column_accessor(path) for path in columns]
+
     def generate_rows():
         yield format_header(header)
         yield format_row(header)
         for item in results['@graph']:
-            values = [lookup_column_value(item, path) for path in columns]
-            yield format_row(values)
+            yield format_row([accessor(item) for accessor in accessors])
 
     
     # Stream response using chunked encoding.
@@ -230,7 +286,7 @@ def report_download(context, request):
         downloadtime.hour,
         downloadtime.minute
     )
-    request.response.app_iter = generate_rows()
+    request.response.app_iter = chunked(generate_rows())
     return request.response
 
 
@@ -6,8 +6,14 @@ from urllib.parse import (
 )
 
 from collections import OrderedDict
+from pyramid.traversal import find_resource
+import threading
 
-from snovault import COLLECTIONS
+from snovault import (
+    COLLECTIONS,
+    DBSESSION,
+    ROOT,
+)
 from snosearch.decorators import assert_something_returned
 from snosearch.parsers import QueryString
 
@@ -15,6 +21,7 @@ from snosearch.parsers import QueryString
 CART_USER_MAX = 30  # Maximum number of non-deleted carts allowed per non-admin user
 CART_ADMIN_MAX = 200  # Maximum per admin user
 MAX_CART_ELEMENTS = 8000 # Max total elements from multiple carts
+CART_ELEMENTS_CACHE_SIZE = 50  # Carts whose elements are kept between requests
 
 
 def includeme(config):
@@ -37,11 +44,59 @@ def get_userid(request):
 
 
 def get_cart_objects_by_user(request, userid, blocked_statuses=[]):
+    '''
+    Properties of the user's carts, found through the indexed submitted_by
+    link. The elements list is replaced by element_count so that large
+    carts are never loaded.
+    '''
+    from sqlalchemy import (
+        and_,
+        func,
+        literal_column,
+        not_,
+    )
+    from sqlalchemy.dialects.postgresql import JSONB
+    from snovault.storage import (
+        CurrentPropertySheet,
+        Link,
+        PropertySheet,
+        Resource,
+    )
     request.datastore = 'database'
+    session = request.registry[DBSESSION]()
+    query = session.query(
+        Resource.rid,
+        literal_column("propsheets.properties - 'elements'", type_=JSONB),
+        func.jsonb_array_length(func.coalesce(
+            literal_column("propsheets.properties -> 'elements'", type_=JSONB),
+            literal_column("'[]'::jsonb", type_=JSONB),
+        )),
+    ).select_from(Link).join(
+        Resource, Resource.rid == Link.source_rid,
+    ).join(
+        CurrentPropertySheet,
+        and_(CurrentPropertySheet.rid == Resource.rid, CurrentPropertySheet.name == ''),
+    ).join(
+        PropertySheet, PropertySheet.sid == CurrentPropertySheet.sid,
+    ).filter(
+        Link.target_rid == userid,
+        Link.rel == 'submitted_by',
+        Resource.item_type == 'cart',
+    )
+    if blocked_statuses:
+        query = query.filter(not_(
+            literal_column("propsheets.properties ->> 'status'").in_(blocked_statuses)
+        ))
+    carts = request.registry[COLLECTIONS]['cart']
     return [
-        dict(v.properties, **{'@id': request.resource_path(v)})
-        for k, v in request.registry[COLLECTIONS]['cart'].items()
-        if v.properties['submitted_by'] == userid and v.properties['status'] not in blocked_statuses
+        dict(
+            properties,
+            element_count=element_count,
+            **{'@id': request.resource_path(
+                carts, properties.get(carts.type_info.factory.name_key) or str(rid), ''
+            )}
+        )
+        for rid, properties, element_count in query.order_by(Resource.rid)
     ]
 
 
@@ -69,11 +124,6 @@ def cart_manager(context, request):
     is_admin = 'group.admin' in request.effective_principals
     blocked_statuses = ['deleted'] if not is_admin else []
     user_carts = get_cart_objects_by_user(request, userid, blocked_statuses)
-    # Calculate the element count in each cart, but remove the elements
-    # themselves as this list can be huge.
-    for c in user_carts:
-        c['element_count'] = len(c['elements'])
-        del c['elements']
     result = {
         '@id': '/cart-manager/',
         '@type': ['cart-manager'],
@@ -98,6 +148,82 @@ def search_elements(context, request):
     return results
 
 
+class CartElementsCache:
+    '''
+    Elements of recently used carts keyed by (uuid, tid), so an entry is
+    never served once the cart has changed.
+    '''
+
+    def __init__(self, capacity=CART_ELEMENTS_CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            elements = self.entries.get(key)
+            if elements is not None:
+                self.entries.move_to_end(key)
+            return elements
+
+    def set(self, key, elements):
+        with self.lock:
+            self.entries[key] = elements
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+
+cart_elements_cache = CartElementsCache()
+
+
+class CartResolver:
+    '''
+    Request scoped lookup of cart elements, shared by every Cart built for
+    the request through get_cart_resolver(request). Only the stored cart
+    properties are embedded and the element list is reused until the cart
+    changes. A cached list is only handed out when the request may view the
+    cart, otherwise the cart is embedded and fails as it would uncached.
+    '''
+
+    def __init__(self, request, cache=cart_elements_cache):
+        self.request = request
+        self.cache = cache
+
+    def _get_version(self, cart):
+        try:
+            item = find_resource(self.request.registry[ROOT], cart)
+        except KeyError:
+            return None, None
+        uuid = getattr(item, 'uuid', None)
+        if uuid is None:
+            return None, None
+        return item, (str(uuid), item.tid)
+
+    def get_elements(self, cart):
+        '''
+        Elements of one cart (uuid or @id). Raises KeyError if not found.
+        '''
+        item, version = self._get_version(cart)
+        elements = None
+        if version is not None and self.request.has_permission('view', item):
+            elements = self.cache.get(version)
+        if elements is None:
+            elements = tuple(
+                self.request.embed(cart, '@@object?skip_calculated=true').get('elements', [])
+            )
+            if version is not None:
+                self.cache.set(version, elements)
+        return list(elements)
+
+
+def get_cart_resolver(request):
+    resolver = getattr(request, '_cart_resolver', None)
+    if resolver is None:
+        resolver = request._cart_resolver = CartResolver(request)
+    return resolver
+
+
 class Cart:
     '''
     Pass either a request with a query string with `?cart=foo&cart=bar` params
@@ -121,19 +247,14 @@ class Cart:
             params=self.query_string.get_cart()
         )
 
-    def _get_cart_object_or_error(self, uuid):
-        return self.request.embed(uuid, '@@object')
+    def _get_cart_elements_or_error(self, uuid):
+        return get_cart_resolver(self.request).get_elements(uuid)
 
-    def _try_to_get_cart_object(self, uuid):
+    def _try_to_get_elements_from_cart(self, uuid):
         try:
-            cart = self._get_cart_object_or_error(uuid)
+            return self._get_cart_elements_or_error(uuid)
         except KeyError:
-            cart = {}
-        return cart
-
-    def _try_to_get_elements_from_cart(self, uuid):
-        cart = self._try_to_get_cart_object(uuid)
-        return cart.get('elements', [])
+            return []
 
     def _get_elements_from_carts(self):
         carts = self.uuids or self._get_carts_from_params()
@@ -174,12 +295,9 @@ class CartWithElements(Cart):
     def __init__(self, *args, max_cart_elements=MAX_CART_ELEMENTS, **kwargs):
         super().__init__(*args, **kwargs, max_cart_elements=max_cart_elements)
 
-    def _try_to_get_cart_object(self, uuid):
+    @assert_something_returned('Empty cart')
+    def _try_to_get_elements_from_cart(self, uuid):
         try:
-            return self._get_cart_object_or_error(uuid)
+            return self._get_cart_elements_or_error(uuid)
         except KeyError:
             raise HTTPBadRequest(explanation=f'Specified cart {uuid} not found')
-
-    @assert_something_returned('Empty cart')
-    def _try_to_get_elements_from_cart(self, uuid):
-        return super()._try_to_get_elements_from_cart(uuid)
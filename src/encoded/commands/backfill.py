@@ -0,0 +1,187 @@
+"""\
+Shared driver for one off data migrations.
+
+A migration subclasses Backfill and implements change(item). Items are
+read in batches of consecutive uuids with one query per batch. Each batch
+is updated in its own transaction, which records the updated uuids so the
+indexer picks them up. A checkpoint file keeps the last committed uuid of
+each type, so an interrupted migration resumes after it.
+"""
+from collections import Counter
+import json
+import logging
+import os
+import time
+import transaction
+from pyramid.testing import DummyRequest
+from pyramid.threadlocal import manager
+
+logger = logging.getLogger(__name__)
+
+FIRST_UUID = '00000000-0000-0000-0000-000000000000'
+
+BATCH_QUERY = """
+SELECT rid FROM resources
+WHERE item_type = :item_type AND rid > :after
+ORDER BY rid
+LIMIT :limit
+"""
+
+
+class Backfill(object):
+    """ A change applied to every item of some types
+
+    change(item) returns the (properties, sheets) to save, or None to leave
+    the item as it is. Saving goes through Item.update, so keys and links
+    are kept up to date. Schema validation is skipped unless validate is
+    set, then properties that fail it are logged and saved as they are.
+    """
+    item_types = ()
+    userid = 'remoteuser.IMPORT'
+    validate = False
+
+    def applies_to(self, type_info):
+        return True
+
+    def change(self, item):
+        raise NotImplementedError()
+
+
+def read_checkpoint(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_checkpoint(filename, done):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(done, f, indent=4, sort_keys=True)
+    os.replace(tmp, filename)
+
+
+def uuid_batches(session, item_type, after=FIRST_UUID, batchsize=500):
+    """ Consecutive uuids of item_type after a uuid, a batch per query
+    """
+    from sqlalchemy import text
+    while True:
+        rows = session.execute(
+            text(BATCH_QUERY),
+            {'item_type': item_type, 'after': after, 'limit': batchsize},
+        )
+        batch = [str(rid) for rid, in rows]
+        if not batch:
+            return
+        yield batch
+        after = batch[-1]
+
+
+def preload(session, uuids):
+    """ Load the resources and current properties of a batch in one query
+    """
+    from snovault.storage import (
+        CurrentPropertySheet,
+        Resource,
+    )
+    from sqlalchemy import orm
+    session.query(Resource).filter(Resource.rid.in_(uuids)).options(
+        orm.joinedload(Resource.data).joinedload(CurrentPropertySheet.propsheet)
+    ).all()
+
+
+def validated_properties(item, properties):
+    """ Properties serialized by the item schema, or as they are if invalid
+    """
+    from pyramid.traversal import resource_path
+    from snovault.schema_utils import validate
+    validated, errors = validate(item.type_info.schema, properties, item.properties)
+    if errors:
+        logger.warning(
+            'Saving %s unvalidated: %s', resource_path(item),
+            '; '.join(error.message for error in errors))
+        return properties
+    return validated
+
+
+def format_rate(read, changed, elapsed):
+    return "{} read, {} changed ({:.1f} items/s)".format(
+        read, changed, read / elapsed if elapsed else 0.0)
+
+
+def run_backfill(app, backfill, item_types=None, exclude=(), batchsize=500,
+                 dry_run=False, checkpoint=None):
+    """ Apply backfill to every item, committing a batch at a time
+
+    Returns the number of items read and changed by item type.
+    """
+    from snovault import (
+        COLLECTIONS,
+        DBSESSION,
+    )
+    root = app.root_factory(app)
+    registry = app.registry
+    collections = registry[COLLECTIONS]
+    if not item_types:
+        item_types = backfill.item_types or sorted(collections.by_item_type)
+    done = read_checkpoint(checkpoint) if checkpoint else {}
+    read = Counter()
+    changed = Counter()
+    dummy_request = DummyRequest(root=root, registry=registry, _stats={})
+    manager.push({'request': dummy_request, 'registry': registry})
+    try:
+        for item_type in item_types:
+            if item_type in exclude:
+                continue
+            if not backfill.applies_to(collections[item_type].type_info):
+                logger.info('Skipped %s', item_type)
+                continue
+            start = time.time()
+            after = done.get(item_type, FIRST_UUID)
+            batches = uuid_batches(registry[DBSESSION](), item_type, after, batchsize)
+            for batch in batches:
+                txn = transaction.get()
+                session = registry[DBSESSION]()
+                preload(session, batch)
+                updated = []
+                for uuid in batch:
+                    item = root.get_by_uuid(uuid)
+                    dummy_request.context = item
+                    result = backfill.change(item)
+                    read[item_type] += 1
+                    if result is None:
+                        continue
+                    changed[item_type] += 1
+                    updated.append(uuid)
+                    if not dry_run:
+                        properties, sheets = result
+                        if backfill.validate:
+                            properties = validated_properties(item, properties)
+                        item.update(properties, sheets=sheets)
+                if dry_run or not updated:
+                    transaction.abort()
+                else:
+                    txn.setExtendedInfo('updated', updated)
+                    txn.setExtendedInfo('renamed', [])
+                    txn.setExtendedInfo('userid', backfill.userid)
+                    transaction.commit()
+                if checkpoint and not dry_run:
+                    done[item_type] = batch[-1]
+                    write_checkpoint(checkpoint, done)
+                logger.info(
+                    '%s %s: %s', 'Checked' if dry_run else 'Updated', item_type,
+                    format_rate(read[item_type], changed[item_type], time.time() - start))
+    finally:
+        transaction.abort()
+        manager.pop()
+    return read, changed
+
+
+def add_arguments(parser):
+    parser.add_argument('--batchsize', type=int, default=500,
+        help="Items read and committed at a time")
+    parser.add_argument('--checkpoint',
+        help="File of the last committed uuid of each type, resumed from")
+    parser.add_argument('--dry-run', action='store_true',
+        help="Count the items that would change, without saving")
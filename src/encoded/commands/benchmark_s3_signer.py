@@ -0,0 +1,67 @@
+"""\
+Benchmark presigning S3 download URLs with and without the shared signer.
+
+Signing is local, so no network or real credentials are needed:
+
+    %(prog)s --count 1000
+
+"""
+import argparse
+import boto3
+import os
+import time
+
+from encoded.s3_signer import (
+    DOWNLOAD_EXPIRES,
+    S3Signer,
+)
+
+
+EPILOG = __doc__
+
+
+def benchmark(count):
+    """ Seconds per URL when a client is built for each one, and when shared
+    """
+    def timed(fn):
+        start = time.time()
+        for number in range(count):
+            fn(number)
+        return (time.time() - start) / count
+
+    def client_per_url(number):
+        boto3.client('s3').generate_presigned_url(
+            ClientMethod='get_object',
+            Params={
+                'Bucket': 'bucket',
+                'Key': 'key/%d' % number,
+                'ResponseContentDisposition': 'attachment; filename=%d' % number,
+            },
+            ExpiresIn=DOWNLOAD_EXPIRES
+        )
+
+    signer = S3Signer()
+    return {
+        'client per url': timed(client_per_url),
+        'shared client': timed(lambda number: signer.download_url('bucket', 'key/%d' % number, str(number))),
+        'cached url': timed(lambda number: signer.download_url('bucket', 'key/0', '0')),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark presigning S3 URLs", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--count', type=int, default=200, help="URLs signed per case")
+    args = parser.parse_args()
+    # Signing is local, stand in credentials are enough.
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    for case, seconds in benchmark(args.count).items():
+        print('%-16s %10.1f us/url' % (case, seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,31 +9,50 @@ For the development.ini you must supply the paster app name:
 
     %(prog)s development.ini --app-name app
 
+To check in 8 worker processes, resuming from an earlier interrupted run:
+
+    %(prog)s development.ini --app-name app --processes 8 --checkpoint rendered.txt
+
 """
 import json
 import logging
+import time
+import traceback
+from collections import defaultdict
 from future.utils import itervalues
 from pyramid.traversal import resource_path
+from encoded.stats_util import percentile
 
 EPILOG = __doc__
 
 logger = logging.getLogger(__name__)
+testapp = None
 
-def check_path(testapp, path):
+
+def render_failure(testapp, path):
+    """ None if path renders, otherwise a description of the failure
+    """
     try:
         res = testapp.get(path, status='*').maybe_follow(status='*')
     except Exception:
-        logger.exception('Render failed: %s', path)
-        return False
+        return 'Render failed: %s\n%s' % (path, traceback.format_exc())
     if res.status_int != 200:
-        logger.error('Render failed (%s): %s', res.status, path)
+        message = 'Render failed (%s): %s' % (res.status, path)
         script = res.html.find('script', **{'data-prop-name': 'context'})
         if script is not None:
             context = json.loads(script.text)
             if 'detail' in context:
-                logger.debug(context['detail'])
+                message += '\n' + str(context['detail'])
             else:
-                logger.debug(json.dumps(context, indent=4))
+                message += '\n' + json.dumps(context, indent=4)
+        return message
+    return None
+
+
+def check_path(testapp, path):
+    failure = render_failure(testapp, path)
+    if failure is not None:
+        logger.error(failure)
         return False
     return True
 
@@ -61,6 +80,127 @@ def run(testapp, collections=None):
                 collection_path, count)
 
 
+def collection_paths(testapp, collections=None):
+    """ Yield (item_type, path) for each collection and its items
+    """
+    app = testapp.app
+    root = app.root_factory(app)
+    if not collections:
+        collections = root.by_item_type.keys()
+        yield None, '/'
+    for collection_name in collections:
+        collection = root[collection_name]
+        yield collection_name, resource_path(collection, '')
+        for item in itervalues(collection):
+            yield collection_name, resource_path(item, '')
+
+
+def read_checkpoint(filename):
+    try:
+        with open(filename) as f:
+            return {line.rstrip('\n') for line in f if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def batches(paths, batchsize):
+    """ Batches of (item_type, path) that never mix collections
+    """
+    batch = []
+    for item_type, path in paths:
+        if batch and (len(batch) == batchsize or batch[-1][0] != item_type):
+            yield batch
+            batch = []
+        batch.append((item_type, path))
+    if batch:
+        yield batch
+
+
+def _pool_initializer(configfile, app_name, username):
+    global testapp
+    testapp = internal_app(configfile, app_name, username)
+
+
+def _pool_worker(batch):
+    results = []
+    for item_type, path in batch:
+        start = time.time()
+        failure = render_failure(testapp, path)
+        results.append((item_type, path, time.time() - start, failure))
+    return results
+
+
+def render_time_summary(durations):
+    return ', '.join(
+        '%s %.0fms' % (name, percentile(durations, fraction) * 1000)
+        for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99), ('max', 1.0))
+    )
+
+
+def run_parallel(args, collections=None):
+    """ Render in worker processes, each with its own app
+
+    Failures are logged as they arrive. Rendered paths are appended to the
+    checkpoint file so an interrupted run can resume where it stopped.
+    """
+    from multiprocessing import get_context
+    from multiprocessing.pool import Pool
+    app = internal_app(args.config_uri, args.app_name, args.username)
+    done = read_checkpoint(args.checkpoint) if args.checkpoint else set()
+    paths = [
+        (item_type or '', path)
+        for item_type, path in collection_paths(app, collections)
+        if path not in done
+    ]
+    logger.info('Rendering %d paths (%d already done)', len(paths), len(done))
+    pool = Pool(
+        processes=args.processes,
+        initializer=_pool_initializer,
+        initargs=(args.config_uri, args.app_name, args.username),
+        context=get_context('forkserver'),
+    )
+    checkpoint = open(args.checkpoint, 'a') if args.checkpoint else None
+    durations = defaultdict(list)
+    failures = defaultdict(int)
+    start = time.time()
+    rendered = 0
+    try:
+        for results in pool.imap_unordered(_pool_worker, batches(paths, args.batchsize)):
+            for item_type, path, duration, failure in results:
+                durations[item_type].append(duration)
+                if failure is not None:
+                    failures[item_type] += 1
+                    logger.error(failure)
+                elif checkpoint is not None:
+                    checkpoint.write(path + '\n')
+            if checkpoint is not None:
+                checkpoint.flush()
+            rendered += len(results)
+            elapsed = time.time() - start
+            logger.info(
+                'Rendered %d of %d (%.1f pages/s, %d failed)',
+                rendered, len(paths), rendered / elapsed if elapsed else 0.0,
+                sum(failures.values()),
+            )
+    finally:
+        pool.terminate()
+        pool.join()
+        if checkpoint is not None:
+            checkpoint.close()
+    for item_type in sorted(durations):
+        logger.info(
+            'Collection %s: %d of %d failed to render. Render time %s',
+            item_type or '/', failures[item_type], len(durations[item_type]),
+            render_time_summary(durations[item_type]),
+        )
+    elapsed = time.time() - start
+    logger.info(
+        'Rendered %d pages in %.0fs (%.1f pages/s)',
+        rendered, elapsed, rendered / elapsed if elapsed else 0.0,
+    )
+    return sum(failures.values())
+
+
 def internal_app(configfile, app_name=None, username='TEST', accept='text/html'):
     from pyramid import paster
     from webtest import TestApp
@@ -82,11 +222,21 @@ def main():
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
     parser.add_argument('--username', '-u', default='TEST',
         help="User uuid/email")
+    parser.add_argument('--processes', type=int, default=1,
+        help="Worker processes, each rendering with its own app")
+    parser.add_argument('--batchsize', type=int, default=50,
+        help="Paths sent to a worker at a time")
+    parser.add_argument('--checkpoint',
+        help="File of rendered paths, skipped when resuming")
     parser.add_argument('config_uri', help="path to configfile")
     parser.add_argument('path', nargs='*', help="path to test")
     args = parser.parse_args()
 
     logging.basicConfig()
+    if args.processes > 1 and not args.path:
+        logging.getLogger('encoded').setLevel(logging.INFO)
+        run_parallel(args, args.item_type)
+        return
     testapp = internal_app(args.config_uri, args.app_name, args.username)
     # Loading app will have configured from config file. Reconfigure here:
     logging.getLogger('encoded').setLevel(logging.DEBUG)
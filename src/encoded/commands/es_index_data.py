@@ -1,11 +1,52 @@
+"""\
+Index app data loaded to elasticsearch.
+
+The uuids of each item type are split into batches of consecutive uuids
+and indexed by a pool of indexer worker processes. Progress is logged per
+item type with a rate and estimated time left. Finished batches are
+appended to a checkpoint file, so an interrupted reindex started again
+with the same checkpoint skips the uuid ranges already indexed.
+
+Examples
+
+Reindex everything in 8 processes, recording the xmin when done:
+
+    %(prog)s development.ini --app-name app --processes 8 --record --checkpoint reindex.json
+
+Reindex experiments and files only:
+
+    %(prog)s production.ini --item-type experiment --item-type file
+
+Indexing runs in 4 processes by default. Earlier releases made a single
+/index request, which --processes 0 still does:
+
+    %(prog)s development.ini --app-name app --processes 0
+
+"""
+from bisect import bisect_right
+from collections import (
+    Counter,
+    defaultdict,
+)
 from pyramid.paster import get_app
+import json
 import logging
+import time
+import transaction
 from webtest import TestApp
 
 index = 'encoded'
 
 EPILOG = __doc__
 
+logger = logging.getLogger(__name__)
+
+UUIDS_QUERY = """
+SELECT rid FROM resources
+WHERE item_type = :item_type
+ORDER BY rid
+"""
+
 
 def run(app, collections=None, record=False):
     environ = {
@@ -16,11 +57,204 @@ def run(app, collections=None, record=False):
     testapp.post_json('/index', {
         'last_xmin': None,
         'types': collections,
-        'recovery': True
+        'recovery': True,
+        'record': record,
         }
     )
 
 
+def uuids_by_type(registry, item_types=None):
+    """ Sorted uuids of each item type
+    """
+    from snovault import (
+        DBSESSION,
+        TYPES,
+    )
+    from sqlalchemy import text
+    session = registry[DBSESSION]()
+    result = {}
+    for item_type in sorted(registry[TYPES].by_item_type):
+        if item_types and item_type not in item_types:
+            continue
+        rows = session.execute(text(UUIDS_QUERY), {'item_type': item_type})
+        result[item_type] = [str(rid) for rid, in rows]
+    return result
+
+
+def current_xmin(registry):
+    from snovault import DBSESSION
+    transaction.begin()
+    try:
+        connection = registry[DBSESSION]().connection()
+        return connection.execute(
+            "SELECT txid_snapshot_xmin(txid_current_snapshot());").scalar()
+    finally:
+        transaction.abort()
+
+
+def read_checkpoint(filename):
+    """ The xmin of the first run and the finished uuid ranges of each type
+    """
+    xmin = None
+    ranges = defaultdict(list)
+    try:
+        with open(filename) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if 'xmin' in entry:
+                    xmin = entry['xmin']
+                else:
+                    ranges[entry['item_type']].append((entry['first'], entry['last']))
+    except FileNotFoundError:
+        pass
+    return xmin, {item_type: sorted(pairs) for item_type, pairs in ranges.items()}
+
+
+def remaining_uuids(uuids, ranges):
+    """ Sorted uuids that fall in none of the sorted (first, last) ranges
+    """
+    firsts = [first for first, _ in ranges]
+    remaining = []
+    for uuid in uuids:
+        position = bisect_right(firsts, uuid) - 1
+        if position >= 0 and uuid <= ranges[position][1]:
+            continue
+        remaining.append(uuid)
+    return remaining
+
+
+def batches(uuids_by_type, batchsize):
+    """ (item_type, uuids) batches of consecutive uuids of a single type
+    """
+    for item_type, uuids in uuids_by_type.items():
+        for start in range(0, len(uuids), batchsize):
+            yield item_type, uuids[start:start + batchsize]
+
+
+class TypeProgress(object):
+    """ Indexed count, rate and time left of each item type
+    """
+    def __init__(self, totals, clock=time.time):
+        self.totals = totals
+        self.clock = clock
+        self.done = Counter()
+        self.started = {}
+
+    def update(self, item_type, count, started=None):
+        # Workers report when they started a batch. The task queue is filled
+        # ahead of the workers, so handing out a batch is no start time.
+        if started is None:
+            started = self.clock()
+        self.started[item_type] = min(self.started.get(item_type, started), started)
+        self.done[item_type] += count
+
+    def format(self, item_type):
+        done, total = self.done[item_type], self.totals[item_type]
+        elapsed = self.clock() - self.started.get(item_type, self.clock())
+        rate = done / elapsed if elapsed else 0.0
+        remaining = (total - done) / rate if rate else 0.0
+        return "{} {} of {} ({:.1f} items/s, {:.0f}s left)".format(
+            item_type, done, total, rate, remaining)
+
+    def in_progress(self):
+        return [
+            item_type for item_type in sorted(self.started)
+            if self.done[item_type] < self.totals[item_type]
+        ]
+
+
+def _pool_worker(args):
+    from snovault.elasticsearch.mpindexer import update_object_in_snapshot
+    item_type, uuids, xmin = args
+    started = time.time()
+    errors = []
+    for uuid in uuids:
+        update_info = update_object_in_snapshot((uuid, xmin, None, False))
+        if update_info.get('error') is not None:
+            errors.append(update_info['error'])
+    return item_type, uuids[0], uuids[-1], len(uuids), started, errors
+
+
+def run_parallel(app, collections=None, record=False, processes=4, batchsize=500, checkpoint=None):
+    """ Index batches of uuids in a pool of indexer workers
+
+    Batches are indexed at the current xmin, like a recovery /index request.
+    The xmin recorded is the one of the first run, so the regular indexer
+    later picks up anything changed while an interrupted reindex was down.
+    """
+    from multiprocessing import get_context
+    from multiprocessing.pool import Pool
+    from snovault.elasticsearch.interfaces import (
+        APP_FACTORY,
+        ELASTIC_SEARCH,
+    )
+    from snovault.elasticsearch.mpindexer import initializer
+    registry = app.registry
+    xmin = current_xmin(registry)
+    first_xmin, ranges = read_checkpoint(checkpoint) if checkpoint else (None, {})
+    if first_xmin is None:
+        first_xmin = xmin
+        if checkpoint:
+            with open(checkpoint, 'a') as f:
+                f.write(json.dumps({'xmin': first_xmin}) + '\n')
+    transaction.begin()
+    try:
+        pending = {
+            item_type: remaining_uuids(uuids, ranges.get(item_type, []))
+            for item_type, uuids in uuids_by_type(registry, collections).items()
+        }
+    finally:
+        transaction.abort()
+    pending = {item_type: uuids for item_type, uuids in pending.items() if uuids}
+    progress = TypeProgress({item_type: len(uuids) for item_type, uuids in pending.items()})
+    logger.info(
+        'Indexing %d items of %d types at xmin %s',
+        sum(progress.totals.values()), len(pending), xmin,
+    )
+
+    pool = Pool(
+        processes=processes,
+        initializer=initializer,
+        initargs=(registry[APP_FACTORY], registry.settings),
+        context=get_context('forkserver'),
+    )
+    checkpoint_file = open(checkpoint, 'a') if checkpoint else None
+    errors = []
+    try:
+        tasks = (
+            (item_type, uuids, xmin) for item_type, uuids in batches(pending, batchsize)
+        )
+        for item_type, first, last, count, started, batch_errors in pool.imap_unordered(_pool_worker, tasks):
+            progress.update(item_type, count, started)
+            if batch_errors:
+                errors.extend(batch_errors)
+                logger.error('%d errors indexing %s %s to %s', len(batch_errors), item_type, first, last)
+            elif checkpoint_file is not None:
+                checkpoint_file.write(
+                    json.dumps({'item_type': item_type, 'first': first, 'last': last}) + '\n')
+                checkpoint_file.flush()
+            logger.info(
+                'Indexed %s', ', '.join(progress.format(name) for name in progress.in_progress())
+                or progress.format(item_type))
+    finally:
+        pool.terminate()
+        pool.join()
+        if checkpoint_file is not None:
+            checkpoint_file.close()
+    if errors:
+        logger.error('%d items failed to index, run again with the checkpoint to retry', len(errors))
+    elif record:
+        registry[ELASTIC_SEARCH].index(
+            index=registry.settings['snovault.elasticsearch.index'],
+            doc_type='meta',
+            id='indexing',
+            body={'xmin': first_xmin, 'last_xmin': None, 'types': collections},
+        )
+    return errors
+
+
 def main():
     ''' Indexes app data loaded to elasticsearch '''
 
@@ -32,6 +266,13 @@ def main():
     parser.add_argument('--item-type', action='append', help="Item type")
     parser.add_argument('--record', default=False, action='store_true', help="Record the xmin in ES meta")
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--processes', type=int, default=4,
+        help="Indexer worker processes (default 4, earlier releases indexed in "
+             "a single /index request), 0 for a single /index request")
+    parser.add_argument('--batchsize', type=int, default=500,
+        help="Consecutive uuids of one type sent to a worker at a time")
+    parser.add_argument('--checkpoint',
+        help="File of indexed uuid ranges, skipped when resuming")
     parser.add_argument('config_uri', help="path to configfile")
     args = parser.parse_args()
 
@@ -44,7 +285,12 @@ def main():
 
     # Loading app will have configured from config file. Reconfigure here:
     logging.getLogger('encoded').setLevel(logging.DEBUG)
-    return run(app, args.item_type, args.record)
+    if args.processes == 0:
+        return run(app, args.item_type, args.record)
+    errors = run_parallel(
+        app, args.item_type, args.record, args.processes, args.batchsize, args.checkpoint)
+    if errors:
+        raise SystemExit(1)
 
 
 if __name__ == '__main__':
@@ -6,6 +6,10 @@ from .ntr_terms import (
     ntr_biosamples
 )
 from .manual_slims import slim_shims
+from .ontology_closure import (
+    ClosureEngine,
+    slims_by_term,
+)
 import json
 
 EPILOG = __doc__
@@ -510,63 +514,29 @@ def splitNameFromNamespace(aUri):
     return (name, ns)
 
 
-def iterativeChildren(nodes, terms, closure):
-    if closure == 'data':
-        data = 'data'
-    else:
-        data = 'data_with_develops_from'
-    results = []
-    while 1:
-        newNodes = []
-        if len(nodes) == 0:
-            break
-        for node in nodes:
-            results.append(node)
-            if terms[node][data]:
-                for child in terms[node][data]:
-                    if child not in results:
-                        newNodes.append(child)
-        nodes = list(set(newNodes))
-    return list(set(results))
-
-
-def getSlims(goid, terms, slimType):
-    ''' Get Slims '''
-
-    slims = []
-    slimTerms = {}
-    if slimType == 'developmental':
-        slimTerms = developental_slims
-    elif slimType == 'organ':
-        slimTerms = organ_slims
-    elif slimType == 'cell':
-        slimTerms = cell_slims
-    elif slimType == 'system':
-        slimTerms = system_slims
-    elif slimType == 'assay':
-        slimTerms = assay_slims
-    elif slimType == 'category':
-        slimTerms = category_slims
-    elif slimType == 'objective':
-        slimTerms = objective_slims
-    elif slimType == 'type':
-        slimTerms = type_slims
-    for slimTerm in slimTerms:
-        if slimType == 'developmental':
-            if slimTerm in terms[goid]['closure_with_develops_from']:
-                slims.append(slimTerms[slimTerm])
-        else:
-            if slimTerm in terms[goid]['closure']:
-                slims.append(slimTerms[slimTerm])
-
-    if slim_shims.get(slimType, {}):
-        # Overrides all Ontology based-slims
-        shim = slim_shims[slimType].get(goid, '')
-        if shim:
-            slims = []
-            for i in shim:
-                slims.append(i)
-    return slims
+# (slim type, closure it is evaluated against, slim terms)
+SLIM_TYPES = [
+    ('system', 'closure', system_slims),
+    ('organ', 'closure', organ_slims),
+    ('cell', 'closure', cell_slims),
+    ('developmental', 'closure_with_develops_from', developental_slims),
+    ('assay', 'closure', assay_slims),
+    ('category', 'closure', category_slims),
+    ('objective', 'closure', objective_slims),
+    ('type', 'closure', type_slims),
+]
+
+# (term key, slim type)
+SLIM_KEYS = [
+    ('systems', 'system'),
+    ('organs', 'organ'),
+    ('cells', 'cell'),
+    ('developmental', 'developmental'),
+    ('assay', 'assay'),
+    ('category', 'category'),
+    ('objectives', 'objective'),
+    ('types', 'type'),
+]
 
 
 def getTermStructure():
@@ -726,33 +696,25 @@ def main():
         terms[term]['data'] = list(set(terms[term]['parents']) | set(terms[term]['part_of']) | set(terms[term]['derives_from']) | set(terms[term]['achieves_planned_objective']))
         terms[term]['data_with_develops_from'] = list(set(terms[term]['data']) | set(terms[term]['develops_from']))
 
+    # Closures are only needed to find slims, so all slim types are evaluated
+    # together from each closure without keeping the closures themselves.
+    engines = {
+        'closure': ClosureEngine(terms, 'data'),
+        'closure_with_develops_from': ClosureEngine(terms, 'data_with_develops_from'),
+    }
+    slims = slims_by_term(engines, SLIM_TYPES)
     for term in terms:
-        words = iterativeChildren(terms[term]['data'], terms, 'data')
-        for word in words:
-            terms[term]['closure'].append(word)
-
-        d = iterativeChildren(terms[term]['data_with_develops_from'], terms, 'data_with_develops_from')
-        for dd in d:
-            terms[term]['closure_with_develops_from'].append(dd)
-       
-        terms[term]['closure'].append(term)
-        terms[term]['closure_with_develops_from'].append(term)
-
-        terms[term]['systems'] = getSlims(term, terms, 'system')
-        terms[term]['organs'] = getSlims(term, terms, 'organ')
-        terms[term]['cells'] = getSlims(term, terms, 'cell')
-        terms[term]['developmental'] = getSlims(term, terms, 'developmental')
-        terms[term]['assay'] = getSlims(term, terms, 'assay')
-        terms[term]['category'] = getSlims(term, terms, 'category')
-        terms[term]['objectives'] = getSlims(term, terms, 'objective')
-        terms[term]['types'] = getSlims(term, terms, 'type')
+        term_slims = slims[term]
+        for key, slim_type in SLIM_KEYS:
+            shim = slim_shims.get(slim_type, {}).get(term, '')
+            # Overrides all Ontology based-slims
+            terms[term][key] = list(shim) if shim else term_slims[slim_type]
 
-        del terms[term]['closure'], terms[term]['closure_with_develops_from']
-    
     for term in terms:
         del terms[term]['parents'], terms[term]['develops_from']
         del terms[term]['has_part'], terms[term]['achieves_planned_objective']
         del terms[term]['id'], terms[term]['data'], terms[term]['data_with_develops_from']
+        del terms[term]['closure'], terms[term]['closure_with_develops_from']
     
     terms.update(ntr_assays)
     terms.update(ntr_biosamples)
@@ -1,8 +1,8 @@
 """\
 The inpath is the path to either:
 
-  - a zip file or directory containing single sheet xlsx/tsv/csv files named
-    after the object type, e.g. experiment.xlsx, antibody_lot.tsv
+  - a zip file or directory containing single sheet xlsx/tsv/csv/json/ndjson
+    files named after the object type, e.g. experiment.xlsx, antibody_lot.tsv
 
   - a single Excel workbook with worksheets named after the object types.
 
@@ -19,6 +19,11 @@ To make updates from a single tsv file
     %(prog)s --username ACCESS_KEY_ID --password SECRET_ACCESS_KEY \\
         --patch ../updates/ http://localhost:6543
 
+To load into a fresh database, loading independent item types concurrently
+and posting rows in batches of 100 per transaction
+
+    %(prog)s --workers 4 --batchsize 100 ../inserts/ development.ini
+
 """
 from webtest import TestApp
 from urllib.parse import urlparse
@@ -91,6 +96,10 @@ def main():
     parser.add_argument('--attach', '-a', action='append', default=[],
         help="Directory to search for attachments")
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--workers', type=int, default=0,
+        help="Load independent item types concurrently with this many workers")
+    parser.add_argument('--batchsize', type=int, default=100,
+        help="Rows per transaction when loading with --workers")
     parser.add_argument('inpath',
         help="input zip file/directory of excel/csv/tsv sheets.")
     parser.add_argument('url',
@@ -121,6 +130,10 @@ def main():
 
     if args.method:
         run(testapp, args.inpath, args.attach, args.method, args.item_type, args.test_only)
+    elif args.workers:
+        loadxl.load_all_parallel(
+            testapp, args.inpath, args.attach, test=args.test_only,
+            workers=args.workers, batchsize=args.batchsize)
     else:
         loadxl.load_all(testapp, args.inpath, args.attach, args.test_only)
 
@@ -3,10 +3,29 @@ Available formats: xml, n3, turtle, nt, pretty-xml, trix.
 Example.
 
     %(prog)s "https://www.encodeproject.org/search/?type=organism&frame=object"
+
+To dump every public item straight from the app as gzipped N-Quads, one
+graph per item, converting in 8 worker processes:
+
+    %(prog)s --app-config production.ini --format nquads --gzip --processes 8 -o dump.nq.gz
+
+Items are read one batch at a time and their triples written as they are
+converted, so memory use does not grow with the number of items.
 """
 EPILOG = __doc__
 
+import gzip
+import logging
 import rdflib
+import time
+
+logger = logging.getLogger(__name__)
+
+STREAM_FORMATS = ('nt', 'nquads')
+DEFAULT_BASE = 'https://www.encodeproject.org/'
+
+testapp = None
+converter = None
 
 
 def run(sources, output, parser='json-ld', serializer='xml', base=None):
@@ -16,6 +35,146 @@ def run(sources, output, parser='json-ld', serializer='xml', base=None):
     g.serialize(output, format=serializer, base=base)
 
 
+class ItemConverter(object):
+    """ N-Triples or N-Quads lines for @@object frames
+
+    The portal JSON-LD context is loaded once and shared by every item,
+    instead of being fetched and compiled again for each document.
+    """
+    def __init__(self, context_data, base, quads=False):
+        from rdflib_jsonld.context import Context
+        from rdflib_jsonld.parser import Parser
+        from urllib.parse import urljoin
+        # The terms namespace is a path by default, predicates need a full IRI.
+        context_data = {
+            key: urljoin(base, value) if isinstance(value, str) and value.startswith('/') else value
+            for key, value in context_data.items()
+        }
+        self.context = Context(base=base)
+        self.context.load(context_data)
+        self.parser = Parser()
+        self.base = base
+        self.quads = quads
+
+    def lines(self, item):
+        from rdflib.plugins.serializers.nt import _nt_row
+        item = dict(item)
+        item.pop('@context', None)
+        graph = rdflib.Graph()
+        self.parser.parse(item, self.context, graph)
+        if not self.quads:
+            return [_nt_row(triple) for triple in graph]
+        name = rdflib.URIRef(self.context.resolve_iri(item['@id'])).n3()
+        return [_nt_row(triple)[:-2] + name + ' .\n' for triple in graph]
+
+
+def item_paths(app, collections=None):
+    """ Yield the @@object path of each item, a collection at a time
+    """
+    from snovault import COLLECTIONS
+    by_item_type = app.registry[COLLECTIONS].by_item_type
+    if not collections:
+        collections = sorted(by_item_type)
+    for collection_name in collections:
+        # Listed up front, the items are then fetched in their own transactions.
+        uuids = [str(uuid) for uuid in by_item_type[collection_name]]
+        for uuid in uuids:
+            yield '/%s/@@object' % uuid
+
+
+def batches(paths, batchsize):
+    batch = []
+    for path in paths:
+        batch.append(path)
+        if len(batch) == batchsize:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def internal_app(configfile, app_name=None, username=None):
+    from pyramid import paster
+    from webtest import TestApp
+    app = paster.get_app(configfile, app_name)
+    environ = {
+        'HTTP_ACCEPT': 'application/json',
+    }
+    if username:
+        environ['REMOTE_USER'] = username
+    return TestApp(app, environ)
+
+
+def _pool_initializer(configfile, app_name, username, base, quads):
+    global testapp, converter
+    testapp = internal_app(configfile, app_name, username)
+    converter = ItemConverter(testapp.get('/terms/').json['@context'], base, quads)
+
+
+def _pool_worker(batch):
+    """ Encoded lines for a batch of items and the number converted
+    """
+    lines = []
+    converted = 0
+    for path in batch:
+        res = testapp.get(path, status='*')
+        if res.status_int != 200:
+            # Items the user may not view are left out of the dump.
+            continue
+        try:
+            lines.extend(converter.lines(res.json))
+        except Exception:
+            logger.exception('Could not convert %s', path)
+            continue
+        converted += 1
+    return ''.join(lines).encode('utf-8'), converted
+
+
+def open_output(output, compress):
+    if compress:
+        return gzip.GzipFile(fileobj=output, mode='wb')
+    return output
+
+
+def export(args, output):
+    """ Write the triples or quads of every item to output as they are converted
+    """
+    initargs = (
+        args.app_config, args.app_name, args.username, args.base, args.format == 'nquads')
+    _pool_initializer(*initargs)
+    tasks = batches(item_paths(testapp.app, args.item_type), args.batchsize)
+    pool = None
+    if args.processes > 1:
+        from multiprocessing import get_context
+        from multiprocessing.pool import Pool
+        pool = Pool(
+            processes=args.processes,
+            initializer=_pool_initializer,
+            initargs=initargs,
+            context=get_context('forkserver'),
+        )
+        results = pool.imap(_pool_worker, tasks)
+    else:
+        results = (_pool_worker(batch) for batch in tasks)
+    stream = open_output(output, args.gzip)
+    items = 0
+    start = time.time()
+    try:
+        for data, converted in results:
+            stream.write(data)
+            items += converted
+            elapsed = time.time() - start
+            logger.info(
+                'Exported %d items (%.1f items/s)', items, items / elapsed if elapsed else 0.0)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if stream is not output:
+            stream.close()
+    return items
+
+
 def main():
     import argparse
     import sys
@@ -33,7 +192,7 @@ def main():
         description="Convert JSON-LD from source URLs to RDF", epilog=EPILOG,
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
-    parser.add_argument('sources', metavar='URL', nargs='+', help="URLs to convert")
+    parser.add_argument('sources', metavar='URL', nargs='*', help="URLs to convert")
     parser.add_argument(
         '-p', '--parser', default='json-ld', help=', '.join(rdflib_parsers))
     parser.add_argument(
@@ -43,7 +202,26 @@ def main():
     parser.add_argument(
         '-o', '--output', type=argparse.FileType('wb'), default=stdout,
         help="Output file.")
+    parser.add_argument(
+        '--app-config', help="Export items from the app in this configfile instead of URLs")
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--username', '-u', help="User uuid/email, anonymous by default")
+    parser.add_argument('--item-type', action='append', help="Item type, all by default")
+    parser.add_argument(
+        '--format', choices=STREAM_FORMATS, default='nt', help="Format of the app export")
+    parser.add_argument('--gzip', action='store_true', help="Compress the app export")
+    parser.add_argument('--processes', type=int, default=1, help="Converting worker processes")
+    parser.add_argument('--batchsize', type=int, default=100, help="Items sent to a worker at a time")
     args = parser.parse_args()
+    if args.app_config:
+        logging.basicConfig()
+        logger.setLevel(logging.INFO)
+        if args.base is None:
+            args.base = DEFAULT_BASE
+        export(args, args.output)
+        return
+    if not args.sources:
+        parser.error('URL or --app-config required')
     run(args.sources, args.output, args.parser, args.serializer, args.base)
 
 
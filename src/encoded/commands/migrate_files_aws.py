@@ -4,27 +4,30 @@ Update files with AWS metadata
 """
 import json
 import logging
-import transaction
 from pyramid.paster import get_app
-from pyramid.threadlocal import manager
-from pyramid.testing import DummyRequest
+from .backfill import (
+    Backfill,
+    add_arguments,
+    run_backfill,
+)
 
 EPILOG = __doc__
 
 logger = logging.getLogger(__name__)
 
 
-def run(app, files):
-    root = app.root_factory(app)
-    collection = root['file']
-    dummy_request = DummyRequest(root=root, registry=app.registry, _stats={})
-    manager.push({'request': dummy_request, 'registry': app.registry})
-    for i, uuid in enumerate(collection):
-        item = root.get_by_uuid(uuid)
-        dummy_request.context = item
+class FilesAWS(Backfill):
+    """ Record the size and S3 key of the files processed, save the others upgraded
+    """
+    item_types = ('file',)
+
+    def __init__(self, files):
+        self.files = files
+
+    def change(self, item):
         properties = item.upgrade_properties()
         sheets = None
-        value = files.get(str(uuid))
+        value = self.files.get(str(item.uuid))
         if value is not None:
             properties['file_size'] = value['file_size']
             sheets = {
@@ -34,9 +37,12 @@ def run(app, files):
                     'key': value['s3_file_name'],
                 },
             }
-        item.update(properties, sheets=sheets)
-        if (i + 1) % 100 == 0:
-            logger.info('Updated %d', i + 1)
+        return properties, sheets
+
+
+def run(app, files, batchsize=500, dry_run=False, checkpoint=None):
+    return run_backfill(
+        app, FilesAWS(files), batchsize=batchsize, dry_run=dry_run, checkpoint=checkpoint)
 
 
 def main():
@@ -46,7 +52,8 @@ def main():
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
     parser.add_argument('--app-name', help="Pyramid app name in configfile")
-    parser.add_argument('--abort', action='store_true', help="Rollback transaction")
+    parser.add_argument('--abort', action='store_true', help="Same as --dry-run")
+    add_arguments(parser)
     parser.add_argument('files_processed', type=argparse.FileType('rb'), help="path to json file")
     parser.add_argument('config_uri', help="path to configfile")
     args = parser.parse_args()
@@ -60,18 +67,7 @@ def main():
     good_files = {v['uuid']: v for v in files_processed
         if 'errors' not in v and 'blacklisted' not in v}
 
-    raised = False
-    try:
-        run(app, good_files)
-    except:
-        raised = True
-        raise
-    finally:
-        if raised or args.abort:
-            transaction.abort()
-            logger.info('Rolled back.')
-        else:
-            transaction.commit()
+    run(app, good_files, args.batchsize, args.dry_run or args.abort, args.checkpoint)
 
 
 if __name__ == '__main__':
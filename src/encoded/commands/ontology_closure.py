@@ -0,0 +1,217 @@
+"""\
+Transitive closures over the ontology term graph for generate-ontology.
+
+Term ids are interned to integers and the strongly connected components of
+the graph are found with an iterative Tarjan walk, which emits every
+component after all the components it can reach. Walking the components in
+that order, each component's result is the union of its successors' results,
+so every closure is computed exactly once. Ontologies are not guaranteed to
+be acyclic (part_of loops do occur) which is why cycles are collapsed into
+components rather than assumed away.
+
+Slims only ever ask whether one of a few dozen slim terms is in a closure,
+so reachability of those targets is tracked as an integer bitmask per
+component instead of materialising every closure.
+
+Benchmark on a synthetic DAG:
+
+    %(prog)s --terms 200000
+
+"""
+import random
+import time
+
+EPILOG = __doc__
+
+
+class ClosureEngine(object):
+    """ Reachability over the term graph given by terms[term_id][edges]
+
+    Edges to ids missing from terms are kept as leaves.
+    """
+    def __init__(self, terms, edges):
+        self.ids = list(terms)
+        self.index = {term_id: i for i, term_id in enumerate(self.ids)}
+        self.successors = []
+        for term_id in list(self.ids):
+            self.successors.append([
+                self._intern(target) for target in terms[term_id][edges] or ()
+            ])
+        while len(self.successors) < len(self.ids):
+            self.successors.append([])
+        self.components, self.component_of = self._strongly_connected_components()
+
+    def _intern(self, term_id):
+        i = self.index.get(term_id)
+        if i is None:
+            i = self.index[term_id] = len(self.ids)
+            self.ids.append(term_id)
+        return i
+
+    def _strongly_connected_components(self):
+        # Iterative Tarjan: recursion would overflow on deep ontologies.
+        successors = self.successors
+        count = len(successors)
+        index_of = [-1] * count
+        lowlink = [0] * count
+        on_stack = [False] * count
+        stack = []
+        components = []
+        component_of = [-1] * count
+        next_index = 0
+        for root in range(count):
+            if index_of[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, position = work.pop()
+                if position == 0:
+                    index_of[node] = lowlink[node] = next_index
+                    next_index += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                targets = successors[node]
+                while position < len(targets):
+                    target = targets[position]
+                    position += 1
+                    if index_of[target] == -1:
+                        work.append((node, position))
+                        work.append((target, 0))
+                        break
+                    if on_stack[target] and index_of[target] < lowlink[node]:
+                        lowlink[node] = index_of[target]
+                else:
+                    if lowlink[node] == index_of[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            component_of[member] = len(components)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+                    if work:
+                        parent = work[-1][0]
+                        if lowlink[node] < lowlink[parent]:
+                            lowlink[parent] = lowlink[node]
+        return components, component_of
+
+    def reachable_masks(self, targets):
+        """ Map each term id to a bitmask of the targets in its closure
+
+        Bit n is set when targets[n] is the term itself or one of its
+        ancestors.
+        """
+        own = [0] * len(self.components)
+        for bit, target in enumerate(targets):
+            i = self.index.get(target)
+            if i is not None:
+                own[self.component_of[i]] |= 1 << bit
+        masks = [0] * len(self.components)
+        for c, component in enumerate(self.components):
+            mask = own[c]
+            for member in component:
+                for target in self.successors[member]:
+                    mask |= masks[self.component_of[target]]
+            masks[c] = mask
+        return {
+            term_id: masks[self.component_of[i]]
+            for term_id, i in self.index.items()
+        }
+
+    def closure(self, term_id):
+        """ The term and all its ancestors
+        """
+        seen = {self.component_of[self.index[term_id]]}
+        pending = list(seen)
+        while pending:
+            c = pending.pop()
+            for member in self.components[c]:
+                for target in self.successors[member]:
+                    target_component = self.component_of[target]
+                    if target_component not in seen:
+                        seen.add(target_component)
+                        pending.append(target_component)
+        return {self.ids[member] for c in seen for member in self.components[c]}
+
+
+def slims_by_term(engines, slim_types):
+    """ Evaluate every slim type for every term in one pass per closure
+
+    engines maps a closure name to its ClosureEngine and slim_types is a list
+    of (slim_type, closure_name, {slim_term_id: slim_name}). Slim names are
+    listed in the order of the slim dict, as getSlims does.
+    """
+    result = {}
+    for closure_name, engine in engines.items():
+        selected = [
+            (slim_type, slim_terms) for slim_type, name, slim_terms in slim_types
+            if name == closure_name
+        ]
+        targets = []
+        decoders = []
+        for slim_type, slim_terms in selected:
+            first = len(targets)
+            targets.extend(slim_terms)
+            decoders.append((slim_type, first, list(slim_terms.values())))
+        for term_id, mask in engine.reachable_masks(targets).items():
+            slims = result.setdefault(term_id, {})
+            for slim_type, first, names in decoders:
+                slims[slim_type] = [
+                    slim_name for n, slim_name in enumerate(names)
+                    if mask >> (first + n) & 1
+                ]
+    return result
+
+
+def synthetic_terms(count, max_parents=3, seed=0):
+    """ A random DAG shaped like the term dicts generate-ontology builds
+    """
+    rng = random.Random(seed)
+    terms = {}
+    for n in range(count):
+        term_id = 'SYN:%07d' % n
+        parents = []
+        if n:
+            parents = sorted({
+                'SYN:%07d' % rng.randrange(max(0, n - 1000), n)
+                for _ in range(rng.randint(1, max_parents))
+            })
+        terms[term_id] = {'data': parents}
+    return terms
+
+
+def benchmark(count, slim_count=60, seed=0):
+    terms = synthetic_terms(count, seed=seed)
+    slim_terms = {'SYN:%07d' % n: 'slim %d' % n for n in range(0, count, max(1, count // slim_count))}
+    start = time.time()
+    engine = ClosureEngine(terms, 'data')
+    built = time.time()
+    slims = slims_by_term({'data': engine}, [('organ', 'data', slim_terms)])
+    done = time.time()
+    return {
+        'terms': count,
+        'components': len(engine.components),
+        'slim_terms': len(slim_terms),
+        'terms_with_slims': sum(1 for term_slims in slims.values() if term_slims['organ']),
+        'build_seconds': built - start,
+        'slims_seconds': done - built,
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark ontology closures on a synthetic DAG", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--terms', type=int, default=200000, help="Number of synthetic terms")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for key, value in benchmark(args.terms, seed=args.seed).items():
+        print('%s: %s' % (key, value))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,12 @@ For the development.ini you must supply the paster app name:
 
     %(prog)s development.ini --app-name app "/experiments/ENCSR000ADI/?format=json&datastore=database"
 
+Write collapsed stacks for a flamegraph instead of cProfile stats:
+
+    %(prog)s development.ini --app-name app --sampling --filename search.folded "/search/?type=Experiment"
+
+Live workers can be sampled with the /_profiler admin endpoint.
+
 """
 import logging
 import cProfile
@@ -47,7 +53,30 @@ def parse_restriction(value):
     return value
 
 
-def run(testapp, method, path, data, warm_ups, filename, sortby, stats, callers, callees, response_body):
+def run_sampling(fn, path, filename, interval):
+    from encoded.sampling_profiler import (
+        MAX_DURATION,
+        SamplingProfiler,
+    )
+    profiler = SamplingProfiler()
+    profiler.start(duration=MAX_DURATION, interval=interval)
+    profiler.enter(path)
+    try:
+        res = fn()
+    finally:
+        profiler.leave()
+        profiler.stop()
+    logger.info('Run (%d samples):\n\t%s', profiler.samples, res.headers['X-Stats'].replace('&', '\n\t'))
+    if filename is None:
+        print(profiler.collapsed(), end='')
+    else:
+        with open(filename, 'w') as f:
+            f.write(profiler.collapsed())
+    return res
+
+
+def run(testapp, method, path, data, warm_ups, filename, sortby, stats, callers, callees, response_body,
+        sampling=False, interval=0.001):
     method = method.lower()
     if method == 'get':
         fn = lambda: testapp.get(path)
@@ -56,6 +85,11 @@ def run(testapp, method, path, data, warm_ups, filename, sortby, stats, callers,
     for n in range(warm_ups):
         res = fn()
         logger.info('Warm up %d:\n\t%s', n + 1, res.headers['X-Stats'].replace('&', '\n\t'))
+    if sampling:
+        res = run_sampling(fn, path, filename, interval)
+        if response_body:
+            print(res.text)
+        return
     pr = cProfile.Profile()
     pr.enable()
     res = fn()
@@ -88,6 +122,10 @@ def main():
     parser.add_argument('--callee', default=[], action='append', help="print_callees restrictions")
     parser.add_argument('--sortby', default='time', help="profile sortby")
     parser.add_argument('--response-body', action='store_true', help="Print response body")
+    parser.add_argument(
+        '--sampling', action='store_true',
+        help="Sample stacks and write collapsed stacks to --filename or stdout")
+    parser.add_argument('--interval', default=0.001, type=float, help="Sampling interval in seconds")
     parser.add_argument('--method', default='GET', help="HTTP method")
     parser.add_argument('--data', help="json request body")
     parser.add_argument(
@@ -107,7 +145,7 @@ def main():
     logging.getLogger('encoded').setLevel(logging.DEBUG)
 
     run(testapp, args.method, args.path, args.data, args.warm_ups, args.filename, args.sortby,
-        args.stat, args.caller, args.callee, args.response_body)
+        args.stat, args.caller, args.callee, args.response_body, args.sampling, args.interval)
 
 
 if __name__ == '__main__':
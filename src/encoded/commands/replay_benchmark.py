@@ -0,0 +1,243 @@
+"""\
+Replay a recorded request mix against a local app and report latency.
+
+The mix is read from Apache access logs (GET and HEAD requests only) or
+from a file of paths, one per line. Without either a default mix of search,
+report, matrix, metadata, batch_hub and region-search requests that works
+against the test inserts is used.
+
+Latency percentiles and throughput are reported per route. Results can be
+saved as a baseline and later runs compared against it, exiting non-zero
+when a route is slower than the baseline by more than the tolerance.
+
+Examples
+
+Record a baseline against a development server loaded with the test inserts:
+
+    %(prog)s development.ini --app-name app --repeat 5 --save-baseline baseline.json
+
+Check a change for regressions, replaying a production access log:
+
+    %(prog)s development.ini --app-name app --access-log access.log --baseline baseline.json
+
+"""
+from collections import (
+    OrderedDict,
+    defaultdict,
+)
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import re
+import sys
+import time
+
+from encoded.stats_util import percentile
+
+
+EPILOG = __doc__
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = [
+    '/search/?type=Experiment',
+    '/search/?type=Experiment&assay_title=ChIP-seq&status=released',
+    '/search/?searchTerm=skin&type=Biosample',
+    '/report/?type=Experiment&field=accession&field=assay_term_name&field=biosample_ontology.term_name',
+    '/report.tsv?type=Experiment&field=accession&field=status',
+    '/matrix/?type=Experiment',
+    '/summary/?type=Experiment',
+    '/metadata/?type=Experiment&status=released',
+    '/batch_hub/type%3DExperiment%2C%26status%3Dreleased/hub.txt',
+    '/region-search/?region=chr1:1-2000000&genome=GRCh38',
+    '/top-hits/?searchTerm=heart',
+]
+
+ACCESS_LOG_REQUEST = re.compile(r'"(GET|HEAD) (\S+) HTTP/[\d.]+"')
+SKIP_PATHS = ('limit=all', '/static/', 'favicon', '.png', '.ico', '@@download')
+PERCENTILES = (50, 90, 99)
+
+
+def read_access_log(lines, max_requests=None):
+    """ Request paths from Apache common or combined log lines
+    """
+    paths = []
+    for line in lines:
+        match = ACCESS_LOG_REQUEST.search(line)
+        if match is None:
+            continue
+        path = match.group(2)
+        if any(skip in path for skip in SKIP_PATHS):
+            continue
+        paths.append(path)
+        if max_requests and len(paths) >= max_requests:
+            break
+    return paths
+
+
+def read_paths(lines):
+    return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+def route_name(app, path):
+    """ Name of the Pyramid route matching path, or its first path segment
+    """
+    routes_mapper = getattr(app, 'routes_mapper', None)
+    if routes_mapper is not None:
+        from pyramid.request import Request
+        route = routes_mapper(Request.blank(path))['route']
+        if route is not None:
+            return route.name
+    segment = path.split('?', 1)[0].strip('/').split('/', 1)[0]
+    return 'traverse:' + segment if segment else 'traverse:/'
+
+
+def summarize(timings, errors, elapsed):
+    """ Per route latency percentiles in ms and throughput in requests/s
+    """
+    summary = OrderedDict()
+    for route in sorted(timings):
+        durations = timings[route]
+        summary[route] = OrderedDict(
+            [('count', len(durations)), ('errors', errors.get(route, 0))]
+            + [('p%d' % pct, round(percentile(durations, pct / 100.0) * 1000, 2)) for pct in PERCENTILES]
+            + [
+                ('max', round(max(durations) * 1000, 2)),
+                ('throughput', round(len(durations) / elapsed, 2) if elapsed else None),
+            ]
+        )
+    return summary
+
+
+def compare(summary, baseline, tolerance=0.2, min_ms=5.0, keys=('p50', 'p90')):
+    """ Routes slower than the baseline by more than tolerance
+
+    Differences below min_ms are ignored so fast routes do not fail on noise.
+    """
+    regressions = []
+    for route, result in summary.items():
+        base = baseline.get(route)
+        if base is None:
+            continue
+        for key in keys:
+            if base.get(key) is None or result.get(key) is None:
+                continue
+            if result[key] - base[key] > max(base[key] * tolerance, min_ms):
+                regressions.append((route, key, base[key], result[key]))
+        if result['errors'] > base.get('errors', 0):
+            regressions.append((route, 'errors', base.get('errors', 0), result['errors']))
+    return regressions
+
+
+def replay(testapp, paths, repeat=1, warm_ups=1, concurrency=1):
+    routes = {path: route_name(testapp.app, path) for path in paths}
+    for _ in range(warm_ups):
+        for path in paths:
+            testapp.get(path, status='*')
+
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+
+    def fetch(path):
+        start = time.time()
+        try:
+            res = testapp.get(path, status='*')
+            # Streamed responses are only produced when read.
+            res.body
+            status = res.status
+        except Exception:
+            logger.exception('Request raised: %s', path)
+            status = None
+        return path, time.time() - start, status
+
+    requests = [path for _ in range(repeat) for path in paths]
+    start = time.time()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(fetch, requests))
+    else:
+        results = [fetch(path) for path in requests]
+    elapsed = time.time() - start
+    for path, duration, status in results:
+        timings[routes[path]].append(duration)
+        if status is None or int(status.split()[0]) >= 400:
+            errors[routes[path]] += 1
+            logger.error('Request failed (%s): %s', status, path)
+    return summarize(timings, errors, elapsed)
+
+
+def format_summary(summary):
+    columns = ['count', 'errors'] + ['p%d' % pct for pct in PERCENTILES] + ['max', 'throughput']
+    width = max([len('route')] + [len(route) for route in summary])
+    lines = ['%-*s %s' % (width, 'route', ' '.join('%10s' % column for column in columns))]
+    for route, result in summary.items():
+        lines.append('%-*s %s' % (
+            width, route, ' '.join('%10s' % result[column] for column in columns)))
+    return '\n'.join(lines)
+
+
+def internal_app(configfile, app_name=None, username=None):
+    from pyramid import paster
+    from webtest import TestApp
+    app = paster.get_app(configfile, app_name)
+    environ = {
+        'HTTP_ACCEPT': 'application/json',
+    }
+    if username:
+        environ['REMOTE_USER'] = username
+    return TestApp(app, environ)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Replay a request mix and report latency per route", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--username', '-u', help="User uuid/email, anonymous by default")
+    parser.add_argument('--access-log', help="Apache access log to replay")
+    parser.add_argument('--paths', help="File of paths to replay, one per line")
+    parser.add_argument('--max-requests', type=int, default=5000, help="Paths read from the access log")
+    parser.add_argument('--repeat', type=int, default=3, help="Times the mix is replayed")
+    parser.add_argument('--warm-ups', type=int, default=1, help="Unmeasured replays first")
+    parser.add_argument('--concurrency', type=int, default=1, help="Requests in flight")
+    parser.add_argument('--baseline', help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', help="Save the results as a baseline")
+    parser.add_argument(
+        '--tolerance', type=float, default=0.2, help="Allowed slowdown as a fraction of the baseline")
+    parser.add_argument('config_uri', help="path to configfile")
+    args = parser.parse_args()
+
+    logging.basicConfig()
+    testapp = internal_app(args.config_uri, args.app_name, args.username)
+    # Loading app will have configured from config file. Reconfigure here:
+    logging.getLogger('encoded').setLevel(logging.INFO)
+
+    if args.access_log:
+        with open(args.access_log) as f:
+            paths = read_access_log(f, args.max_requests)
+    elif args.paths:
+        with open(args.paths) as f:
+            paths = read_paths(f)
+    else:
+        paths = DEFAULT_MIX
+
+    summary = replay(testapp, paths, args.repeat, args.warm_ups, args.concurrency)
+    print(format_summary(summary))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(summary, f, indent=4)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.tolerance)
+        for route, key, before, after in regressions:
+            logger.error('Regression %s %s: %s -> %s', route, key, before, after)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
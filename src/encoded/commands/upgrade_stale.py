@@ -0,0 +1,170 @@
+"""\
+Upgrade and save only the items stored with an old schema_version.
+
+Unlike batchupgrade, which loads every item, the stale items are found with
+one query per type. Batches are saved by the /batch_upgrade view in parallel
+workers and progress is logged with a rate and estimated time left.
+
+Examples
+
+Count the stale items without changing anything:
+
+    %(prog)s development.ini --app-name app --dry-run
+
+Upgrade files only on the production server:
+
+    %(prog)s production.ini --app-name app --item-types file --processes 8
+
+"""
+import logging
+import time
+import transaction
+
+from collections import Counter
+from snovault import (
+    DBSESSION,
+    TYPES,
+)
+from snovault.batchupgrade import (
+    BATCH_UPGRADE_LOG,
+    _internal_app,
+    _pool_batch_results,
+    _pool_initializer,
+    _pool_worker,
+    _summarize_results,
+)
+
+
+EPILOG = __doc__
+
+STALE_QUERY = """
+SELECT resources.rid, propsheets.properties ->> 'schema_version'
+FROM resources
+JOIN current_propsheets
+    ON current_propsheets.rid = resources.rid AND current_propsheets.name = ''
+JOIN propsheets ON propsheets.sid = current_propsheets.sid
+WHERE resources.item_type = :item_type
+AND coalesce(propsheets.properties ->> 'schema_version', '') <> :schema_version
+ORDER BY resources.rid
+"""
+
+
+def stale_items(registry, item_types=None):
+    """ Yield (item_type, uuid, schema_version) for items not at the target version
+    """
+    from sqlalchemy import text
+    session = registry[DBSESSION]()
+    types = registry[TYPES]
+    for item_type, type_info in sorted(types.by_item_type.items()):
+        if item_types and item_type not in item_types:
+            continue
+        if type_info.schema_version is None:
+            continue
+        rows = session.execute(
+            text(STALE_QUERY),
+            {'item_type': item_type, 'schema_version': type_info.schema_version},
+        )
+        for rid, schema_version in rows:
+            yield item_type, str(rid), schema_version or ''
+
+
+def format_progress(done, total, elapsed):
+    rate = done / elapsed if elapsed else 0.0
+    remaining = (total - done) / rate if rate else 0.0
+    return "{} of {} ({:.1f} items/s, {:.0f}s left)".format(done, total, rate, remaining)
+
+
+def run_pool(uuids, item_types, args):
+    from multiprocessing import get_context
+    from multiprocessing.pool import Pool
+    transaction.abort()
+    pool = Pool(
+        processes=args.processes,
+        initializer=_pool_initializer,
+        initargs=(args.config_uri, args.app_name, args.username),
+        context=get_context('forkserver'),
+        maxtasksperchild=args.maxtasksperchild,
+    )
+    totals = Counter(item_types[uuid] for uuid in uuids)
+    done_by_type = Counter()
+    all_results = []
+    start = time.time()
+    try:
+        pool_gen = pool.imap_unordered(
+            _pool_worker,
+            _pool_batch_results(uuids, args.batchsize),
+            chunksize=args.chunksize,
+        )
+        for result in pool_gen:
+            results = result['results']
+            all_results.extend(results)
+            for _, uuid, _, error, error_msg in results:
+                done_by_type[item_types[uuid]] += 1
+                if error:
+                    BATCH_UPGRADE_LOG.error("\t%s", error_msg)
+            BATCH_UPGRADE_LOG.info(
+                "Upgraded %s: %s",
+                format_progress(len(all_results), len(uuids), time.time() - start),
+                ', '.join(
+                    '{} {}/{}'.format(item_type, done_by_type[item_type], total)
+                    for item_type, total in sorted(totals.items())
+                    if done_by_type[item_type] < total
+                ) or 'all types done',
+            )
+    finally:
+        pool.terminate()
+        pool.join()
+    return all_results
+
+
+def main():
+    import argparse
+    from pyramid import paster
+    parser = argparse.ArgumentParser(
+        description="Upgrade items stored with an old schema_version", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('config_uri', help="path to configfile")
+    parser.add_argument('--app-name', help="Pyramid app name in configfile")
+    parser.add_argument('--batchsize', type=int, default=200)
+    parser.add_argument('--chunksize', type=int, default=1)
+    parser.add_argument('--item-types', action='append', default=[])
+    parser.add_argument('--maxtasksperchild', type=int, default=10)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--username')
+    parser.add_argument(
+        '--dry-run', action='store_true', help="Only count the stale items")
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    paster.setup_logging(args.config_uri)
+    logging.getLogger('snovault').setLevel(logging.INFO)
+    testapp = _internal_app(args.config_uri, app_name=args.app_name, username=args.username)
+
+    item_types = {}
+    versions = Counter()
+    for item_type, uuid, schema_version in stale_items(testapp.app.registry, args.item_types):
+        item_types[uuid] = item_type
+        versions[(item_type, schema_version)] += 1
+    for (item_type, schema_version), count in sorted(versions.items()):
+        BATCH_UPGRADE_LOG.info(
+            "Stale %s: %d at schema_version %r", item_type, count, schema_version)
+    if not item_types:
+        BATCH_UPGRADE_LOG.warning('No stale items to upgrade.')
+        return
+    if args.dry_run:
+        return
+    uuids = list(item_types)
+    BATCH_UPGRADE_LOG.info(
+        "Start Upgrade with %d items: %d, %d, %d, %d",
+        len(uuids), args.batchsize, args.chunksize, args.processes, args.maxtasksperchild,
+    )
+    pool_start = time.time()
+    all_results = run_pool(uuids, item_types, args)
+    runtime_mins_str = "{:0.2f} minutes".format((time.time() - pool_start) / 60)
+    BATCH_UPGRADE_LOG.info('End Upgrade')
+    _summarize_results(all_results, runtime_str=runtime_mins_str, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    main()
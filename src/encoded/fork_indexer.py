@@ -0,0 +1,145 @@
+""" Indexer workers forked from the already built app
+
+By default every multiprocessing indexer worker builds its own app from
+APP_FACTORY, scanning the config, loading schemas and parsing the
+ontology again. With indexer.fork = true the indexer process starts its
+workers by forking once the app is built. The workers share the read
+only registries with it copy on write.
+
+Connections are never shared with a worker. The database pool is emptied
+before forking, and a worker drops any pooled connection opened by
+another process when checking it out. Elasticsearch and S3 clients start
+with new connection pools in the worker.
+
+Workers are forked once, from a new thread, at the end of encoded.main
+before any request is served, and are kept rather than replaced after
+each task. If the pool has to be replaced after an error, the default
+forkserver pool takes over.
+"""
+from multiprocessing import get_context
+from multiprocessing.pool import Pool
+from pyramid.settings import asbool
+from snovault import DBSESSION
+from snovault.elasticsearch.indexer import INDEXER
+from snovault.elasticsearch.mpindexer import MPIndexer
+import logging
+import os
+import threading
+
+
+log = logging.getLogger(__name__)
+
+app = None
+
+
+def includeme(config):
+    settings = config.registry.settings
+    if not asbool(settings.get('indexer')) or not asbool(settings.get('indexer.fork', False)):
+        return
+    if not isinstance(config.registry.get(INDEXER), MPIndexer):
+        return
+    config.registry[INDEXER] = ForkMPIndexer(
+        config.registry, processes=settings.get('indexer.processes'))
+    install_pid_guard(get_engine(config.registry))
+
+
+def get_engine(registry):
+    return registry[DBSESSION].session_factory.kw['bind']
+
+
+def install_pid_guard(engine):
+    """ Drop pooled connections opened by another process on checkout
+    """
+    from sqlalchemy import event, exc
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        connection_record.info['pid'] = os.getpid()
+
+    @event.listens_for(engine, 'checkout')
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info.get('pid', pid) != pid:
+            connection_record.connection = connection_proxy.connection = None
+            raise exc.DisconnectionError(
+                'Connection record belongs to pid %s, attempting to check out in pid %s' %
+                (connection_record.info['pid'], pid)
+            )
+
+
+def reset_urllib3_pool(pool):
+    # Same as a new HTTPConnectionPool, the inherited sockets are left to the parent.
+    maxsize = pool.pool.maxsize
+    pool.pool = pool.QueueCls(maxsize)
+    for _ in range(maxsize):
+        pool.pool.put(None)
+
+
+def reset_connections(registry):
+    from elasticsearch import Elasticsearch
+    from encoded.s3_signer import S3_SIGNER
+    for value in list(registry.values()):
+        if isinstance(value, Elasticsearch):
+            for connection in value.transport.connection_pool.connections:
+                reset_urllib3_pool(connection.pool)
+    signer = registry.get(S3_SIGNER)
+    if signer is not None:
+        signer.reset()
+
+
+def fork_initializer():
+    """ Worker set up in place of snovault.elasticsearch.mpindexer.initializer
+    """
+    import atexit
+    import signal
+    from snovault.elasticsearch import mpindexer
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    mpindexer.app = app
+    mpindexer.current_xmin_snapshot_id = None
+    reset_connections(app.registry)
+    atexit.register(mpindexer.clear_snapshot)
+    signal.signal(signal.SIGALRM, mpindexer.clear_snapshot)
+
+
+class ForkMPIndexer(MPIndexer):
+    # Forked workers are cheap to keep, rebuilding them is not.
+    fork_maxtasks = None
+
+    def __init__(self, registry, processes=None):
+        super(ForkMPIndexer, self).__init__(registry, processes=processes)
+        self.registry = registry
+
+    @property
+    def processes(self):
+        if self.queue_worker is not None:
+            return self.queue_worker.processes
+        return self._get_queue_options(self.registry)['processes']
+
+    def fork_pool(self):
+        get_engine(self.registry).dispose()
+        pools = []
+        # Forking from a new thread leaves the thread locals of the caller behind.
+        thread = threading.Thread(
+            target=lambda: pools.append(Pool(
+                processes=self.processes,
+                initializer=fork_initializer,
+                maxtasksperchild=self.fork_maxtasks,
+                context=get_context('fork'),
+            )),
+            name='fork-indexer-pool',
+        )
+        thread.start()
+        thread.join()
+        self.__dict__['pool'] = pools[0]
+        log.info('Forked %d indexer workers from pid %d', self.processes, os.getpid())
+
+
+def fork_workers(wsgi_app):
+    """ Start the workers of a fork indexer, once the app is completely built
+    """
+    global app
+    indexer = wsgi_app.registry.get(INDEXER)
+    if not isinstance(indexer, ForkMPIndexer):
+        return
+    app = wsgi_app
+    indexer.fork_pool()
@@ -1,9 +1,13 @@
 from past.builtins import basestring
+from pyramid.view import view_config
 from .typedsheets import cast_row_values
 from functools import reduce
 import io
+import json
 import logging
 import os.path
+import re
+import time
 
 text = type(u'')
 
@@ -190,6 +194,11 @@ IS_ATTACHMENT = [
 ]
 
 
+def includeme(config):
+    config.add_route('batch_load', '/batch_load')
+    config.scan(__name__)
+
+
 def _reset_log_level(log_level):
     '''
     Resets the default log level, usually for running bin tests
@@ -317,26 +326,25 @@ def add_attachments(docsdir):
 
 
 def read_single_sheet(path, name=None):
-    """ Read an xlsx, csv or tsv from a zipfile or directory
+    """ Read an xlsx, csv, tsv, json or ndjson from a zipfile or directory
     """
     from zipfile import ZipFile
     from . import xlreader
 
     if name is None:
         root, ext = os.path.splitext(path)
-        stream = open(path, 'r')
 
         if ext == '.xlsx':
-            return read_xl(stream)
+            return read_xl(open(path, 'rb'))
 
         if ext == '.tsv':
-            return read_csv(stream, dialect='excel-tab')
+            return read_csv(open(path, newline=''), dialect='excel-tab')
 
         if ext == '.csv':
-            return read_csv(stream)
+            return read_csv(open(path, newline=''))
 
-        if ext == '.json':
-            return read_json(stream)
+        if ext in JSON_EXTENSIONS:
+            return read_json(open(path, 'r'))
 
         raise ValueError('Unknown file extension for %r' % path)
 
@@ -352,16 +360,17 @@ def read_single_sheet(path, name=None):
             return read_xl(stream)
 
         if (name + '.tsv') in names:
-            stream = io.TextIOWrapper(zf.open(name + '.tsv'), encoding='utf-8')
+            stream = io.TextIOWrapper(zf.open(name + '.tsv'), encoding='utf-8', newline='')
             return read_csv(stream, dialect='excel-tab')
 
         if (name + '.csv') in names:
-            stream = io.TextIOWrapper(zf.open(name + '.csv'), encoding='utf-8')
+            stream = io.TextIOWrapper(zf.open(name + '.csv'), encoding='utf-8', newline='')
             return read_csv(stream)
 
-        if (name + '.json') in names:
-            stream = io.TextIOWrapper(zf.open(name + '.json'), encoding='utf-8')
-            return read_json(stream)
+        for ext in JSON_EXTENSIONS:
+            if (name + ext) in names:
+                stream = io.TextIOWrapper(zf.open(name + ext), encoding='utf-8')
+                return read_json(stream)
 
     if os.path.isdir(path):
         root = os.path.join(path, name)
@@ -371,20 +380,24 @@ def read_single_sheet(path, name=None):
             return read_xl(stream)
 
         if os.path.exists(root + '.tsv'):
-            stream = open(root + '.tsv', 'rU')
+            stream = open(root + '.tsv', newline='')
             return read_csv(stream, dialect='excel-tab')
 
         if os.path.exists(root + '.csv'):
-            stream = open(root + '.csv', 'rU')
+            stream = open(root + '.csv', newline='')
             return read_csv(stream)
 
-        if os.path.exists(root + '.json'):
-            stream = open(root + '.json', 'r')
-            return read_json(stream)
+        for ext in JSON_EXTENSIONS:
+            if os.path.exists(root + ext):
+                stream = open(root + ext, 'r')
+                return read_json(stream)
 
     return []
 
 
+JSON_EXTENSIONS = ['.json', '.ndjson', '.jsonl']
+
+
 def read_xl(stream):
     from . import xlreader
     return cast_row_values(xlreader.DictReader(stream))
@@ -395,12 +408,142 @@ def read_csv(stream, **kw):
     return cast_row_values(csv.DictReader(stream, **kw))
 
 
-def read_json(stream):
-    import json
-    obj = json.load(stream)
-    if isinstance(obj, dict):
-        return [obj]
-    return obj
+class JSONRowReader(object):
+    """ Objects of a JSON array, a single object or NDJSON, read in chunks
+
+    Each object is delimited by scanning for its closing brace, carrying
+    the scan state from chunk to chunk, then parsed once. Anything but
+    objects separated as the format requires is an error.
+    """
+    NONSPACE = re.compile(r'[^ \t\r\n]')
+    STRUCTURE = re.compile(r'[{}\[\]"]')
+    STRING_END = re.compile(r'["\\]')
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0
+        self.eof = False
+
+    def error(self, message):
+        return ValueError('%s at character %d' % (message, self.offset + self.pos))
+
+    def fill(self):
+        """ Read the next chunk once the current one is used up
+        """
+        if self.pos < len(self.buf) or self.eof:
+            return
+        self.offset += len(self.buf)
+        self.buf = self.stream.read(self.chunk_size)
+        self.pos = 0
+        self.eof = not self.buf
+
+    def peek(self):
+        """ Next character that is not whitespace, or '' at the end
+        """
+        while True:
+            self.fill()
+            if self.eof:
+                return ''
+            match = self.NONSPACE.search(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return self.buf[self.pos]
+            self.pos = len(self.buf)
+
+    def expect_end(self):
+        if self.peek() != '':
+            raise self.error('Unexpected data after JSON array')
+
+    def read_object(self):
+        if self.peek() != '{':
+            raise self.error('Expected a JSON object')
+        parts = []
+        start = self.pos
+        depth = 0
+        in_string = False
+        while True:
+            if self.pos == len(self.buf):
+                parts.append(self.buf[start:])
+                self.fill()
+                if self.eof:
+                    raise self.error('Unterminated JSON object')
+                start = 0
+            if in_string:
+                match = self.STRING_END.search(self.buf, self.pos)
+                if match is None:
+                    self.pos = len(self.buf)
+                elif match.group() == '"':
+                    in_string = False
+                    self.pos = match.end()
+                elif match.end() < len(self.buf):
+                    # Skip the escaped character.
+                    self.pos = match.end() + 1
+                else:
+                    # The escaped character is in the next chunk.
+                    parts.append(self.buf[start:])
+                    self.pos = len(self.buf)
+                    self.fill()
+                    if self.eof:
+                        raise self.error('Unterminated JSON object')
+                    start = 0
+                    self.pos = 1
+                continue
+            match = self.STRUCTURE.search(self.buf, self.pos)
+            if match is None:
+                self.pos = len(self.buf)
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    parts.append(self.buf[start:self.pos])
+                    break
+        try:
+            return json.loads(''.join(parts))
+        except ValueError as e:
+            raise self.error('Invalid JSON object (%s)' % e)
+
+    def __iter__(self):
+        char = self.peek()
+        if char != '[':
+            while char != '':
+                yield self.read_object()
+                char = self.peek()
+            return
+        self.pos += 1
+        if self.peek() == ']':
+            self.pos += 1
+            self.expect_end()
+            return
+        while True:
+            yield self.read_object()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                self.expect_end()
+                return
+            if char != ',':
+                self.pos -= 1
+                if char == '':
+                    raise self.error('Unterminated JSON array')
+                raise self.error('Expected , or ] in JSON array')
+
+
+def read_json(stream, chunk_size=64 * 1024):
+    """ Yield objects one at a time from a JSON array, object or NDJSON stream
+
+    The stream is read in chunks so memory use is bounded by the largest
+    single object rather than the size of the file.
+    """
+    return iter(JSONRowReader(stream, chunk_size))
 
 
 ##############################################################################
@@ -459,6 +602,101 @@ def make_request(testapp, item_type, method):
     return component
 
 
+class BulkResponse(object):
+    """ Stand-in for a webtest response to a single row of a batch load
+    """
+    def __init__(self, status, location=None, json=None):
+        self.status = status
+        self.status_int = int(status.split(' ', 1)[0])
+        self.location = location
+        self.json = json
+
+
+def make_bulk_request(testapp, item_type, method, batchsize):
+    """ Post rows to /batch_load, batchsize rows per transaction
+
+    Rows are yielded in their original order so row numbers in the log stay
+    meaningful.
+    """
+    def post_batch(pending):
+        batch = [
+            {'url': row['_url'], 'value': row['_value']}
+            for row in pending if '_value' in row
+        ]
+        if not batch:
+            return
+        res = testapp.post_json('/batch_load', {'method': method, 'batch': batch})
+        results = iter(res.json['results'])
+        for row in pending:
+            if '_value' in row:
+                row['_response'] = BulkResponse(**next(results))
+
+    def component(rows):
+        pending = []
+        for row in rows:
+            if not (row.get('_skip') or row.get('_errors') or not row.get('_url')):
+                row['_value'] = {
+                    k: v for k, v in row.items() if not k.startswith('_') and not k.startswith('@')
+                }
+            pending.append(row)
+            if len(pending) >= batchsize:
+                post_batch(pending)
+                yield from pending
+                pending = []
+        post_batch(pending)
+        yield from pending
+
+    return component
+
+
+@view_config(route_name='batch_load', request_method='POST', permission='import_items')
+def batch_load(request):
+    """ Create or replace a batch of items in a single transaction
+
+    Each row is a subrequest against the normal collection or item views so
+    validation and server defaults behave exactly as for a single request.
+    A savepoint per row keeps one failed row from aborting the batch.
+    """
+    from pyramid.httpexceptions import HTTPException
+    from snovault import DBSESSION
+    from snovault.embed import make_subrequest
+    from snovault.validation import ValidationFailure
+    from sqlalchemy.exc import IntegrityError
+    request.datastore = 'database'
+    method = request.json['method']
+    session = request.registry[DBSESSION]()
+    results = []
+    for row in request.json['batch']:
+        subreq = make_subrequest(request, row['url'] + '?render=false')
+        subreq.method = method
+        subreq.content_type = 'application/json'
+        subreq.body = json.dumps(row['value']).encode('utf-8')
+        subreq.datastore = 'database'
+        sp = session.begin_nested()
+        try:
+            response = request.invoke_subrequest(subreq)
+            sp.commit()
+        except IntegrityError as e:
+            sp.rollback()
+            results.append({'status': '409 Conflict', 'json': {'detail': str(e.orig)}})
+        except ValidationFailure as e:
+            sp.rollback()
+            errors = list(subreq.errors)
+            if e.detail is not None:
+                errors.append(e.detail)
+            results.append({'status': e.status, 'json': {'errors': errors}})
+        except HTTPException as e:
+            sp.rollback()
+            results.append({'status': e.status, 'json': {'detail': e.detail}})
+        else:
+            results.append({
+                'status': response.status,
+                'location': response.location,
+                'json': response.json,
+            })
+    return {'results': results}
+
+
 ##############################################################################
 # Logging
 
@@ -482,6 +720,7 @@ def pipeline_logger(item_type, phase):
         errors = 0
         skipped = 0
         count = 0
+        start = time.time()
         for index, row in enumerate(rows):
             row_number = index + 2  # header row
             count = index + 1
@@ -522,8 +761,10 @@ def pipeline_logger(item_type, phase):
             yield row
 
         loaded = created + updated
-        logger.info('Loaded %d of %d %s (phase %s). CREATED: %d, UPDATED: %d, SKIPPED: %d, ERRORS: %d' % (
-            loaded, count, item_type, phase, created, updated, skipped, errors))
+        elapsed = time.time() - start
+        rate = loaded / elapsed if elapsed else 0.0
+        logger.info('Loaded %d of %d %s (phase %s). CREATED: %d, UPDATED: %d, SKIPPED: %d, ERRORS: %d (%.1f rows/sec)' % (
+            loaded, count, item_type, phase, created, updated, skipped, errors, rate))
 
     return component
 
@@ -613,7 +854,7 @@ def process(rows):
         pass
 
 
-def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None):
+def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None, batchsize=None):
     pipeline = [
         skip_rows_with_all_key_value(test='skip'),
         skip_rows_with_all_key_value(_test='skip'),
@@ -643,7 +884,8 @@ def get_pipeline(testapp, docsdir, test_only, item_type, phase=None, method=None
     pipeline.extend([
         request_url(item_type, method),
         remove_keys('uuid') if method in ('PUT', 'PATCH') else noop,
-        make_request(testapp, item_type, method),
+        make_bulk_request(testapp, item_type, method, batchsize)
+        if batchsize else make_request(testapp, item_type, method),
         pipeline_logger(item_type, phase),
     ])
     return pipeline
@@ -911,6 +1153,111 @@ def load_all(testapp, filename, docsdir, log_level=None, test=False):
         process(combine(source, pipeline))
 
 
+##############################################################################
+# Parallel loading
+#
+# An item type only has to wait for the item types it links to. Links to item
+# types later in ORDER are deferred to phase 2 by the pipelines above, so only
+# links to earlier item types are dependencies. Independent item types are
+# loaded concurrently, each posting its rows to /batch_load in batches.
+
+
+def schema_link_types(schema):
+    """ Yield the type names linked to from a schema
+    """
+    for prop in schema.get('properties', {}).values():
+        if 'items' in prop:
+            prop = prop['items']
+        if 'properties' in prop:
+            yield from schema_link_types(prop)
+        link_to = prop.get('linkTo')
+        if link_to is None:
+            continue
+        if isinstance(link_to, basestring):
+            link_to = [link_to]
+        yield from link_to
+
+
+def get_dependencies(profiles):
+    """ Map each item type in ORDER to the earlier item types it links to
+
+    profiles is the JSON from /profiles/
+    """
+    subtypes = profiles['_subtypes']
+    item_type_by_name = {
+        name: os.path.splitext(os.path.basename(schema['id']))[0]
+        for name, schema in profiles.items()
+        if not name.startswith(('_', '@'))
+    }
+    position = {item_type: index for index, item_type in enumerate(ORDER)}
+    dependencies = {}
+    for name, item_type in item_type_by_name.items():
+        if item_type not in position:
+            continue
+        linked = set()
+        for link_name in schema_link_types(profiles[name]):
+            for subtype in subtypes.get(link_name, [link_name]):
+                linked_type = item_type_by_name.get(subtype)
+                if linked_type in position and position[linked_type] < position[item_type]:
+                    linked.add(linked_type)
+        dependencies[item_type] = linked
+    return dependencies
+
+
+def run_in_dependency_order(dependencies, func, workers):
+    """ Call func(item_type) for each item type once its dependencies are done
+    """
+    from concurrent.futures import (
+        FIRST_COMPLETED,
+        ThreadPoolExecutor,
+        wait,
+    )
+    pending = [item_type for item_type in ORDER if item_type in dependencies]
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            ready = [item_type for item_type in pending if dependencies[item_type] <= done]
+            for item_type in ready:
+                pending.remove(item_type)
+                running[executor.submit(func, item_type)] = item_type
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                future.result()
+                done.add(running.pop(future))
+
+
+def load_all_parallel(testapp, filename, docsdir, log_level=None, test=False, workers=4, batchsize=100):
+    """ Like load_all, but loads independent item types concurrently in batches
+    """
+    from webtest import TestApp
+    if log_level is not None:
+        _reset_log_level(log_level)
+    dependencies = get_dependencies(testapp.get('/profiles/').json)
+
+    def load_phase(phase):
+        def load_item_type(item_type):
+            if phase == 2 and item_type not in PHASE2_PIPELINES:
+                return
+            try:
+                source = read_single_sheet(filename, item_type)
+            except ValueError:
+                logger.error('Opening %s %s failed.', filename, item_type)
+                return
+            # TestApp keeps a cookiejar so each thread needs its own.
+            worker_testapp = TestApp(testapp.app, testapp.extra_environ)
+            pipeline = get_pipeline(
+                worker_testapp, docsdir, test, item_type, phase=phase, batchsize=batchsize)
+            process(combine(source, pipeline))
+
+        return load_item_type
+
+    start = time.time()
+    run_in_dependency_order(dependencies, load_phase(1), workers)
+    run_in_dependency_order(dependencies, load_phase(2), workers)
+    logger.info('Loaded %s in %.1f seconds' % (filename, time.time() - start))
+
+
 def load_test_data(app):
     from webtest import TestApp
     environ = {
@@ -922,4 +1269,9 @@ def load_test_data(app):
     from pkg_resources import resource_filename
     inserts = resource_filename('encoded', 'tests/data/inserts/')
     docsdir = [resource_filename('encoded', 'tests/data/documents/')]
-    load_all(testapp, inserts, docsdir)
+    workers = int(app.registry.settings.get('load_workers', 0))
+    if workers:
+        batchsize = int(app.registry.settings.get('load_batchsize', 100))
+        load_all_parallel(testapp, inserts, docsdir, workers=workers, batchsize=batchsize)
+    else:
+        load_all(testapp, inserts, docsdir)
@@ -20,11 +20,14 @@ class Generator2:
 
 
 class ExecuteOnCompletion2:
-    def __init__(self, application, callback):
+    def __init__(self, application, callback, start_callback=None):
         self.__application = application
         self.__callback = callback
+        self.__start_callback = start_callback
 
     def __call__(self, environ, start_response):
+        if self.__start_callback is not None:
+            self.__start_callback(environ)
         try:
             result = self.__application(environ, start_response)
         except:
@@ -33,28 +36,267 @@ class ExecuteOnCompletion2:
         return Generator2(result, self.__callback, environ)
 
 
+from collections import (
+    defaultdict,
+    deque,
+)
+from pyramid.events import (
+    NewRequest,
+    subscriber,
+)
+from pyramid.view import view_config
+from snovault.util import get_root_request
+from encoded.stats_util import (
+    percentile,
+    route_name,
+)
 import logging
+import os
 import psutil
 import humanfriendly
+import random
+import signal
+import threading
+import time
+import tracemalloc
 
 
-def rss_checker(rss_limit=None):
-    log = logging.getLogger(__name__)
-    process = psutil.Process()
+ENVIRON_KEY = 'encoded.resource_usage'
+MB = 1024 ** 2
+# Upper bounds of the RSS growth histogram buckets.
+RSS_BUCKETS = (0, 1 * MB, 4 * MB, 16 * MB, 64 * MB, 256 * MB)
+COUNTERS = ('embed_count', 'es_count', 'db_count')
 
-    def callback(environ):
-        rss = process.memory_info().rss
-        if rss_limit and rss > rss_limit:
-            msg = "Restarting process. Memory usage exceeds limit of %d: %d"
-            log.error(msg, rss_limit, rss)
-            process.terminate()
+log = logging.getLogger(__name__)
 
-    return callback
 
+def includeme(config):
+    config.add_route('_resource_usage', '/_resource_usage')
+    config.scan(__name__)
 
-def filter_app(app, global_conf, rss_limit=None):
+
+def summarize(values):
+    return {
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'max': max(values) if values else None,
+    }
+
+
+def rss_histogram(values):
+    counts = [0] * (len(RSS_BUCKETS) + 1)
+    for value in values:
+        for position, bound in enumerate(RSS_BUCKETS):
+            if value <= bound:
+                break
+        else:
+            position = len(RSS_BUCKETS)
+        counts[position] += 1
+    labels = ['<=%s' % humanfriendly.format_size(bound, binary=True) for bound in RSS_BUCKETS]
+    labels.append('>%s' % humanfriendly.format_size(RSS_BUCKETS[-1], binary=True))
+    return dict(zip(labels, counts))
+
+
+class ResourceUsage(object):
+    """ Rolling window of per request resource use for each route
+    """
+    def __init__(self, window=500):
+        self.window = window
+        self.requests = 0
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._rss_growth = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, route, sample):
+        with self._lock:
+            self.requests += 1
+            self._samples[route].append(sample)
+            self._rss_growth[route] += max(0, sample['rss_delta'])
+
+    def top_offenders(self, count=5):
+        with self._lock:
+            growth = sorted(self._rss_growth.items(), key=lambda item: -item[1])
+        return growth[:count]
+
+    def routes(self):
+        with self._lock:
+            samples = {route: list(route_samples) for route, route_samples in self._samples.items()}
+            growth = dict(self._rss_growth)
+        result = {}
+        for route in sorted(samples, key=lambda route: -growth[route]):
+            route_samples = samples[route]
+            rss_deltas = [sample['rss_delta'] for sample in route_samples]
+            peaks = [
+                sample['tracemalloc_peak'] for sample in route_samples
+                if sample['tracemalloc_peak'] is not None
+            ]
+            result[route] = dict(
+                {
+                    'requests': len(route_samples),
+                    'rss_growth_total': growth[route],
+                    'rss_delta': dict(summarize(rss_deltas), histogram=rss_histogram(rss_deltas)),
+                    'cpu_time': summarize([sample['cpu_time'] for sample in route_samples]),
+                    'wall_time': summarize([sample['wall_time'] for sample in route_samples]),
+                    'tracemalloc_peak': dict(summarize(peaks), samples=len(peaks)),
+                },
+                **{
+                    key: summarize([sample[key] for sample in route_samples])
+                    for key in COUNTERS
+                }
+            )
+        return result
+
+
+resource_usage = ResourceUsage()
+
+
+class ResourceAccounting(object):
+    """ Measure each request and recycle the process once it is too big
+
+    RSS, CPU time and, for a sample of requests, the tracemalloc peak are
+    measured in the WSGI pipeline. The embed, ES and SQL counts are copied
+    from the Pyramid request by record_request_counts(). The process is
+    signalled once, after the response that took it over rss_limit; the
+    mod_wsgi SIGUSR1 restart lets requests in flight finish.
+
+    tracemalloc traces the whole process, so a sampled request is only
+    traced when it is the single request in flight, and its peak is
+    dropped if another request started before it finished.
+    """
+    def __init__(self, usage, rss_limit=None, tracemalloc_sample_rate=0.0,
+                 log_every=1000, top=5, recycle_signal=None):
+        self.usage = usage
+        self.rss_limit = rss_limit
+        self.tracemalloc_sample_rate = tracemalloc_sample_rate
+        self.log_every = log_every
+        self.top = top
+        self.recycle_signal = recycle_signal
+        self.recycle_pending = False
+        self.in_flight = 0
+        self.process = psutil.Process()
+        self._tracing = None
+        self._trace_shared = False
+        self._lock = threading.Lock()
+
+    def start(self, environ):
+        tracing = False
+        with self._lock:
+            self.in_flight += 1
+            if self._tracing is not None:
+                self._trace_shared = True
+            elif self.tracemalloc_sample_rate and self.in_flight == 1 \
+                    and not tracemalloc.is_tracing() \
+                    and random.random() < self.tracemalloc_sample_rate:
+                tracemalloc.start()
+                self._tracing = environ
+                self._trace_shared = False
+                tracing = True
+        environ[ENVIRON_KEY] = {
+            'rss_begin': self.process.memory_info().rss,
+            'cpu_begin': time.thread_time(),
+            'wall_begin': time.time(),
+            'tracing': tracing,
+        }
+
+    def finish(self, environ):
+        usage = environ.get(ENVIRON_KEY)
+        if usage is None:
+            return
+        tracemalloc_peak = None
+        if usage['tracing']:
+            with self._lock:
+                if not self._trace_shared:
+                    tracemalloc_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                self._tracing = None
+        rss = self.process.memory_info().rss
+        sample = {
+            'rss_delta': rss - usage['rss_begin'],
+            'cpu_time': time.thread_time() - usage['cpu_begin'],
+            'wall_time': time.time() - usage['wall_begin'],
+            'tracemalloc_peak': tracemalloc_peak,
+        }
+        for key in COUNTERS:
+            sample[key] = usage.get(key, 0)
+        route = usage.get('route') or 'unmatched'
+        self.usage.record(route, sample)
+        if self.log_every and self.usage.requests % self.log_every == 0:
+            self.log_top_offenders()
+        recycle = False
+        with self._lock:
+            self.in_flight -= 1
+            if self.rss_limit and rss > self.rss_limit and not self.recycle_pending:
+                self.recycle_pending = True
+                log.error(
+                    "Recycling process. Memory usage exceeds limit of %d: %d after %s %s (%s)",
+                    self.rss_limit, rss, environ.get('REQUEST_METHOD'),
+                    environ.get('PATH_INFO'), route,
+                )
+                self.log_top_offenders()
+                recycle = True
+        if recycle:
+            self.recycle(environ)
+
+    def recycle(self, environ):
+        recycle_signal = self.recycle_signal
+        if recycle_signal is None:
+            # mod_wsgi restarts a daemon process gracefully on SIGUSR1.
+            recycle_signal = signal.SIGUSR1 if 'mod_wsgi.version' in environ else signal.SIGTERM
+        os.kill(os.getpid(), recycle_signal)
+
+    def log_top_offenders(self):
+        for route, growth in self.usage.top_offenders(self.top):
+            log.warning("RSS growth by route %s: %s", route, humanfriendly.format_size(growth))
+
+
+def record_request_counts(request):
+    usage = request.environ.get(ENVIRON_KEY)
+    if usage is None:
+        return
+    stats = getattr(request, '_stats', {})
+    for key in COUNTERS:
+        usage[key] = stats.get(key, 0)
+    usage['route'] = route_name(request)
+
+
+@subscriber(NewRequest)
+def count_embeds(event):
+    request = event.request
+    root = get_root_request()
+    if root is None or root is request:
+        if ENVIRON_KEY in request.environ:
+            request.add_finished_callback(record_request_counts)
+        return
+    stats = getattr(root, '_stats', None)
+    if stats is not None:
+        stats['embed_count'] = stats.get('embed_count', 0) + 1
+
+
+@view_config(route_name='_resource_usage', request_method='GET', permission='index')
+def resource_usage_view(request):
+    request.response.headers['Cache-Control'] = 'no-cache'
+    return {
+        'pid': os.getpid(),
+        'rss': psutil.Process().memory_info().rss,
+        'requests': resource_usage.requests,
+        'window': resource_usage.window,
+        'routes': resource_usage.routes(),
+    }
+
+
+def filter_app(app, global_conf, rss_limit=None, tracemalloc_sample_rate='0',
+               window='500', log_every='1000', top='5', recycle_signal=None):
     if rss_limit is not None:
         rss_limit = humanfriendly.parse_size(rss_limit)
-
-    callback = rss_checker(rss_limit)
-    return ExecuteOnCompletion2(app, callback)
+    if recycle_signal is not None:
+        recycle_signal = getattr(signal, recycle_signal)
+    resource_usage.window = int(window)
+    accounting = ResourceAccounting(
+        resource_usage,
+        rss_limit=rss_limit,
+        tracemalloc_sample_rate=float(tracemalloc_sample_rate),
+        log_every=int(log_every),
+        top=int(top),
+        recycle_signal=recycle_signal,
+    )
+    return ExecuteOnCompletion2(app, accounting.finish, accounting.start)
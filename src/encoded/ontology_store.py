@@ -0,0 +1,197 @@
+"""\
+Build a compact, read only store from ontology.json.
+
+The store is memory mapped so every worker and indexer process shares one
+page cache copy instead of each holding its own parsed ontology.json dict.
+
+Example:
+
+    %(prog)s ontology.json ontology.store
+
+"""
+from collections.abc import Mapping
+from pathlib import Path
+import json
+import mmap
+import struct
+
+
+EPILOG = __doc__
+
+MAGIC = b'ENCONT01'
+# n_strings, n_terms, string offsets, string data, term index, records
+HEADER = struct.Struct('<8sIIQQQQ')
+UINT32 = struct.Struct('<I')
+INDEX_ENTRY = struct.Struct('<II')
+FIELD = struct.Struct('<IB')
+
+STRING = 0
+STRING_LIST = 1
+JSON_VALUE = 2
+
+
+def build_store(ontology, path):
+    """ Write the ontology dict to path
+
+    Every string (term ids, keys and values) is stored once and referred to
+    by number. Terms are indexed in sorted order for binary search.
+    """
+    strings = {}
+
+    def intern(value):
+        number = strings.get(value)
+        if number is None:
+            number = strings[value] = len(strings)
+        return number
+
+    records = bytearray()
+    index = []
+    for term_id in sorted(ontology, key=lambda term_id: term_id.encode('utf-8')):
+        index.append((intern(term_id), len(records)))
+        term = ontology[term_id]
+        records += UINT32.pack(len(term))
+        for key, value in term.items():
+            if isinstance(value, str):
+                records += FIELD.pack(intern(key), STRING)
+                records += UINT32.pack(intern(value))
+            elif isinstance(value, list) and all(isinstance(v, str) for v in value):
+                records += FIELD.pack(intern(key), STRING_LIST)
+                records += UINT32.pack(len(value))
+                records += b''.join(UINT32.pack(intern(v)) for v in value)
+            else:
+                records += FIELD.pack(intern(key), JSON_VALUE)
+                records += UINT32.pack(intern(json.dumps(value, sort_keys=True)))
+
+    string_offsets = bytearray()
+    string_data = bytearray()
+    for value in strings:
+        string_offsets += UINT32.pack(len(string_data))
+        string_data += value.encode('utf-8')
+    string_offsets += UINT32.pack(len(string_data))
+    term_index = b''.join(INDEX_ENTRY.pack(*entry) for entry in index)
+
+    offsets_pos = HEADER.size
+    data_pos = offsets_pos + len(string_offsets)
+    index_pos = data_pos + len(string_data)
+    records_pos = index_pos + len(term_index)
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(
+            MAGIC, len(strings), len(index), offsets_pos, data_pos, index_pos, records_pos))
+        f.write(string_offsets)
+        f.write(string_data)
+        f.write(term_index)
+        f.write(records)
+    # Readers never see a partially written store.
+    Path(tmp_path).replace(path)
+
+
+class OntologyStore(Mapping):
+    """ Read only mapping of term id to term dict backed by a store file
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic, self._n_strings, self._n_terms, self._offsets_pos,
+            self._data_pos, self._index_pos, self._records_pos,
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError('%s is not an ontology store' % path)
+
+    def _string_bytes(self, number):
+        start, end = struct.unpack_from('<II', self._mmap, self._offsets_pos + number * 4)
+        return self._mmap[self._data_pos + start:self._data_pos + end]
+
+    def _string(self, number):
+        return self._string_bytes(number).decode('utf-8')
+
+    def _find(self, term_id):
+        key = term_id.encode('utf-8')
+        low, high = 0, self._n_terms
+        while low < high:
+            middle = (low + high) // 2
+            number, record = INDEX_ENTRY.unpack_from(
+                self._mmap, self._index_pos + middle * INDEX_ENTRY.size)
+            found = self._string_bytes(number)
+            if found < key:
+                low = middle + 1
+            elif found > key:
+                high = middle
+            else:
+                return record
+        return None
+
+    def _record(self, record):
+        pos = self._records_pos + record
+        count, = UINT32.unpack_from(self._mmap, pos)
+        pos += UINT32.size
+        term = {}
+        for _ in range(count):
+            key, tag = FIELD.unpack_from(self._mmap, pos)
+            pos += FIELD.size
+            value, = UINT32.unpack_from(self._mmap, pos)
+            pos += UINT32.size
+            if tag == STRING:
+                term[self._string(key)] = self._string(value)
+            elif tag == STRING_LIST:
+                numbers = struct.unpack_from('<%dI' % value, self._mmap, pos)
+                pos += value * UINT32.size
+                term[self._string(key)] = [self._string(number) for number in numbers]
+            else:
+                term[self._string(key)] = json.loads(self._string(value))
+        return term
+
+    def __contains__(self, term_id):
+        return isinstance(term_id, str) and self._find(term_id) is not None
+
+    def __getitem__(self, term_id):
+        record = self._find(term_id) if isinstance(term_id, str) else None
+        if record is None:
+            raise KeyError(term_id)
+        return self._record(record)
+
+    def __iter__(self):
+        for position in range(self._n_terms):
+            number, record = INDEX_ENTRY.unpack_from(
+                self._mmap, self._index_pos + position * INDEX_ENTRY.size)
+            yield self._string(number)
+
+    def __len__(self):
+        return self._n_terms
+
+
+def load_ontology(json_path, store_path=None):
+    """ Open the store if it is at least as new as ontology.json
+
+    Otherwise fall back to parsing the JSON, or an empty ontology when there
+    is neither.
+    """
+    json_path = Path(json_path)
+    store_path = Path(store_path) if store_path else json_path.with_suffix('.store')
+    if store_path.exists() and (
+            not json_path.exists() or store_path.stat().st_mtime >= json_path.stat().st_mtime):
+        return OntologyStore(str(store_path))
+    if json_path.exists():
+        with open(str(json_path)) as f:
+            return json.load(f)
+    return {}
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Build the ontology store from ontology.json", epilog=EPILOG,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument('inpath', help="ontology.json")
+    parser.add_argument('outpath', nargs='?', help="store path, defaults to ontology.store")
+    args = parser.parse_args()
+    outpath = args.outpath or str(Path(args.inpath).with_suffix('.store'))
+    with open(args.inpath) as f:
+        ontology = json.load(f)
+    build_store(ontology, outpath)
+
+
+if __name__ == '__main__':
+    main()
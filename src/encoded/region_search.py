@@ -8,6 +8,7 @@ import requests
 from urllib.parse import urlencode
 
 from encoded.genomic_data_service import GenomicDataService
+from encoded.searches.local_cache import local_search_cache
 
 import logging
 import re
@@ -316,6 +317,7 @@ def region_search(context, request):
 
 
 @view_config(route_name='suggest', request_method='GET', permission='search')
+@local_search_cache('suggest')
 def suggest(context, request):
     text = ''
     requested_genome = ''
@@ -22,10 +22,18 @@ from pyramid.tweens import EXCVIEW
 
 from snovault.validation import CSRFTokenError
 from subprocess_middleware.tween import SubprocessTween
+from subprocess_middleware.worker import (
+    TransformWorker,
+    cleanup,
+)
+from collections import OrderedDict
 from urllib.parse import parse_qs
+import hashlib
 import logging
 import os
 import psutil
+import queue
+import threading
 import time
 
 
@@ -263,6 +271,8 @@ def after_transform(request, response):
     stats = request._stats
     stats['render_count'] = stats.get('render_count', 0) + 1
     stats['render_time'] = stats.get('render_time', 0) + duration
+    if getattr(request, '_render_cache_hit', False):
+        stats['render_cache_hits'] = stats.get('render_cache_hits', 0) + 1
     request._stats_html_attribute = True
 
 
@@ -280,10 +290,195 @@ rss_limit = 256 * (1024 ** 2)  # MB
 def reload_process(process):
     return psutil.Process(process.pid).memory_info().rss > rss_limit
 
+class RenderCache(object):
+    """ Size bounded LRU of rendered pages
+
+    Entries are (status, headerlist, body) where headerlist only holds the
+    headers added by the renderer, so per-request headers such as Set-Cookie
+    always come from the current response.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry[2])
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[2])
+            self.entries[key] = entry
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted[2])
+
+
+def render_cache_key(request, response):
+    """ Digest of everything the rendered page depends on
+
+    The renderer sees only the response, so the JSON body, the status, the
+    X-Request-URL and the request headers the response varies on determine
+    its output for a given app version.
+    """
+    digest = hashlib.sha256()
+    parts = [
+        request.registry.settings.get('snovault.app_version', ''),
+        response.status,
+        response.headers.get('X-Request-URL', request.url),
+    ]
+    parts += [
+        '%s=%s' % (name.lower(), request.headers.get(name, ''))
+        for name in sorted(response.vary or ())
+    ]
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(response.body)
+    return digest.hexdigest()
+
+
+def render_cache_entry(response_in, response_out):
+    headerlist = [
+        header for header in response_out.headerlist
+        if header not in response_in.headerlist
+    ]
+    return response_out.status, headerlist, response_out.body
+
+
+def cached_render(response_in, entry, Response):
+    status, headerlist, body = entry
+    replaced = {name.lower() for name, value in headerlist}
+    response = Response(status=status)
+    response.headerlist = [
+        (name, value) for name, value in response_in.headerlist
+        if name.lower() not in replaced
+    ] + headerlist
+    response.body = body
+    return response
+
+
+class RendererPool(TransformWorker):
+    """ Renderer processes shared between the threads of a worker
+
+    At most size processes exist at once, started on demand. A thread that
+    finds every process busy waits for one to be returned.
+    """
+    def __init__(self, args, size=1, **kw):
+        super(RendererPool, self).__init__(args, **kw)
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle = queue.LifoQueue()
+        self.checked_out = set()
+        self.lock = threading.Lock()
+
+    def get_process(self):
+        self.slots.acquire()
+        try:
+            while True:
+                try:
+                    process = self.idle.get_nowait()
+                except queue.Empty:
+                    process = self.new_process()
+                    break
+                if process.poll() is None:
+                    break
+                cleanup(process)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.checked_out.add(process)
+        return process
+
+    def _release(self, process):
+        # A process closed inside _transform is also returned afterwards.
+        with self.lock:
+            if process not in self.checked_out:
+                return False
+            self.checked_out.discard(process)
+        self.slots.release()
+        return True
+
+    def return_process(self, process):
+        if self._release(process) and not process.stdin.closed:
+            self.idle.put(process)
+
+    def clear_process(self, process):
+        self._release(process)
+        process.stdin.close()
+        cleanup(process, close=False)
+        process.stdout.close()
+        errout = process.stderr.read()
+        process.stderr.close()
+        return errout
+
+
+class RenderingTween(SubprocessTween):
+    """ SubprocessTween with a renderer pool and a rendered page cache
+
+    Settings:
+        renderer.processes: renderer processes per worker (default 1)
+        render_cache.max_bytes: rendered page cache size (default 64MB,
+            0 disables, always disabled with pyramid.reload_templates)
+    """
+    def __call__(self, handler, registry):
+        settings = registry.settings
+        reload_templates = settings['pyramid.reload_templates']
+        if reload_templates:
+            self.reload_process = True
+        transform = RendererPool(
+            Response=self.Response, reload_process=self.reload_process,
+            size=int(settings.get('renderer.processes', 1)), **self.kw)
+        max_bytes = 0 if reload_templates else int(
+            settings.get('render_cache.max_bytes', 64 * 1024 ** 2))
+        cache = RenderCache(max_bytes) if max_bytes else None
+        should_transform = self.should_transform
+        after_transform = self.after_transform
+        transform_error = self.transform_error
+        Response = self.Response
+
+        def rendering_tween(request):
+            response = handler(request)
+            if should_transform and not should_transform(request, response):
+                return response
+            key = None
+            # Anonymous views of popular pages are what repeat.
+            if cache is not None and response.status_int == 200 and \
+                    request.authenticated_userid is None:
+                key = render_cache_key(request, response)
+                entry = cache.get(key)
+                if entry is not None:
+                    request._render_cache_hit = True
+                    response = cached_render(response, entry, Response)
+                    after_transform and after_transform(request, response)
+                    return response
+            try:
+                response_out = transform(response)
+            except ValueError as e:
+                return transform_error(e.args[0])
+            if key is not None and response_out.status_int == 200:
+                cache.set(key, render_cache_entry(response, response_out))
+            after_transform and after_transform(request, response_out)
+            return response_out
+
+        return rendering_tween
+
+
 node_env = os.environ.copy()
 node_env['NODE_PATH'] = ''
 
-page_or_json = SubprocessTween(
+page_or_json = RenderingTween(
     should_transform=should_transform,
     after_transform=after_transform,
     reload_process=reload_process,
@@ -292,7 +487,7 @@ page_or_json = SubprocessTween(
 )
 
 
-debug_page_or_json = SubprocessTween(
+debug_page_or_json = RenderingTween(
     should_transform=should_transform,
     after_transform=after_transform,
     reload_process=reload_process,
@@ -194,6 +194,8 @@ class MetadataReport:
         )
         self.param_list['@id'].extend(cart.elements)
         self.param_list.pop('cart', None)
+        # Already expanded, so BatchedSearchGenerator must not expand it again.
+        self.query_string.drop('cart')
 
     def _get_json_elements_or_empty_list(self):
         try:
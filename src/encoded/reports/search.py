@@ -1,3 +1,4 @@
+from encoded.cart_view import CartWithElements
 from encoded.search_views import search_generator
 from snosearch.parsers import QueryString
 
@@ -16,6 +17,16 @@ class BatchedSearchGenerator:
         self.query_string = QueryString(request)
         self.param_list = self.query_string.group_values_by_key()
         self.batch_param_values = self.param_list.get(batch_field, []).copy()
+        self._maybe_add_cart_elements_to_batch_param_values()
+
+    def _maybe_add_cart_elements_to_batch_param_values(self):
+        # Batched, so no need to limit max_cart_elements.
+        if self.batch_field != '@id' or not self.param_list.get('cart'):
+            return
+        self.batch_param_values.extend(
+            CartWithElements(self.request, max_cart_elements=None).elements
+        )
+        self.query_string.drop('cart')
 
     def _make_batched_values_from_batch_param_values(self):
         end = len(self.batch_param_values)
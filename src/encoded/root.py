@@ -1,5 +1,14 @@
+from collections import (
+    OrderedDict,
+    defaultdict,
+)
 from pyramid.decorator import reify
+from pyramid.events import subscriber
 from snovault import (
+    DBSESSION,
+    ROOT,
+    AfterModified,
+    Created,
     Root,
     calculated_property,
     root,
@@ -12,6 +21,8 @@ from pyramid.security import (
     Deny,
     Everyone,
 )
+import threading
+import time
 
 
 def includeme(config):
@@ -43,6 +54,97 @@ def acl_from_settings(settings):
     return acl
 
 
+def name_namespaces(name):
+    """ Unique key namespaces a URL segment may belong to, in priority order
+    """
+    namespaces = ['page:location']
+    if is_accession(name):
+        namespaces.append('accession')
+    if ':' in name:
+        namespaces.append('alias')
+    namespaces.append('external_accession')
+    return namespaces
+
+
+class NameCache(object):
+    """ Per process cache of URL segment to uuid, or None when not found
+
+    Entries expire after ttl seconds (negative_ttl for misses). Writes in
+    this process discard the names of the written item, while writes in
+    other processes are only seen once the entry expires, so both are kept
+    to a few seconds.
+    """
+    def __init__(self, capacity=10000, ttl=5, negative_ttl=2):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()
+        self.names_by_uuid = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def _pop(self, name):
+        entry = self.entries.pop(name, None)
+        if entry is not None and entry[0] is not None:
+            names = self.names_by_uuid[entry[0]]
+            names.discard(name)
+            if not names:
+                del self.names_by_uuid[entry[0]]
+
+    def get(self, name):
+        """ Returns (found, uuid) """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return False, None
+            uuid, expires = entry
+            if expires < time.time():
+                self._pop(name)
+                return False, None
+            self.entries.move_to_end(name)
+            return True, uuid
+
+    def set(self, name, uuid):
+        ttl = self.negative_ttl if uuid is None else self.ttl
+        if ttl <= 0 or self.capacity <= 0:
+            return
+        with self.lock:
+            self._pop(name)
+            self.entries[name] = (uuid, time.time() + ttl)
+            if uuid is not None:
+                self.names_by_uuid[uuid].add(name)
+            while len(self.entries) > self.capacity:
+                self._pop(next(iter(self.entries)))
+
+    def discard(self, name):
+        with self.lock:
+            self._pop(name)
+
+    def discard_item(self, uuid, names=()):
+        """ Forget the names resolved to uuid and the given names
+        """
+        with self.lock:
+            for name in list(self.names_by_uuid.get(uuid, ())) + list(names):
+                self._pop(name)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.names_by_uuid.clear()
+
+
+@subscriber(Created)
+@subscriber(AfterModified)
+def clear_name_cache(event):
+    # Names of the item may have been added, moved or removed.
+    item = event.object
+    names = [
+        value
+        for values in item.unique_keys(item.properties).values()
+        for value in values
+    ]
+    event.request.registry[ROOT].name_cache.discard_item(str(item.uuid), names)
+
+
 @root
 class EncodedRoot(Root):
     properties = {
@@ -64,25 +166,49 @@ class EncodedRoot(Root):
     def get_by_uuid(self, uuid, default=None):
         return self.connection.get_by_uuid(uuid, default)
 
+    @reify
+    def name_cache(self):
+        settings = self.registry.settings
+        return NameCache(
+            capacity=int(settings.get('name_cache.capacity', 10000)),
+            ttl=float(settings.get('name_cache.ttl', 5)),
+            negative_ttl=float(settings.get('name_cache.negative_ttl', 2)),
+        )
+
     def get(self, name, default=None):
         resource = super(EncodedRoot, self).get(name, None)
         if resource is not None:
             return resource
-        resource = self.connection.get_by_unique_key('page:location', name)
-        if resource is not None:
-            return resource
-        if is_accession(name):
-            resource = self.connection.get_by_unique_key('accession', name)
+        found, uuid = self.name_cache.get(name)
+        if found:
+            if uuid is None:
+                return default
+            resource = self.connection.get_by_uuid(uuid)
             if resource is not None:
                 return resource
-        if ':' in name:
-            resource = self.connection.get_by_unique_key('alias', name)
-            if resource is not None:
-                return resource
-        resource = self.connection.get_by_unique_key('external_accession', name)
-        if resource is not None:
-            return resource
-        return default
+            # Created in a transaction that was rolled back
+            self.name_cache.discard(name)
+        uuid = self.get_uuid_by_name(name)
+        self.name_cache.set(name, uuid)
+        if uuid is None:
+            return default
+        return self.connection.get_by_uuid(uuid, default)
+
+    def get_uuid_by_name(self, name):
+        """ Resolve name against every unique key namespace in one query
+        """
+        from snovault.storage import Key
+        namespaces = name_namespaces(name)
+        session = self.registry[DBSESSION]()
+        keys = dict(
+            session.query(Key.name, Key.rid).filter(
+                Key.name.in_(namespaces), Key.value == name,
+            ).all()
+        )
+        for namespace in namespaces:
+            if namespace in keys:
+                return str(keys[namespace])
+        return None
 
     @calculated_property(schema={
         "title": "Application version",
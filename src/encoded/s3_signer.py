@@ -0,0 +1,129 @@
+"""\
+Process wide S3 clients and a cache of presigned URLs.
+
+Building a boto3 client costs far more than signing a URL, so one client
+of each kind is built per process and shared between threads. Presigned
+download URLs are reused for a short time. A cached URL is always handed
+out with most of its 36 hour lifetime left.
+"""
+from botocore.config import Config
+from collections import OrderedDict
+import boto3
+import botocore
+import threading
+import time
+
+
+S3_SIGNER = __name__ + ':s3_signer'
+
+DOWNLOAD_EXPIRES = 36 * 60 * 60
+
+
+def includeme(config):
+    settings = config.registry.settings
+    config.registry[S3_SIGNER] = S3Signer(
+        url_cache_ttl=int(settings.get('s3_signer.url_cache_ttl', 15 * 60)),
+        url_cache_size=int(settings.get('s3_signer.url_cache_size', 10000)),
+    )
+
+
+class URLCache(object):
+    """ LRU of URLs that are dropped once older than ttl
+    """
+    def __init__(self, capacity, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            url, cached_at = entry
+            if self.ttl is not None and time.time() - cached_at >= self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return url
+
+    def set(self, key, url):
+        with self.lock:
+            self.entries[key] = (url, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class S3Signer(object):
+    """ Presigned S3 URLs from clients built once per process
+
+    Download URLs are cached for url_cache_ttl, which is kept below half of
+    expires_in. Temporary credentials can expire before the URL does, so
+    the ttl should also stay well below the credential lifetime.
+    """
+    def __init__(self, expires_in=DOWNLOAD_EXPIRES, url_cache_ttl=15 * 60, url_cache_size=10000):
+        self.expires_in = expires_in
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.download_urls = URLCache(
+            url_cache_size, ttl=min(url_cache_ttl, expires_in // 2))
+        # Unsigned URLs never expire.
+        self.unsigned_urls = URLCache(url_cache_size)
+
+    def client(self, unsigned=False):
+        client = self._clients.get(unsigned)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(unsigned)
+                if client is None:
+                    if unsigned:
+                        config = Config(signature_version=botocore.UNSIGNED)
+                        client = boto3.session.Session().client('s3', config=config)
+                    else:
+                        client = boto3.session.Session().client('s3')
+                    self._clients[unsigned] = client
+        return client
+
+    def reset(self):
+        with self._lock:
+            self._clients.clear()
+        self.download_urls.clear()
+        self.unsigned_urls.clear()
+
+    def unsigned_url(self, bucket, key):
+        cache_key = (bucket, key)
+        url = self.unsigned_urls.get(cache_key)
+        if url is None:
+            url = self.client(unsigned=True).generate_presigned_url(
+                ClientMethod='get_object',
+                Params={
+                    'Bucket': bucket,
+                    'Key': key,
+                },
+                ExpiresIn=0
+            )
+            self.unsigned_urls.set(cache_key, url)
+        return url
+
+    def download_url(self, bucket, key, filename):
+        cache_key = (bucket, key, filename)
+        url = self.download_urls.get(cache_key)
+        if url is None:
+            url = self.client().generate_presigned_url(
+                ClientMethod='get_object',
+                Params={
+                    'Bucket': bucket,
+                    'Key': key,
+                    'ResponseContentDisposition': 'attachment; filename=' + filename
+                },
+                ExpiresIn=self.expires_in
+            )
+            self.download_urls.set(cache_key, url)
+        return url
+
@@ -0,0 +1,216 @@
+""" In process sampling profiler for live workers
+
+An admin starts the profiler on a worker for a time window, optionally only
+for requests whose path matches a pattern. A background thread samples the
+Python stacks of the selected threads and counts them. The counts are
+returned as collapsed stacks, the input format of flamegraph.pl and
+speedscope.
+
+Each process profiles only itself, so on a multi process server the start
+and collapsed requests reach whichever worker serves them.
+"""
+from collections import Counter
+from pyramid.settings import asbool
+from pyramid.view import view_config
+from pyramid.response import Response
+from pyramid.httpexceptions import HTTPBadRequest
+import pyramid.tweens
+import re
+import sys
+import threading
+import time
+
+
+PROFILER = __name__ + ':profiler'
+
+# Limits that keep a forgotten profiler cheap on a production worker.
+MAX_DURATION = 15 * 60
+MIN_INTERVAL = 0.001
+MAX_DEPTH = 128
+MAX_STACKS = 20000
+TRUNCATED = '[truncated]'
+
+
+def includeme(config):
+    settings = config.registry.settings
+    config.registry[PROFILER] = SamplingProfiler(
+        max_stacks=int(settings.get('sampling_profiler.max_stacks', MAX_STACKS)),
+    )
+    if asbool(settings.get('sampling_profiler.enabled', True)):
+        config.add_tween(
+            '.sampling_profiler.profiler_tween_factory',
+            under=pyramid.tweens.INGRESS)
+    config.add_route('_profiler', '/_profiler')
+    config.scan(__name__)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return '%s:%s' % (frame.f_globals.get('__name__', code.co_filename), code.co_name)
+
+
+def collapse_stack(frame, max_depth=MAX_DEPTH):
+    """ Semicolon separated frames, outermost first
+    """
+    labels = []
+    while frame is not None and len(labels) < max_depth:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler(object):
+    """ Count sampled stacks of the threads serving selected requests
+
+    Without a pattern every request is sampled, including the /index
+    requests of the indexers. Idle threads are never sampled.
+    """
+    def __init__(self, max_stacks=MAX_STACKS):
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = None
+        self.pattern = None
+        self.started = None
+        self.until = None
+        self.requests = 0
+        self._threads = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration=60, interval=0.01, pattern=None):
+        duration = min(float(duration), MAX_DURATION)
+        interval = max(float(interval), MIN_INTERVAL)
+        with self._lock:
+            if self.running:
+                raise ValueError('Profiler is already running')
+            self.stacks = Counter()
+            self.samples = 0
+            self.requests = 0
+            self.interval = interval
+            self.pattern = re.compile(pattern) if pattern else None
+            self.started = time.time()
+            self.until = self.started + duration
+            self._threads = {}
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def enter(self, path):
+        """ Mark the current thread as serving path, returns whether it is sampled
+        """
+        if not self.running:
+            return False
+        if self.pattern is not None and not self.pattern.search(path):
+            return False
+        with self._lock:
+            self._threads[threading.get_ident()] = path
+            self.requests += 1
+        return True
+
+    def leave(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while not self._stop.is_set() and time.time() < self.until:
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for ident in self._threads:
+                if ident not in frames:
+                    continue
+                stack = collapse_stack(frames[ident])
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = TRUNCATED
+                self.stacks[stack] += 1
+            self.samples += 1
+        del frames
+
+    def collapsed(self):
+        with self._lock:
+            stacks = sorted(self.stacks.items())
+        return ''.join('%s %d\n' % (stack, count) for stack, count in stacks)
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'pattern': self.pattern.pattern if self.pattern is not None else None,
+                'interval': self.interval,
+                'started': self.started,
+                'until': self.until,
+                'samples': self.samples,
+                'requests': self.requests,
+                'stacks': len(self.stacks),
+                'max_stacks': self.max_stacks,
+            }
+
+
+def profiler_tween_factory(handler, registry):
+    profiler = registry[PROFILER]
+
+    def profiler_tween(request):
+        if not profiler.enter(request.path):
+            return handler(request)
+        try:
+            return handler(request)
+        finally:
+            profiler.leave()
+
+    return profiler_tween
+
+
+@view_config(route_name='_profiler', request_method='GET', permission='index')
+def profiler_view(request):
+    """ Profiler status, or the collapsed stacks with ?format=collapsed
+    """
+    profiler = request.registry[PROFILER]
+    if request.params.get('format') == 'collapsed':
+        return Response(
+            profiler.collapsed(),
+            content_type='text/plain',
+            charset='utf-8',
+            cache_control='no-cache',
+        )
+    return profiler.status()
+
+
+@view_config(route_name='_profiler', request_method='POST', permission='index')
+def profiler_control(request):
+    """ {"action": "start", "duration": 60, "interval": 0.01, "pattern": "^/search/"}
+    or {"action": "stop"}
+    """
+    profiler = request.registry[PROFILER]
+    body = request.json_body
+    action = body.get('action', 'start')
+    if action == 'stop':
+        profiler.stop()
+    elif action == 'start':
+        try:
+            profiler.start(
+                duration=body.get('duration', 60),
+                interval=body.get('interval', 0.01),
+                pattern=body.get('pattern'),
+            )
+        except (ValueError, TypeError, re.error) as e:
+            raise HTTPBadRequest(explanation=str(e))
+    else:
+        raise HTTPBadRequest(explanation='Unknown action %r' % action)
+    return profiler.status()
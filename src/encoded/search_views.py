@@ -27,6 +27,8 @@ from encoded.searches.fields import RemoteResponseField
 from encoded.searches.fields import TypeOnlyClearFiltersResponseFieldWithCarts
 from encoded.searches.interfaces import RNA_CLIENT
 from encoded.searches.interfaces import RNA_EXPRESSION
+from encoded.searches.local_cache import local_search_cache
+from encoded.searches.materialized import materialized_matrix_cache
 from snosearch.decorators import conditional_cache
 from snosearch.interfaces import AUDIT_TITLE
 from snosearch.interfaces import MATRIX_TITLE
@@ -414,6 +416,7 @@ def matrixv2_raw(context, request):
 
 
 @view_config(route_name='matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -444,6 +447,7 @@ def matrix(context, request):
 
 
 @view_config(route_name='human_donor_matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def human_donor_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -475,6 +479,7 @@ def human_donor_matrix(context, request):
 
 
 @view_config(route_name='sescc-stem-cell-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def sescc_stem_cell_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -506,6 +511,7 @@ def sescc_stem_cell_matrix(context, request):
 
 
 @view_config(route_name='immune-cells', request_method='GET', permission='search')
+@materialized_matrix_cache
 def immune_cells(context, request):
     fr = FieldedResponse(
         _meta={
@@ -537,6 +543,7 @@ def immune_cells(context, request):
 
 
 @view_config(route_name='chip-seq-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def chip_seq_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -568,6 +575,7 @@ def chip_seq_matrix(context, request):
 
 
 @view_config(route_name='deeply-profiled-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def deeply_profiled_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -598,6 +606,7 @@ def deeply_profiled_matrix(context, request):
 
 
 @view_config(route_name='deeply-profiled-uniform-batch-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def deeply_profiled_uniform_batch_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -628,6 +637,7 @@ def deeply_profiled_uniform_batch_matrix(context, request):
 
 
 @view_config(route_name='reference-epigenome-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def reference_epigenome_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -659,6 +669,7 @@ def reference_epigenome_matrix(context, request):
 
 
 @view_config(route_name='entex-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def entex_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -690,6 +701,7 @@ def entex_matrix(context, request):
 
 
 @view_config(route_name='brain-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def brain_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -721,6 +733,7 @@ def brain_matrix(context, request):
 
 
 @view_config(route_name='mouse-development-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def mouse_development(context, request):
     fr = FieldedResponse(
         _meta={
@@ -752,6 +765,7 @@ def mouse_development(context, request):
 
 
 @view_config(route_name='encore-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def encore_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -783,6 +797,7 @@ def encore_matrix(context, request):
 
 
 @view_config(route_name='encore-rna-seq-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def encore_rna_seq_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -814,6 +829,7 @@ def encore_rna_seq_matrix(context, request):
 
 
 @view_config(route_name='degron-matrix', request_method='GET', permission='search')
+@materialized_matrix_cache
 def degron_matrix(context, request):
     fr = FieldedResponse(
         _meta={
@@ -1007,6 +1023,7 @@ def cart_matrix(context, request):
 
 
 @view_config(route_name='top-hits-raw', request_method='GET', permission='search')
+@local_search_cache('top-hits-raw')
 def top_hits_raw(context, request):
     fr = FieldedResponse(
         _meta={
@@ -1064,6 +1081,7 @@ def search_config_registry(context, request):
 
 
 @view_config(route_name='homepage-search', request_method='GET', permission='search')
+@local_search_cache('homepage-search')
 def homepage_search(context, request):
     # Searches over top hit item types and calculates one @type facet.
     fr = FieldedResponse(
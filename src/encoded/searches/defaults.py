@@ -105,3 +105,89 @@ HOMEPAGE_SEARCH_FACETS = [
         }
     ),
 ]
+
+# Cell lines of the deeply profiled matrix links, as sent by the portal.
+DEEPLY_PROFILED_QUERY = (
+    'type=Experiment&control_type!=*&status=released'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002106'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001203'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0006711'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002713'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002847'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002074'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001200'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0009747'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002824'
+    '&replicates.library.biosample.biosample_ontology.term_id=CL:0002327'
+    '&replicates.library.biosample.biosample_ontology.term_id=CL:0002618'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002784'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001196'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001187'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002067'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001099'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0002819'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0009318'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0001086'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0007950'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0003045'
+    '&replicates.library.biosample.biosample_ontology.term_id=EFO:0003042'
+)
+
+# Matrix pages linked from the portal, materialized per indexing cycle.
+DEFAULT_MATRIX_QUERIES = {
+    'matrix': [
+        'type=Experiment&control_type!=*&status=released&perturbed=false',
+        'type=Annotation&annotation_type!=imputation&status=released',
+    ],
+    'reference-epigenome-matrix': [
+        'type=Experiment&control_type!=*&related_series.@type=ReferenceEpigenome'
+        '&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens&status=released',
+        'type=Experiment&control_type!=*&related_series.@type=ReferenceEpigenome'
+        '&replicates.library.biosample.donor.organism.scientific_name=Mus+musculus&status=released',
+    ],
+    'entex-matrix': [
+        'type=Experiment&status=released&internal_tags=ENTEx',
+    ],
+    'brain-matrix': [
+        'type=Experiment&status=released&internal_tags=RushAD',
+    ],
+    'encore-matrix': [
+        'type=Experiment&status=released&internal_tags=ENCORE',
+    ],
+    # Fetched by the ENCORE matrix page for its RNA-seq section.
+    'encore-rna-seq-matrix': [
+        'type=Experiment&status=released&internal_tags=ENCORE'
+        '&assay_title=total+RNA-seq&assay_title=polyA+plus+RNA-seq',
+    ],
+    'degron-matrix': [
+        'type=Experiment&control_type!=*&status=released&internal_tags=Degron',
+    ],
+    'sescc-stem-cell-matrix': [
+        'type=Experiment&internal_tags=SESCC&status=released',
+    ],
+    'chip-seq-matrix': [
+        'type=Experiment&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens'
+        '&assay_title=Histone+ChIP-seq&assay_title=Mint-ChIP-seq&status=released',
+    ],
+    'deeply-profiled-matrix': [
+        DEEPLY_PROFILED_QUERY,
+    ],
+    'deeply-profiled-uniform-batch-matrix': [
+        'type=Experiment&control_type!=*&status=released',
+        DEEPLY_PROFILED_QUERY + '&replicates.library.biosample.internal_tags=Deeply%20Profiled',
+    ],
+    'mouse-development-matrix': [
+        'type=Experiment&status=released&related_series.@type=OrganismDevelopmentSeries'
+        '&replicates.library.biosample.organism.scientific_name=Mus+musculus',
+    ],
+    'immune-cells': [
+        'type=Experiment&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens'
+        '&biosample_ontology.cell_slims=hematopoietic+cell&biosample_ontology.classification=primary+cell'
+        '&control_type!=*&status=released&biosample_ontology.system_slims=immune+system'
+        '&biosample_ontology.system_slims=circulatory+system&config=immune',
+    ],
+    'human_donor_matrix': [
+        'type=Experiment&control_type!=*&replicates.library.biosample.donor.organism.scientific_name=Homo+sapiens'
+        '&biosample_ontology.classification=tissue&status=released&config=HumanDonorMatrix',
+    ],
+}
@@ -1,3 +1,7 @@
 REDIS_LRU_CACHE = 'redis_lru_cache'
 RNA_EXPRESSION = 'RNAExpression'
 RNA_CLIENT = 'rna_client'
+INDEXED_XMIN = 'indexed_xmin'
+LOCAL_SEARCH_CACHE = 'local_search_cache'
+ES_QUERY_CAPTURE = 'es_query_capture'
+MATRIX_MATERIALIZER = 'matrix_materializer'
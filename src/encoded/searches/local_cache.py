@@ -0,0 +1,285 @@
+import copy
+import hashlib
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+from collections import defaultdict
+from functools import wraps
+from pyramid.view import view_config
+from urllib.parse import urlencode
+
+from encoded.searches.interfaces import LOCAL_SEARCH_CACHE
+
+
+log = logging.getLogger(__name__)
+
+# Set on the request that revalidates a stale entry.
+REFRESH_ENVIRON_KEY = 'encoded.local_search_cache.refresh'
+
+# Free text parameters folded to lower case with single spaces.
+FOLDED_PARAMS = ('searchTerm', 'q')
+
+# Parameters that do not change the result.
+IGNORED_PARAMS = ('format',)
+
+# Request headers and environ keys that identify the user, copied to the refresh.
+CREDENTIAL_HEADERS = ('Authorization', 'Cookie')
+CREDENTIAL_ENVIRON = ('REMOTE_USER',)
+
+METRICS = ('hit', 'stale', 'miss', 'coalesced', 'refresh', 'error')
+
+
+def includeme(config):
+    settings = config.registry.settings
+    config.registry[LOCAL_SEARCH_CACHE] = LocalSearchCache(
+        capacity=int(settings.get('local_search_cache.capacity', 5000)),
+        ttl=float(settings.get('local_search_cache.ttl', 30)),
+        stale_ttl=float(settings.get('local_search_cache.stale_ttl', 300)),
+    )
+    config.add_route('_local_search_cache', '/_local_search_cache')
+    config.scan(__name__)
+
+
+def fold(value):
+    return ' '.join(value.split()).lower()
+
+
+def normalize_params(params):
+    return tuple(
+        sorted(
+            (key, fold(value) if key in FOLDED_PARAMS else value)
+            for key, value in params
+            if key not in IGNORED_PARAMS
+        )
+    )
+
+
+def make_local_key(name, request):
+    # Results are filtered by principals, so each principal group gets its own entry.
+    principals = hashlib.sha1(
+        '|'.join(sorted(request.effective_principals)).encode('utf-8')
+    ).hexdigest()
+    return '{}.{}.{}'.format(
+        name,
+        principals,
+        urlencode(normalize_params(request.params.items())),
+    )
+
+
+def with_request_id(result, request):
+    '''
+    The cached result may have been filled by a query that differs in case,
+    spacing or format. Its @id gets the query string of this request, or
+    canonical_redirect would send the client to the other query.
+    '''
+    if not isinstance(result, dict) or '@id' not in result:
+        return result
+    path, _, query_string = result['@id'].partition('?')
+    if query_string or request.query_string:
+        result['@id'] = path + '?' + request.query_string
+    return result
+
+
+class InFlight:
+    '''
+    One computation of a key, with its value or error for the callers
+    waiting on it.
+    '''
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LocalSearchCache:
+    '''
+    In process LRU for small, frequently repeated search responses.
+
+    Entries younger than ttl are served as is. Entries younger than
+    ttl + stale_ttl are served while a single background refresh replaces
+    them. Concurrent misses on the same key wait for one computation and
+    share its value or error. Each caller gets its own copy of the value.
+    '''
+
+    def __init__(self, capacity=5000, ttl=30, stale_ttl=300, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.metrics = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+        self._in_flight = {}
+        self._refreshing = set()
+        self.lock = threading.Lock()
+
+    def _count(self, name, metric):
+        self.metrics[name][metric] += 1
+
+    def _lookup(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, None
+        value, stored_at = entry
+        age = self.clock() - stored_at
+        if age < self.ttl:
+            self.entries.move_to_end(key)
+            return value, 'hit'
+        if age < self.ttl + self.stale_ttl:
+            self.entries.move_to_end(key)
+            return value, 'stale'
+        del self.entries[key]
+        return None, None
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, self.clock())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_or_compute(self, name, key, compute, refresh=None):
+        '''
+        Copy of the cached value for key, else compute(), and how it was found.
+        A stale value is returned at once and refresh(), defaulting to
+        compute, replaces it in a background thread.
+        '''
+        with self.lock:
+            value, state = self._lookup(key)
+            if state is not None:
+                self._count(name, state)
+                if state == 'stale' and key not in self._refreshing:
+                    self._refreshing.add(key)
+                    self._count(name, 'refresh')
+                    thread = threading.Thread(
+                        target=self._refresh,
+                        args=(name, key, refresh or compute),
+                        name='local-search-cache-refresh',
+                    )
+                    thread.daemon = True
+                    thread.start()
+                return copy.deepcopy(value), state
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = InFlight()
+                self._count(name, 'miss')
+            else:
+                self._count(name, 'coalesced')
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value), 'coalesced'
+        try:
+            value = compute()
+        except Exception as e:
+            flight.error = e
+            with self.lock:
+                self._count(name, 'error')
+            raise
+        else:
+            flight.value = copy.deepcopy(value)
+            self.set(key, copy.deepcopy(value))
+            return value, 'miss'
+        finally:
+            with self.lock:
+                del self._in_flight[key]
+            flight.event.set()
+
+    def _refresh(self, name, key, refresh):
+        try:
+            self.set(key, copy.deepcopy(refresh()))
+        except Exception:
+            log.warning('Could not refresh %s', key, exc_info=True)
+            with self.lock:
+                self._count(name, 'error')
+        finally:
+            with self.lock:
+                self._refreshing.discard(key)
+
+    def status(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'capacity': self.capacity,
+                'ttl': self.ttl,
+                'stale_ttl': self.stale_ttl,
+                'metrics': {name: dict(metrics) for name, metrics in self.metrics.items()},
+            }
+
+
+def refresh_in_new_request(request):
+    '''
+    Render the same query again as a new request with the same credentials,
+    once the request that saw the stale entry may be finished. The view
+    hands its result back through the environ, bypassing the cache.
+    '''
+    from pyramid.request import Request
+    from pyramid.router import Router
+    registry = request.registry
+    path_qs = request.path_qs
+    headers = {'Accept': 'application/json'}
+    headers.update(
+        (header, request.headers[header])
+        for header in CREDENTIAL_HEADERS
+        if header in request.headers
+    )
+    environ = {
+        key: request.environ[key]
+        for key in CREDENTIAL_ENVIRON
+        if key in request.environ
+    }
+
+    def refresh():
+        result = {}
+        refresh_request = Request.blank(path_qs, environ=dict(environ), headers=headers)
+        refresh_request.environ[REFRESH_ENVIRON_KEY] = result
+        refresh_request.registry = registry
+        response = Router(registry).invoke_request(refresh_request)
+        if 'value' not in result:
+            raise ValueError('Refresh of %s returned %s' % (path_qs, response.status))
+        return result['value']
+
+    return refresh
+
+
+def local_search_cache(name):
+    '''
+    Serves the view from the local search cache registered on the app,
+    or calls it directly when there is none.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(context, request):
+            cache = request.registry.get(LOCAL_SEARCH_CACHE)
+            if cache is None:
+                return view(context, request)
+            refreshed = request.environ.get(REFRESH_ENVIRON_KEY)
+            if refreshed is not None:
+                refreshed['value'] = copy.deepcopy(view(context, request))
+                return with_request_id(copy.deepcopy(refreshed['value']), request)
+            result, state = cache.get_or_compute(
+                name,
+                make_local_key(name, request),
+                lambda: view(context, request),
+                refresh=refresh_in_new_request(request),
+            )
+            stats = getattr(request, '_stats', None)
+            if stats is not None:
+                stats['local_search_cache'] = state
+            return with_request_id(result, request)
+        return wrapper
+    return decorator
+
+
+@view_config(route_name='_local_search_cache', request_method='GET', permission='index')
+def local_search_cache_view(context, request):
+    request.response.headers['Cache-Control'] = 'no-cache'
+    return request.registry[LOCAL_SEARCH_CACHE].status()
@@ -0,0 +1,242 @@
+import hashlib
+import logging
+import threading
+import time
+
+from pyramid.events import NewResponse
+from pyramid.events import subscriber
+from pyramid.view import view_config
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+from urllib.parse import parse_qsl
+
+from encoded.searches.defaults import DEFAULT_MATRIX_QUERIES
+from encoded.searches.interfaces import INDEXED_XMIN
+from encoded.searches.interfaces import MATRIX_MATERIALIZER
+
+
+log = logging.getLogger(__name__)
+
+# Parameters that do not make a query another default matrix.
+IGNORED_PARAMS = ('format',)
+
+
+def includeme(config):
+    settings = config.registry.settings
+    config.registry[INDEXED_XMIN] = IndexedXmin(
+        ttl=float(settings.get('materialized_matrix.xmin_ttl', 10)),
+    )
+    config.registry[MATRIX_MATERIALIZER] = MatrixMaterializer()
+    config.add_route('_materialize_matrices', '/_materialize_matrices')
+    config.scan(__name__)
+
+
+def normalize_query(query_string):
+    return tuple(
+        sorted(
+            (key, value)
+            for key, value in parse_qsl(query_string, keep_blank_values=True)
+            if key not in IGNORED_PARAMS
+        )
+    )
+
+
+DEFAULT_MATRIX_KEYS = {
+    route_name: {normalize_query(query_string) for query_string in query_strings}
+    for route_name, query_strings in DEFAULT_MATRIX_QUERIES.items()
+}
+
+
+class IndexedXmin:
+    '''
+    The xmin recorded by the indexer at the end of its last cycle, read
+    from the meta index at most once per ttl.
+    '''
+
+    def __init__(self, ttl=10):
+        self.ttl = ttl
+        self.value = None
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+    def _read(self, registry):
+        status = registry[ELASTIC_SEARCH].get(
+            index=registry.settings['snovault.elasticsearch.index'],
+            doc_type='meta',
+            id='indexing',
+            ignore=[400, 404]
+        )
+        if status.get('found'):
+            return status['_source'].get('xmin')
+        return None
+
+    def get(self, registry, refresh=False):
+        with self.lock:
+            now = time.time()
+            if refresh or self.checked_at is None or now - self.checked_at >= self.ttl:
+                try:
+                    self.value = self._read(registry)
+                except Exception:
+                    log.warning('Could not read indexer xmin', exc_info=True)
+                    self.value = None
+                self.checked_at = now
+            return self.value
+
+
+def get_indexed_xmin(request, refresh=False):
+    return request.registry[INDEXED_XMIN].get(request.registry, refresh=refresh)
+
+
+def is_default_matrix_request(context, request):
+    route = request.matched_route
+    if route is None or route.name not in DEFAULT_MATRIX_KEYS:
+        return False
+    if normalize_query(request.query_string) not in DEFAULT_MATRIX_KEYS[route.name]:
+        return False
+    return get_indexed_xmin(request) is not None
+
+
+def make_materialized_matrix_key(context, request):
+    # Results are filtered by principals, and an item's ACL may grant a single
+    # userid, so each set of principals gets its own copy.
+    # The query string is kept as sent: the cached @id must match it or
+    # canonical_redirect would send the client to another query.
+    principals = hashlib.sha1(
+        '|'.join(sorted(request.effective_principals)).encode('utf-8')
+    ).hexdigest()
+    return 'materialized-matrix.{}.{}.{}.{}'.format(
+        request.matched_route.name,
+        get_indexed_xmin(request),
+        principals,
+        request.query_string,
+    )
+
+
+
+def materialized_matrix_cache(view):
+    '''
+    Stores a default matrix in the redis cache for the current indexer
+    xmin, other queries are rendered as usual.
+    '''
+    from snosearch.decorators import conditional_cache
+    from encoded.searches.caches import get_redis_lru_cache
+    return conditional_cache(
+        cache=get_redis_lru_cache(),
+        condition=is_default_matrix_request,
+        key=make_materialized_matrix_key,
+    )(view)
+
+def default_matrix_paths(registry):
+    from pyramid.request import Request
+    request = Request.blank('/')
+    request.registry = registry
+    for route_name, query_strings in sorted(DEFAULT_MATRIX_QUERIES.items()):
+        path = request.route_path(route_name, slash='/')
+        for query_string in query_strings:
+            yield path + '?' + query_string
+
+
+def invoke_anonymous(registry, path):
+    from pyramid.request import Request
+    from pyramid.router import Router
+    request = Request.blank(path, headers={'Accept': 'application/json'})
+    request.registry = registry
+    return Router(registry).invoke_request(request)
+
+
+def materialize_default_matrices(registry, invoke=invoke_anonymous):
+    '''
+    Render each default matrix as a new anonymous request so the result
+    for the current xmin is stored before a user asks for it. Logged in
+    principal groups are stored on their first request instead.
+    '''
+    rendered = []
+    for path in default_matrix_paths(registry):
+        try:
+            response = invoke(registry, path)
+        except Exception:
+            log.warning('Could not materialize %s', path, exc_info=True)
+            continue
+        if response.status_int != 200:
+            log.warning('Could not materialize %s: %s', path, response.status)
+            continue
+        rendered.append(path)
+    return rendered
+
+
+class MatrixMaterializer:
+    '''
+    Renders the default matrices in a background thread, one run at a
+    time, so the indexing request that triggers it is not held up.
+    '''
+
+    def __init__(self, invoke=invoke_anonymous):
+        self.invoke = invoke
+        self.xmin = None
+        self.started = None
+        self.finished = None
+        self.materialized = []
+        self._thread = None
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, registry, xmin):
+        with self.lock:
+            if self.running:
+                return False
+            self.xmin = xmin
+            self.started = time.time()
+            self.finished = None
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(registry,),
+                name='matrix-materializer',
+            )
+            self._thread.daemon = True
+            self._thread.start()
+        return True
+
+    def _run(self, registry):
+        try:
+            self.materialized = materialize_default_matrices(registry, self.invoke)
+        finally:
+            self.finished = time.time()
+
+    def status(self):
+        return {
+            'running': self.running,
+            'xmin': self.xmin,
+            'started': self.started,
+            'finished': self.finished,
+            'materialized': self.materialized,
+        }
+
+
+@subscriber(NewResponse)
+def materialize_after_indexing(event):
+    # Runs in the indexer process once a cycle has recorded its xmin.
+    request = event.request
+    route = request.matched_route
+    if route is None or route.name != 'index' or event.response.status_int != 200:
+        return
+    if not request.json.get('record', False) or request.json.get('dry_run', False):
+        return
+    previous = request.registry[INDEXED_XMIN].value
+    xmin = get_indexed_xmin(request, refresh=True)
+    if xmin != previous:
+        request.registry[MATRIX_MATERIALIZER].start(request.registry, xmin)
+
+
+@view_config(route_name='_materialize_matrices', request_method='GET', permission='index')
+def materialize_matrices_status(context, request):
+    request.response.headers['Cache-Control'] = 'no-cache'
+    return request.registry[MATRIX_MATERIALIZER].status()
+
+
+@view_config(route_name='_materialize_matrices', request_method='POST', permission='index')
+def materialize_matrices(context, request):
+    materializer = request.registry[MATRIX_MATERIALIZER]
+    materializer.start(request.registry, get_indexed_xmin(request, refresh=True))
+    return materializer.status()
@@ -0,0 +1,342 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from collections import Counter
+from collections import deque
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.view import view_config
+from snovault.elasticsearch import TimedUrllib3HttpConnection
+from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+from snovault.util import get_root_request
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+from encoded.searches.interfaces import ES_QUERY_CAPTURE
+from encoded.stats_util import percentile
+from encoded.stats_util import route_name
+
+
+log = logging.getLogger(__name__)
+
+# Keys whose values name fields rather than carry search terms.
+KEPT_KEYS = ('field', 'fields', 'path', '_source', 'includes', 'excludes')
+
+AGGREGATION_KEYS = ('aggs', 'aggregations')
+
+# Limits that keep a forgotten capture cheap on a production worker.
+MAX_DURATION = 15 * 60
+MAX_DESCRIPTION = 300
+
+
+def includeme(config):
+    settings = config.registry.settings
+    config.registry[ES_QUERY_CAPTURE] = QueryCapture(
+        window=int(settings.get('es_query_capture.window', 1000)),
+    )
+    # Rebuild the connections of the search client with the capturing class.
+    transport = config.registry[ELASTIC_SEARCH].transport
+    transport.connection_class = QueryCaptureConnection
+    transport.set_connections(transport.hosts)
+    config.add_route('_es_queries', '/_es_queries')
+    config.scan(__name__)
+
+
+def strip_values(value, key=None):
+    '''
+    Query body with the search terms, sizes and other values replaced by ?.
+    Structure and field names are kept.
+    '''
+    if key in KEPT_KEYS:
+        return value
+    if isinstance(value, dict):
+        return {k: strip_values(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [strip_values(item) for item in value]
+        if any(isinstance(item, (dict, list)) for item in items):
+            return items
+        return ['?'] if items else []
+    return '?'
+
+
+def make_shape_id(shape):
+    return hashlib.sha1(
+        json.dumps(shape, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:12]
+
+
+def count_aggregations(body):
+    if isinstance(body, list):
+        return sum(count_aggregations(item) for item in body)
+    if not isinstance(body, dict):
+        return 0
+    count = 0
+    for key, value in body.items():
+        if key in AGGREGATION_KEYS and isinstance(value, dict):
+            count += len(value)
+        count += count_aggregations(value)
+    return count
+
+
+def total_hits(response):
+    total = response.get('hits', {}).get('total')
+    if isinstance(total, dict):
+        return total.get('value')
+    return total
+
+
+def is_search(path):
+    return urlsplit(path).path.rstrip('/').endswith(('/_search', '/_msearch'))
+
+
+def split_searches(path, body, response):
+    '''
+    (path, query, response) of each search in a _search or _msearch request.
+    '''
+    url = urlsplit(path)
+    if not url.path.rstrip('/').endswith('/_msearch'):
+        return [(path, json.loads(body), json.loads(response))]
+    lines = [line for line in body.splitlines() if line.strip()]
+    responses = json.loads(response).get('responses', [])
+    searches = []
+    for header, query, result in zip(lines[0::2], lines[1::2], responses):
+        index = json.loads(header).get('index')
+        if isinstance(index, list):
+            index = ','.join(index)
+        search_path = url.path.rstrip('/')[:-len('_msearch')] + '_search'
+        if index:
+            search_path = '/{}/_search'.format(index)
+        searches.append((search_path, json.loads(query), result))
+    return searches
+
+
+def flatten_profile(entries, kind, totals):
+    for entry in entries:
+        key = (kind, entry.get('type'), entry.get('description', '')[:MAX_DESCRIPTION])
+        totals[key] += entry.get('time_in_nanos', 0)
+        flatten_profile(entry.get('children', []), kind, totals)
+
+
+def summarize_profile(result, top=20):
+    '''
+    Time of each query and aggregation component summed over the shards,
+    slowest first.
+    '''
+    totals = Counter()
+    shards = result.get('profile', {}).get('shards', [])
+    for shard in shards:
+        for search in shard.get('searches', []):
+            flatten_profile(search.get('query', []), 'query', totals)
+        flatten_profile(shard.get('aggregations', []), 'aggregation', totals)
+    summary = {
+        'took': result.get('took'),
+        'hits': total_hits(result),
+        'shards': len(shards),
+        'query': [],
+        'aggregation': [],
+    }
+    for (kind, type_, description), nanos in totals.most_common():
+        if len(summary[kind]) < top:
+            summary[kind].append({
+                'type': type_,
+                'description': description,
+                'time_ms': round(nanos / 1e6, 3),
+            })
+    return summary
+
+
+class QueryCapture:
+    '''
+    Shapes, took, hits and aggregation count of the ES searches made for
+    each route, over a window of the latest searches.
+
+    Capturing is started for a limited time, like the sampling profiler,
+    and only covers the process that received the start request. Samples
+    only keep numbers, the stripped shape and the latest query of each
+    shape are kept once per shape.
+    '''
+
+    def __init__(self, window=1000, clock=time.time):
+        self.window = window
+        self.clock = clock
+        self.started = None
+        self.until = None
+        self.searches = 0
+        self.samples = deque(maxlen=window)
+        self.shapes = {}
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.until is not None and self.clock() < self.until
+
+    def start(self, duration=60):
+        duration = min(float(duration), MAX_DURATION)
+        with self._lock:
+            self.started = self.clock()
+            self.until = self.started + duration
+            self.searches = 0
+            self.samples.clear()
+            self.shapes = {}
+            self.queries = {}
+
+    def stop(self):
+        self.until = self.clock()
+
+    def record(self, route, path, query, response):
+        if query.get('profile'):
+            return
+        shape = strip_values(query)
+        shape_id = make_shape_id(shape)
+        sample = {
+            'route': route,
+            'shape': shape_id,
+            'took': response.get('took'),
+            'hits': total_hits(response),
+            'aggregations': count_aggregations(query),
+        }
+        with self._lock:
+            self.searches += 1
+            self.samples.append(sample)
+            self.shapes[shape_id] = shape
+            self.queries[shape_id] = (path, query)
+            if len(self.shapes) > 2 * self.window:
+                in_window = {sample['shape'] for sample in self.samples}
+                self.shapes = {
+                    key: value for key, value in self.shapes.items() if key in in_window
+                }
+                self.queries = {
+                    key: value for key, value in self.queries.items() if key in in_window
+                }
+
+    def latest(self, shape_id):
+        '''
+        (path, query) of the latest search of a shape.
+        '''
+        with self._lock:
+            return self.queries.get(shape_id)
+
+    def slowest(self, top=20):
+        '''
+        Shapes in the window by total took, the load they put on the cluster.
+        '''
+        with self._lock:
+            samples = list(self.samples)
+            shapes = dict(self.shapes)
+        by_shape = {}
+        for sample in samples:
+            by_shape.setdefault(sample['shape'], []).append(sample)
+        result = []
+        for shape_id, shape_samples in by_shape.items():
+            took = [sample['took'] for sample in shape_samples if sample['took'] is not None]
+            hits = [sample['hits'] for sample in shape_samples if sample['hits'] is not None]
+            result.append({
+                'shape_id': shape_id,
+                'count': len(shape_samples),
+                'took_total': sum(took),
+                'took_p50': percentile(took, 0.5),
+                'took_p95': percentile(took, 0.95),
+                'took_max': max(took) if took else None,
+                'hits_max': max(hits) if hits else None,
+                'aggregations': shape_samples[-1]['aggregations'],
+                'routes': dict(Counter(sample['route'] for sample in shape_samples)),
+                'shape': shapes.get(shape_id),
+            })
+        result.sort(key=lambda item: -item['took_total'])
+        return result[:top]
+
+    def status(self):
+        return {
+            'running': self.running,
+            'started': self.started,
+            'until': self.until,
+            'window': self.window,
+            'searches': self.searches,
+            'samples': len(self.samples),
+        }
+
+    def profile(self, client, shape_id):
+        '''
+        Run the latest query of a shape again with profile: true.
+        '''
+        latest = self.latest(shape_id)
+        if latest is None:
+            raise KeyError(shape_id)
+        path, query = latest
+        url = urlsplit(path)
+        result = client.transport.perform_request(
+            'POST',
+            url.path,
+            params=dict(parse_qsl(url.query)),
+            body=dict(query, profile=True),
+        )
+        return dict(summarize_profile(result), shape_id=shape_id, path=url.path)
+
+
+def capture_searches(path, body, response):
+    request = get_root_request()
+    if request is None:
+        return
+    capture = request.registry.get(ES_QUERY_CAPTURE)
+    if capture is None or not capture.running or not is_search(path):
+        return
+    try:
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        route = route_name(request)
+        for search_path, query, result in split_searches(path, body, response):
+            capture.record(route, search_path, query, result)
+    except Exception:
+        log.exception('Could not capture search to %s', path)
+
+
+class QueryCaptureConnection(TimedUrllib3HttpConnection):
+
+    def log_request_success(self, method, full_url, path, body, status_code, response, duration):
+        if body:
+            capture_searches(path, body, response)
+        return super().log_request_success(
+            method, full_url, path, body, status_code, response, duration
+        )
+
+
+@view_config(route_name='_es_queries', request_method='GET', permission='index')
+def es_queries_view(request):
+    '''
+    Capture status and the slowest shapes, ?top=20 by default.
+    '''
+    capture = request.registry[ES_QUERY_CAPTURE]
+    request.response.headers['Cache-Control'] = 'no-cache'
+    return dict(
+        capture.status(),
+        shapes=capture.slowest(int(request.params.get('top', 20))),
+    )
+
+
+@view_config(route_name='_es_queries', request_method='POST', permission='index')
+def es_queries_control(request):
+    '''
+    {"action": "start", "duration": 60}, {"action": "stop"}
+    or {"action": "profile", "shape_id": "..."}
+    '''
+    capture = request.registry[ES_QUERY_CAPTURE]
+    body = request.json_body
+    action = body.get('action', 'start')
+    if action == 'stop':
+        capture.stop()
+    elif action == 'start':
+        try:
+            capture.start(duration=body.get('duration', 60))
+        except (ValueError, TypeError) as e:
+            raise HTTPBadRequest(explanation=str(e))
+    elif action == 'profile':
+        try:
+            return capture.profile(request.registry[ELASTIC_SEARCH], body.get('shape_id'))
+        except KeyError:
+            raise HTTPBadRequest(explanation='No captured search with shape %r' % body.get('shape_id'))
+    else:
+        raise HTTPBadRequest(explanation='Unknown action %r' % action)
+    return capture.status()
@@ -1,27 +1,53 @@
+from collections import (
+    Counter,
+    defaultdict,
+    deque,
+)
 from datetime import datetime
 from jsonschema_serialize_fork import NO_DEFAULT
+from pyramid.settings import asbool
 from pyramid.threadlocal import get_current_request
+from pyramid.view import view_config
 from string import (
     digits,
     ascii_uppercase,
     )
+import logging
 import random
+import threading
+import time
 import uuid
 
+from snovault import DBSESSION
 from snovault.schema_utils import server_default
 
 
 ACCESSION_FACTORY = __name__ + ':accession_factory'
+ACCESSION_POOL = __name__ + ':accession_pool'
+
+log = logging.getLogger(__name__)
 
 
 def includeme(config):
     from pyramid.path import DottedNameResolver
-    accession_factory = config.registry.settings.get('accession_factory')
+    settings = config.registry.settings
+    accession_factory = settings.get('accession_factory')
     if accession_factory:
         factory = DottedNameResolver().resolve(accession_factory)
     else:
         factory = enc_accession
     config.registry[ACCESSION_FACTORY] = factory
+    block_size = int(settings.get('accession_pool.block_size', 100))
+    if block_size:
+        config.registry[ACCESSION_POOL] = AccessionPool(
+            config.registry,
+            factory,
+            block_size=block_size,
+            max_age=int(settings.get('accession_pool.max_age', 300)),
+            background=asbool(settings.get('accession_pool.background', False)),
+        )
+    config.add_route('_accession_pool', '/_accession_pool')
+    config.scan(__name__)
 
 
 @server_default
@@ -50,6 +76,9 @@ def accession(instance, subschema):
     if 'external_accession' in instance:
         return NO_DEFAULT
     request = get_current_request()
+    pool = request.registry.get(ACCESSION_POOL)
+    if pool is not None:
+        return pool.get(subschema['accessionType'])
     factory = request.registry[ACCESSION_FACTORY]
     # With 17 576 000 options
     ATTEMPTS = 10
@@ -77,3 +106,156 @@ def test_accession(accession_type):
     """
     random_part = ''.join(random.choice(s) for s in TEST_ACCESSION_FORMAT)
     return 'TST' + accession_type + random_part
+
+
+class AccessionPool(object):
+    """ Per process pool of free accessions for each accession type
+
+    Rather than checking each new accession against the database, blocks of
+    random accessions are checked with a single query and the free ones kept
+    in memory. Another process may hand out a pooled accession meanwhile,
+    so max_age limits how long a reserved accession is trusted and the
+    accessions still pooled are checked again with each new block. The
+    unique key constraint catches what is taken in between.
+    """
+    def __init__(self, registry, factory, block_size=100, max_age=300, background=False):
+        self.registry = registry
+        self.factory = factory
+        self.block_size = block_size
+        self.max_age = max_age
+        self.background = background
+        # Refill once a pool is down to a quarter of a block.
+        self.low_water = max(1, block_size // 4)
+        self._pools = defaultdict(deque)
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(Counter)
+
+    def get(self, accession_type):
+        while True:
+            with self._lock:
+                accession = self._pop(accession_type)
+                depth = len(self._pools[accession_type])
+                if accession is not None:
+                    self._stats[accession_type]['issued'] += 1
+            if accession is not None:
+                if self.background and depth < self.low_water:
+                    self._refill_in_background(accession_type)
+                return accession
+            self.reserve(accession_type)
+
+    def _pop(self, accession_type):
+        pool = self._pools[accession_type]
+        oldest = time.time() - self.max_age
+        while pool:
+            accession, reserved_at = pool.popleft()
+            if reserved_at >= oldest:
+                return accession
+            self._stats[accession_type]['expired'] += 1
+        return None
+
+    def reserve(self, accession_type, taken=None):
+        """ Add a block of free accessions to the pool
+
+        taken(accessions) must return the subset already in use, by default
+        session_taken. The accessions still pooled are checked in the same
+        query and the ones taken meanwhile are dropped.
+        """
+        if taken is None:
+            taken = self.session_taken
+        candidates = set()
+        for attempt in range(self.block_size * 10):
+            candidates.add(self.factory(accession_type))
+            if len(candidates) == self.block_size:
+                break
+        with self._lock:
+            checked = {accession for accession, reserved_at in self._pools[accession_type]}
+        existing = set(taken(sorted(candidates | checked)))
+        now = time.time()
+        with self._lock:
+            pool = self._pools[accession_type]
+            kept = [
+                (accession, now if accession in checked else reserved_at)
+                for accession, reserved_at in pool
+                if accession not in existing
+            ]
+            conflicts = len(pool) - len(kept)
+            pooled = {accession for accession, reserved_at in kept}
+            free = sorted(candidates - existing - pooled)
+            random.shuffle(free)
+            pool.clear()
+            pool.extend(kept)
+            pool.extend((accession, now) for accession in free)
+            stats = self._stats[accession_type]
+            stats['blocks'] += 1
+            stats['candidates'] += len(candidates)
+            stats['collisions'] += len(existing & candidates)
+            stats['conflicts'] += conflicts
+            stats['reserved'] += len(free)
+            depth = len(pool)
+        if not depth:
+            raise AssertionError(
+                "Free accession not found in block of %d" % len(candidates))
+
+    def session_taken(self, candidates):
+        """ Accessions in use, as seen by the transaction of the request
+        """
+        from snovault.storage import Key
+        session = self.registry[DBSESSION]()
+        return {
+            value for value, in session.query(Key.value).filter(
+                Key.name == 'accession', Key.value.in_(candidates))
+        }
+
+    def engine_taken(self, candidates):
+        """ Accessions in use, from a connection of its own
+
+        Outside a request there is no transaction to join.
+        """
+        from snovault.storage import Key
+        from sqlalchemy import select
+        engine = self.registry[DBSESSION].session_factory.kw['bind']
+        query = select([Key.value]).where(Key.name == 'accession').where(Key.value.in_(candidates))
+        with engine.connect() as connection:
+            return {value for value, in connection.execute(query)}
+
+    def _refill_in_background(self, accession_type):
+        with self._lock:
+            if accession_type in self._refilling:
+                return
+            self._refilling.add(accession_type)
+
+        def refill():
+            try:
+                self.reserve(accession_type, self.engine_taken)
+            except Exception:
+                log.exception('Refilling %s accession pool failed', accession_type)
+            finally:
+                with self._lock:
+                    self._refilling.discard(accession_type)
+
+        thread = threading.Thread(target=refill, name='accession-pool-refill')
+        thread.daemon = True
+        thread.start()
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for accession_type, stats in self._stats.items():
+                candidates = stats['candidates']
+                result[accession_type] = dict(
+                    stats,
+                    depth=len(self._pools[accession_type]),
+                    collision_rate=stats['collisions'] / candidates if candidates else 0.0,
+                )
+            return result
+
+
+@view_config(route_name='_accession_pool', request_method='GET', permission='index')
+def accession_pool_stats(request):
+    pool = request.registry.get(ACCESSION_POOL)
+    return {
+        'block_size': pool.block_size if pool is not None else 0,
+        'background': pool.background if pool is not None else False,
+        'accession_types': pool.stats() if pool is not None else {},
+    }
@@ -0,0 +1,235 @@
+""" SQL statements issued by each request
+
+Every statement run while serving a request is reduced to its shape, the
+SQL text with parameters and IN lists collapsed. A shape repeated within
+one request is usually a lookup made once per linked item, the N+1 query
+pattern of calculated properties chaining get_by_uuid calls.
+
+The number of distinct shapes and of repeated statements is added to the
+X-Stats header next to the db_count and db_time of snovault.stats, and
+totals are kept per route for the /_sql_stats view. With
+sql_stats.log_n_plus_one = true, shapes repeated sql_stats.n_plus_one
+times or more are logged with the calculated properties that issued them.
+"""
+from collections import (
+    Counter,
+    defaultdict,
+)
+from functools import lru_cache
+from pyramid.events import (
+    NewRequest,
+    subscriber,
+)
+from pyramid.settings import asbool
+from pyramid.view import view_config
+from snovault import DBSESSION
+from snovault.util import get_root_request
+from encoded.stats_util import route_name
+import logging
+import re
+import sys
+import threading
+
+
+SQL_STATS = __name__ + ':sql_stats'
+
+# Requests repeating a shape this many times are counted as N+1.
+N_PLUS_ONE = 10
+# Shapes kept for each route, the least repeated are dropped beyond it.
+MAX_SHAPES = 100
+MAX_DEPTH = 64
+
+PARAMETER = re.compile(r'%\(\w+\)s|%s')
+PARAMETER_LIST = re.compile(r'\?(\s*,\s*\?)+')
+WHITESPACE = re.compile(r'\s+')
+
+log = logging.getLogger(__name__)
+
+
+def includeme(config):
+    settings = config.registry.settings
+    sql_stats = config.registry[SQL_STATS] = SQLStats(
+        n_plus_one=int(settings.get('sql_stats.n_plus_one', N_PLUS_ONE)),
+        log_n_plus_one=asbool(settings.get('sql_stats.log_n_plus_one', False)),
+    )
+    bind = config.registry[DBSESSION].session_factory.kw.get('bind')
+    if bind is not None:
+        listen(bind, sql_stats)
+    config.add_route('_sql_stats', '/_sql_stats')
+    config.scan(__name__)
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement):
+    shape = PARAMETER.sub('?', statement)
+    shape = PARAMETER_LIST.sub('?, ...', shape)
+    return WHITESPACE.sub(' ', shape).strip()
+
+
+def calculated_property_codes(registry):
+    """ Code objects of the calculated properties, by qualified name
+    """
+    from snovault.calculated import CALCULATED_PROPERTIES
+    codes = {}
+    for cls_props in registry[CALCULATED_PROPERTIES].category_cls_props.values():
+        for props in cls_props.values():
+            for prop in props.values():
+                code = getattr(prop.fn, '__code__', None)
+                if code is not None:
+                    codes[code] = prop.fn.__qualname__
+    return codes
+
+
+def calling_property(codes, frame):
+    """ Innermost calculated property on the stack
+    """
+    depth = 0
+    while frame is not None and depth < MAX_DEPTH:
+        name = codes.get(frame.f_code)
+        if name is not None:
+            return name
+        frame = frame.f_back
+        depth += 1
+    return None
+
+
+class RequestStatements(object):
+    """ Statement shapes of one request and where the repeats came from
+    """
+    def __init__(self):
+        self.shapes = Counter()
+        self.callers = defaultdict(Counter)
+
+    def add(self, shape):
+        self.shapes[shape] += 1
+        return self.shapes[shape]
+
+    def repeated(self):
+        return sum(self.shapes.values()) - len(self.shapes)
+
+
+class SQLStats(object):
+    """ Statement counts of each route, with the shapes repeated N+1 style
+    """
+    def __init__(self, n_plus_one=N_PLUS_ONE, log_n_plus_one=False, max_shapes=MAX_SHAPES):
+        self.n_plus_one = n_plus_one
+        self.log_n_plus_one = log_n_plus_one
+        self.max_shapes = max_shapes
+        self._routes = {}
+        self._codes = None
+        self._lock = threading.Lock()
+
+    def statement(self, request, statement):
+        statements = getattr(request, '_sql_statements', None)
+        if statements is None:
+            return
+        shape = statement_shape(statement)
+        count = statements.add(shape)
+        stats = request._stats
+        stats['db_shapes'] = len(statements.shapes)
+        if count > 1:
+            stats['db_repeated'] = stats.get('db_repeated', 0) + 1
+            if self.log_n_plus_one:
+                caller = calling_property(self.codes(request.registry), sys._getframe(1))
+                statements.callers[shape][caller] += 1
+
+    def codes(self, registry):
+        if self._codes is None:
+            self._codes = calculated_property_codes(registry)
+        return self._codes
+
+    def record(self, route, statements, db_time=0):
+        n_plus_one = {
+            shape: count for shape, count in statements.shapes.items()
+            if count >= self.n_plus_one
+        }
+        with self._lock:
+            totals = self._routes.get(route)
+            if totals is None:
+                totals = self._routes[route] = {
+                    'requests': 0,
+                    'statements': 0,
+                    'db_time': 0,
+                    'repeated': 0,
+                    'max_statements': 0,
+                    'n_plus_one_requests': 0,
+                    'shapes': Counter(),
+                }
+            count = sum(statements.shapes.values())
+            totals['requests'] += 1
+            totals['statements'] += count
+            totals['db_time'] += db_time
+            totals['repeated'] += statements.repeated()
+            totals['max_statements'] = max(totals['max_statements'], count)
+            if n_plus_one:
+                totals['n_plus_one_requests'] += 1
+                totals['shapes'].update(n_plus_one)
+                if len(totals['shapes']) > self.max_shapes:
+                    totals['shapes'] = Counter(dict(totals['shapes'].most_common(self.max_shapes)))
+        if self.log_n_plus_one:
+            for shape, count in n_plus_one.items():
+                callers = statements.callers.get(shape, {})
+                log.warning(
+                    'N+1 in %s: %d x %s from %s', route, count, shape,
+                    ', '.join('%s (%d)' % (caller or 'unknown', calls)
+                              for caller, calls in Counter(callers).most_common()) or 'unknown',
+                )
+
+    def routes(self, top=10):
+        with self._lock:
+            routes = {
+                route: dict(totals, shapes=totals['shapes'].most_common(top))
+                for route, totals in self._routes.items()
+            }
+        result = {}
+        for route in sorted(routes, key=lambda route: -routes[route]['statements']):
+            totals = routes[route]
+            requests = totals['requests']
+            result[route] = dict(
+                totals,
+                statements_per_request=round(totals['statements'] / requests, 1),
+                db_time_per_request=round(totals['db_time'] / requests),
+                shapes=[{'shape': shape, 'repeats': count} for shape, count in totals['shapes']],
+            )
+        return result
+
+
+def listen(bind, sql_stats):
+    from sqlalchemy import event
+
+    @event.listens_for(bind, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        request = get_root_request()
+        if request is None:
+            return
+        sql_stats.statement(request, statement)
+
+
+def record_statements(request):
+    sql_stats = request.registry.get(SQL_STATS)
+    statements = getattr(request, '_sql_statements', None)
+    if sql_stats is None or statements is None:
+        return
+    sql_stats.record(
+        route_name(request), statements, getattr(request, '_stats', {}).get('db_time', 0))
+
+
+@subscriber(NewRequest)
+def track_statements(event):
+    request = event.request
+    root = get_root_request()
+    if root is not None and root is not request:
+        return
+    request._sql_statements = RequestStatements()
+    request.add_finished_callback(record_statements)
+
+
+@view_config(route_name='_sql_stats', request_method='GET', permission='index')
+def sql_stats_view(request):
+    request.response.headers['Cache-Control'] = 'no-cache'
+    sql_stats = request.registry[SQL_STATS]
+    return {
+        'n_plus_one': sql_stats.n_plus_one,
+        'log_n_plus_one': sql_stats.log_n_plus_one,
+        'routes': sql_stats.routes(int(request.params.get('top', 10))),
+    }
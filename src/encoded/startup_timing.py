@@ -0,0 +1,91 @@
+""" Time spent in each step of building the app
+
+encoded.main times each of its own config.include calls, the loading of
+the ontology, the commit of the config and make_wsgi_app. The breakdown
+is logged once the app is built and kept in the registry for the
+/_startup_timing view.
+
+An include nested in another is counted in the time of the top level
+include and is not listed on its own. Most of what an include registers,
+views, routes, types and the venusian scan callbacks, only runs as
+deferred actions when the config is committed, so the bulk of the startup
+time shows as the commit step rather than under the include that added it.
+"""
+from pyramid.view import view_config
+import logging
+import time
+
+
+STARTUP_TIMING = __name__ + ':startup_timing'
+
+NOTE = (
+    'Includes are top level only, nested includes are counted in their parent. '
+    'Most of the cost is in the deferred actions run by the commit step, '
+    'not in the include that registered them.'
+)
+
+log = logging.getLogger(__name__)
+
+
+def includeme(config):
+    config.add_route('_startup_timing', '/_startup_timing')
+    config.scan(__name__)
+
+
+class StartupTiming(object):
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started = clock()
+        self.finished = None
+        self.steps = []
+
+    def time(self, name, fn, *args, **kw):
+        start = self.clock()
+        try:
+            return fn(*args, **kw)
+        finally:
+            self.steps.append((name, self.clock() - start))
+
+    def wrap_include(self, config):
+        """ Time each config.include made on config itself
+
+        Included modules get a config of their own, so their includes are
+        not timed separately.
+        """
+        include = config.include
+
+        def timed_include(callable, route_prefix=None):
+            name = callable if isinstance(callable, str) else getattr(callable, '__name__', repr(callable))
+            return self.time('include ' + name, include, callable, route_prefix=route_prefix)
+
+        config.include = timed_include
+        return config
+
+    def finish(self):
+        self.finished = self.clock()
+
+    def total(self):
+        return (self.finished or self.clock()) - self.started
+
+    def summary(self, top=None):
+        steps = sorted(self.steps, key=lambda step: -step[1])
+        return {
+            'total': round(self.total(), 3),
+            'steps': [(name, round(seconds, 3)) for name, seconds in steps[:top]],
+            'note': NOTE,
+        }
+
+    def log(self, top=10):
+        summary = self.summary(top)
+        log.info(
+            'App built in %.2fs. Slowest steps: %s', summary['total'],
+            ', '.join('%s %.2fs' % step for step in summary['steps']),
+        )
+
+
+@view_config(route_name='_startup_timing', request_method='GET', permission='index')
+def startup_timing_view(request):
+    timing = request.registry.get(STARTUP_TIMING)
+    if timing is None:
+        return {'total': None, 'steps': [], 'note': NOTE}
+    return timing.summary()
@@ -0,0 +1,30 @@
+""" Helpers shared by the request accounting, profiling and benchmark code
+"""
+
+
+def percentile(values, fraction):
+    """ Linearly interpolated percentile, fraction 0.5 for the median
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * fraction
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def route_name(request):
+    """ Name of the matched route, or of the traversed context and view
+    """
+    matched_route = getattr(request, 'matched_route', None)
+    if matched_route is not None:
+        return matched_route.name
+    context = getattr(request, 'context', None)
+    if context is None:
+        return None
+    name = type(context).__name__
+    view_name = getattr(request, 'view_name', '')
+    if view_name:
+        name += '@@' + view_name
+    return name
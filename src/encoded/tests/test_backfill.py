@@ -0,0 +1,123 @@
+def test_checkpoint_round_trip(tmpdir):
+    from encoded.commands.backfill import read_checkpoint, write_checkpoint
+    checkpoint = str(tmpdir.join('backfill.json'))
+    assert read_checkpoint(checkpoint) == {}
+    write_checkpoint(checkpoint, {'file': 'a'})
+    write_checkpoint(checkpoint, {'file': 'b', 'lab': 'c'})
+    assert read_checkpoint(checkpoint) == {'file': 'b', 'lab': 'c'}
+    assert tmpdir.listdir() == [tmpdir.join('backfill.json')]
+
+
+def test_format_rate():
+    from encoded.commands.backfill import format_rate
+    assert format_rate(500, 20, 2.0) == '500 read, 20 changed (250.0 items/s)'
+    assert format_rate(0, 0, 0) == '0 read, 0 changed (0.0 items/s)'
+
+
+def test_run_backfill_dry_run(testapp, lab, award):
+    from encoded.commands.backfill import Backfill, run_backfill
+
+    class Retitle(Backfill):
+        item_types = ('lab', 'award')
+        changed = []
+
+        def change(self, item):
+            if item.type_info.item_type != 'lab':
+                return None
+            self.changed.append(str(item.uuid))
+            properties = item.upgrade_properties()
+            properties['title'] = 'Retitled'
+            return properties, None
+
+    backfill = Retitle()
+    read, changed = run_backfill(testapp.app, backfill, batchsize=1, dry_run=True)
+    assert lab['uuid'] in backfill.changed
+    assert changed['lab'] == read['lab'] >= 1
+    assert changed['award'] == 0
+    assert testapp.get(lab['@id']).json['title'] != 'Retitled'
+
+
+def test_run_backfill_commits_and_resumes(testapp, lab, tmpdir):
+    from snovault import DBSESSION
+    from snovault.storage import TransactionRecord
+    from encoded.commands.backfill import Backfill, read_checkpoint, run_backfill
+
+    class Retitle(Backfill):
+        item_types = ('lab',)
+
+        def change(self, item):
+            properties = item.upgrade_properties()
+            properties['title'] = 'Retitled'
+            return properties, None
+
+    checkpoint = str(tmpdir.join('backfill.json'))
+    read, changed = run_backfill(testapp.app, Retitle(), checkpoint=checkpoint)
+    assert changed['lab'] == read['lab'] >= 1
+    assert testapp.get(lab['@id']).json['title'] == 'Retitled'
+    session = testapp.app.registry[DBSESSION]()
+    record = session.query(TransactionRecord).order_by(TransactionRecord.order.desc()).first()
+    assert lab['uuid'] in record.data['updated']
+    assert record.data['userid'] == Retitle.userid
+    assert 'lab' in read_checkpoint(checkpoint)
+
+    read, changed = run_backfill(testapp.app, Retitle(), checkpoint=checkpoint)
+    assert read['lab'] == 0
+    assert changed['lab'] == 0
+
+
+def test_run_backfill_all_types(testapp, lab):
+    from encoded.commands.backfill import Backfill, run_backfill
+
+    class Count(Backfill):
+        def change(self, item):
+            return None
+
+    read, changed = run_backfill(testapp.app, Count(), dry_run=True)
+    assert read['lab'] >= 1
+    assert sum(changed.values()) == 0
+
+
+def test_add_date_created_from_first_propsheet(testapp, root, treatment):
+    from encoded.commands.add_date_created import pacific, run
+    treatment['status'] = 'in progress'
+    item = testapp.post_json('/treatment?validate=false', treatment).json['@graph'][0]
+    assert 'date_created' not in item
+    history = root.get_by_uuid(item['uuid']).model.data[''].history
+    expected = history[0].transaction.timestamp.replace(tzinfo=pacific).isoformat()
+    read, changed = run(testapp.app, collections=['treatment'])
+    assert changed['treatment'] == 1
+    res = testapp.get(item['@id'] + '?frame=object').json
+    assert res['date_created'] == expected
+    # Saved through the schema, so server defaults are filled in.
+    assert res['schema_version']
+
+    read, changed = run(testapp.app, collections=['treatment'])
+    assert changed['treatment'] == 0
+
+
+def test_add_date_created_saves_invalid_unvalidated(testapp, treatment):
+    from encoded.commands.add_date_created import run
+    treatment['disallowed'] = 'errs'
+    item = testapp.post_json('/treatment?validate=false', treatment).json['@graph'][0]
+    read, changed = run(testapp.app, collections=['treatment'])
+    assert changed['treatment'] == 1
+    res = testapp.get(item['@id'] + '?frame=object').json
+    assert res['date_created']
+    assert res['disallowed'] == 'errs'
+
+
+def test_migrate_files_aws(testapp, root, file):
+    from encoded.commands.migrate_files_aws import FilesAWS, run
+    files = {file['uuid']: {'file_size': 1234, 's3_file_name': 'abc/xyz.fasta'}}
+    read, changed = run(testapp.app, files)
+    assert changed['file'] == read['file'] >= 1
+    assert testapp.get(file['@id'] + '?frame=object').json['file_size'] == 1234
+    item = root.get_by_uuid(file['uuid'])
+    assert item.propsheets['external'] == {
+        'service': 's3',
+        'bucket': 'encode-files',
+        'key': 'abc/xyz.fasta',
+    }
+    properties, sheets = FilesAWS({}).change(item)
+    assert properties == item.upgrade_properties()
+    assert sheets is None
@@ -18,6 +18,34 @@ def test_format_row():
     assert expected == target
 
 
+def test_format_row_normalizes_whitespace():
+    target = format_row([' two  words\t', 'line\r\nbreak', ''])
+    assert target == b'two words\tline break\t\r\n'
+
+
+def test_batch_download_compile_column_accessor_dedupes():
+    from encoded.batch_download import compile_column_accessor
+    item = {
+        'files': [
+            {'@id': '/files/A/', 'lab': {'title': 'Lab 1'}},
+            {'@id': '/files/B/', 'lab': {'title': 'Lab 2'}},
+            {'@id': '/files/C/', 'lab': {'title': 'Lab 1'}},
+        ],
+        'replicates': [{'number': 2}, {'number': 1}, {'number': 2}],
+    }
+    assert compile_column_accessor('files')(item) == '/files/A/,/files/B/,/files/C/'
+    assert compile_column_accessor('files.lab.title')(item) == 'Lab 1,Lab 2'
+    assert compile_column_accessor('replicates.number')(item) == '2,1'
+    assert compile_column_accessor('replicates.missing')(item) == ''
+
+
+def test_batch_download_chunked():
+    from encoded.batch_download import chunked
+    rows = [b'a' * 3, b'b' * 3, b'c' * 3]
+    assert list(chunked(iter(rows), size=5)) == [b'aaabbb', b'ccc']
+    assert list(chunked(iter([]), size=5)) == []
+
+
 def test_convert_camel_to_snake_with_two_words():
     expected = 'camel_case'
     target = _convert_camel_to_snake('CamelCase')
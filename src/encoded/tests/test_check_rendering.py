@@ -0,0 +1,23 @@
+def test_batches_do_not_mix_collections():
+    from encoded.commands.check_rendering import batches
+    paths = [('', '/'), ('lab', '/labs/'), ('lab', '/labs/a/'), ('lab', '/labs/b/'), ('award', '/awards/')]
+    assert list(batches(paths, 2)) == [
+        [('', '/')],
+        [('lab', '/labs/'), ('lab', '/labs/a/')],
+        [('lab', '/labs/b/')],
+        [('award', '/awards/')],
+    ]
+
+
+def test_read_checkpoint(tmpdir):
+    from encoded.commands.check_rendering import read_checkpoint
+    checkpoint = tmpdir.join('rendered.txt')
+    assert read_checkpoint(str(checkpoint)) == set()
+    checkpoint.write('/labs/a/\n/labs/b/\n\n')
+    assert read_checkpoint(str(checkpoint)) == {'/labs/a/', '/labs/b/'}
+
+
+def test_check_path(htmltestapp, lab):
+    from encoded.commands.check_rendering import check_path, render_failure
+    assert check_path(htmltestapp, lab['@id'])
+    assert render_failure(htmltestapp, '/labs/no-such-lab/').startswith('Render failed (404')
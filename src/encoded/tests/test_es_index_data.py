@@ -0,0 +1,50 @@
+def test_read_checkpoint(tmpdir):
+    from encoded.commands.es_index_data import read_checkpoint
+    checkpoint = tmpdir.join('reindex.json')
+    assert read_checkpoint(str(checkpoint)) == (None, {})
+    checkpoint.write(
+        '{"xmin": 100}\n'
+        '{"item_type": "lab", "first": "c", "last": "d"}\n'
+        '{"item_type": "lab", "first": "a", "last": "b"}\n'
+        '\n'
+    )
+    assert read_checkpoint(str(checkpoint)) == (100, {'lab': [('a', 'b'), ('c', 'd')]})
+
+
+def test_remaining_uuids():
+    from encoded.commands.es_index_data import remaining_uuids
+    uuids = ['a', 'b', 'c', 'd', 'e', 'f']
+    assert remaining_uuids(uuids, []) == uuids
+    assert remaining_uuids(uuids, [('a', 'b'), ('d', 'e')]) == ['c', 'f']
+    assert remaining_uuids(['a', 'bb', 'c'], [('a', 'b')]) == ['bb', 'c']
+
+
+def test_batches_do_not_mix_types():
+    from encoded.commands.es_index_data import batches
+    assert list(batches({'award': ['a', 'b', 'c'], 'lab': ['d']}, 2)) == [
+        ('award', ['a', 'b']),
+        ('award', ['c']),
+        ('lab', ['d']),
+    ]
+
+
+def test_type_progress():
+    from encoded.commands.es_index_data import TypeProgress
+    now = [0.0]
+    progress = TypeProgress({'award': 100, 'lab': 10}, clock=lambda: now[0])
+    now[0] = 10.0
+    progress.update('award', 50, started=0.0)
+    assert progress.format('award') == 'award 50 of 100 (5.0 items/s, 10s left)'
+    assert progress.in_progress() == ['award']
+    progress.update('award', 50)
+    assert progress.in_progress() == []
+
+
+def test_run_passes_record(mocker):
+    from encoded.commands import es_index_data
+    testapp = mocker.patch.object(es_index_data, 'TestApp')
+    es_index_data.run(object(), ['experiment'], record=True)
+    path, body = testapp.return_value.post_json.call_args[0]
+    assert path == '/index'
+    assert body['record'] is True
+    assert body['types'] == ['experiment']
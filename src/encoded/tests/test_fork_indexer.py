@@ -0,0 +1,54 @@
+import os
+import pytest
+
+
+engine = None
+
+
+def checked_out_pid():
+    with engine.connect() as connection:
+        record = connection.connection._connection_record
+        return os.getpid(), record.info['pid']
+
+
+@pytest.fixture
+def sqlite_engine(tmpdir):
+    global engine
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import QueuePool
+    from encoded.fork_indexer import install_pid_guard
+    engine = create_engine(
+        'sqlite:///%s' % tmpdir.join('fork.db'), poolclass=QueuePool, pool_size=1)
+    install_pid_guard(engine)
+    yield engine
+    engine.dispose()
+    engine = None
+
+
+def test_pid_guard_drops_inherited_connection(sqlite_engine):
+    from multiprocessing import get_context
+    from multiprocessing.pool import Pool
+    parent_pid, record_pid = checked_out_pid()
+    assert record_pid == parent_pid
+    assert sqlite_engine.pool.checkedin() == 1
+    pool = Pool(processes=1, context=get_context('fork'))
+    try:
+        worker_pid, record_pid = pool.apply(checked_out_pid)
+    finally:
+        pool.terminate()
+        pool.join()
+    assert worker_pid != parent_pid
+    assert record_pid == worker_pid
+    # The connection of the parent is still usable in the parent.
+    assert checked_out_pid() == (parent_pid, parent_pid)
+
+
+def test_reset_urllib3_pool():
+    from urllib3 import HTTPConnectionPool
+    from encoded.fork_indexer import reset_urllib3_pool
+    pool = HTTPConnectionPool('localhost', maxsize=3)
+    inherited = pool.pool
+    reset_urllib3_pool(pool)
+    assert pool.pool is not inherited
+    assert pool.pool.qsize() == 3
+    assert all(pool.pool.get() is None for _ in range(3))
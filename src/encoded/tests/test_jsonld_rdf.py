@@ -0,0 +1,84 @@
+import gzip
+import io
+
+
+CONTEXT = {
+    'term': '/terms/',
+    'accession': {'@id': 'term:accession'},
+    'lab': {'@id': 'term:lab', '@type': '@id'},
+    'Lab': {'@id': 'term:Lab'},
+}
+
+ITEM = {
+    '@id': '/labs/a/',
+    '@type': ['Lab'],
+    'accession': 'X1',
+    'lab': '/labs/b/',
+}
+
+
+def test_item_converter_triples():
+    from encoded.commands.jsonld_rdf import ItemConverter
+    converter = ItemConverter(CONTEXT, 'https://www.encodeproject.org/')
+    assert sorted(converter.lines(ITEM)) == [
+        '<https://www.encodeproject.org/labs/a/> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> '
+        '<https://www.encodeproject.org/terms/Lab> .\n',
+        '<https://www.encodeproject.org/labs/a/> <https://www.encodeproject.org/terms/accession> "X1" .\n',
+        '<https://www.encodeproject.org/labs/a/> <https://www.encodeproject.org/terms/lab> '
+        '<https://www.encodeproject.org/labs/b/> .\n',
+    ]
+
+
+def test_item_converter_quads():
+    from encoded.commands.jsonld_rdf import ItemConverter
+    converter = ItemConverter(CONTEXT, 'https://www.encodeproject.org/', quads=True)
+    for line in converter.lines(ITEM):
+        assert line.endswith(' <https://www.encodeproject.org/labs/a/> .\n')
+
+
+def test_item_converter_ignores_item_context():
+    from encoded.commands.jsonld_rdf import ItemConverter
+    converter = ItemConverter(CONTEXT, 'https://www.encodeproject.org/')
+    assert sorted(converter.lines(dict(ITEM, **{'@context': '/terms/'}))) == sorted(converter.lines(ITEM))
+
+
+def test_batches():
+    from encoded.commands.jsonld_rdf import batches
+    assert list(batches(iter('abcde'), 2)) == [['a', 'b'], ['c', 'd'], ['e']]
+
+
+def test_open_output_gzip():
+    from encoded.commands.jsonld_rdf import open_output
+    output = io.BytesIO()
+    stream = open_output(output, compress=True)
+    stream.write(b'<a> <b> <c> .\n')
+    stream.close()
+    assert gzip.decompress(output.getvalue()) == b'<a> <b> <c> .\n'
+
+
+def test_item_paths(testapp, lab):
+    from encoded.commands.jsonld_rdf import item_paths
+    paths = list(item_paths(testapp.app, ['lab']))
+    assert '/%s/@@object' % lab['uuid'] in paths
+
+
+def test_item_paths_all_types(testapp, lab, award):
+    from encoded.commands.jsonld_rdf import item_paths
+    paths = list(item_paths(testapp.app))
+    assert '/%s/@@object' % lab['uuid'] in paths
+    assert '/%s/@@object' % award['uuid'] in paths
+
+
+def test_export_all_types(testapp, lab):
+    import argparse
+    from unittest import mock
+    from encoded.commands import jsonld_rdf
+    args = argparse.Namespace(
+        app_config=None, app_name=None, username='TEST', base=jsonld_rdf.DEFAULT_BASE,
+        format='nt', item_type=None, batchsize=10, processes=1, gzip=False,
+    )
+    output = io.BytesIO()
+    with mock.patch.object(jsonld_rdf, 'internal_app', return_value=testapp):
+        items = jsonld_rdf.export(args, output)
+    assert items > 0
+    assert ('<https://www.encodeproject.org/labs/%s/>' % lab['name']).encode('utf-8') in output.getvalue()
@@ -0,0 +1,245 @@
+import json
+import os
+import pytest
+
+
+def test_loadxl_get_dependencies():
+    from encoded.loadxl import get_dependencies
+    profiles = {
+        '@type': ['JSONSchemas'],
+        '_subtypes': {
+            'Award': ['Award'],
+            'Lab': ['Lab'],
+            'User': ['User'],
+            'Donor': ['HumanDonor', 'MouseDonor'],
+        },
+        'User': {'id': '/profiles/user.json', 'properties': {'lab': {'linkTo': 'Lab'}}},
+        'Award': {'id': '/profiles/award.json', 'properties': {}},
+        'Lab': {
+            'id': '/profiles/lab.json',
+            'properties': {'awards': {'type': 'array', 'items': {'linkTo': 'Award'}}},
+        },
+        'HumanDonor': {'id': '/profiles/human_donor.json', 'properties': {
+            'parents': {'items': {'linkTo': 'HumanDonor'}},
+            'lab': {'linkTo': 'Lab'},
+        }},
+        'MouseDonor': {'id': '/profiles/mouse_donor.json', 'properties': {}},
+        'Biosample': {'id': '/profiles/biosample.json', 'properties': {
+            'donor': {'linkTo': 'Donor'},
+            'submitted_by': {'linkTo': ['User']},
+        }},
+    }
+    dependencies = get_dependencies(profiles)
+    # Links to later item types are deferred to phase 2
+    assert dependencies['user'] == set()
+    assert dependencies['lab'] == {'award'}
+    assert dependencies['human_donor'] == {'lab'}
+    assert dependencies['biosample'] == {'human_donor', 'mouse_donor', 'user'}
+
+
+def test_loadxl_run_in_dependency_order():
+    from encoded.loadxl import run_in_dependency_order
+    dependencies = {
+        'award': set(),
+        'lab': {'award'},
+        'organism': set(),
+        'biosample': {'lab', 'organism'},
+    }
+    done = []
+    run_in_dependency_order(dependencies, done.append, workers=4)
+    assert sorted(done) == sorted(dependencies)
+    for item_type, linked in dependencies.items():
+        assert all(done.index(other) < done.index(item_type) for other in linked)
+
+
+def test_loadxl_make_bulk_request_keeps_row_order():
+    from encoded.loadxl import make_bulk_request
+
+    class FakeResponse:
+        def __init__(self, json):
+            self.json = json
+
+    class FakeTestApp:
+        def __init__(self):
+            self.batches = []
+
+        def post_json(self, url, value):
+            self.batches.append(value['batch'])
+            return FakeResponse({'results': [
+                {'status': '201 Created', 'location': row['url'] + '/1/'}
+                for row in value['batch']
+            ]})
+
+    testapp = FakeTestApp()
+    rows = [
+        {'_url': '/award', 'name': 'a'},
+        {'_url': '/award', 'name': 'b', '_skip': True},
+        {'_url': '/award', 'name': 'c'},
+    ]
+    component = make_bulk_request(testapp, 'award', 'POST', batchsize=2)
+    result = list(component(iter(rows)))
+    assert [row['name'] for row in result] == ['a', 'b', 'c']
+    assert [len(batch) for batch in testapp.batches] == [1, 1]
+    assert result[0]['_response'].status_int == 201
+    assert '_response' not in result[1]
+
+
+def test_batch_load(testapp):
+    batch = [
+        {'url': '/award', 'value': {
+            'name': 'BATCH1', 'rfa': 'ENCODE3', 'project': 'ENCODE', 'title': 'Batch award 1'}},
+        {'url': '/award', 'value': {'name': 'BATCH2', 'rfa': 'not a valid rfa'}},
+    ]
+    res = testapp.post_json('/batch_load', {'method': 'POST', 'batch': batch})
+    created, failed = res.json['results']
+    assert created['status'].startswith('201')
+    assert failed['status'].startswith('422')
+    testapp.get(created['location'], status=200)
+
+
+def test_batch_load_permission(anontestapp):
+    anontestapp.post_json('/batch_load', {'method': 'POST', 'batch': []}, status=403)
+
+
+
+def loaded_items(conn):
+    """ Count of items by type and links, as loaded in the current transaction
+
+    Items inserted without a uuid get a new one on each load, so links to them
+    are labelled with their item type.
+    """
+    from collections import Counter
+    from pkg_resources import resource_filename
+    from sqlalchemy import select
+    from snovault.storage import Link, Resource
+    item_types = dict(conn.execute(select([Resource.rid, Resource.item_type])).fetchall())
+    inserts = resource_filename('encoded', 'tests/data/inserts/')
+    uuids = {
+        row['uuid']
+        for filename in os.listdir(inserts) if filename.endswith('.json')
+        for row in json.load(open(os.path.join(inserts, filename)))
+        if 'uuid' in row
+    }
+
+    def label(rid):
+        return str(rid) if str(rid) in uuids else item_types[rid]
+
+    links = Counter(
+        (label(source), rel, label(target))
+        for source, rel, target in conn.execute(select([Link.source_rid, Link.rel, Link.target_rid])).fetchall()
+    )
+    return Counter(item_types.values()), links
+
+
+def test_load_all_parallel_matches_load_all(app, conn, zsa_savepoints, check_constraints):
+    import threading
+    import transaction
+    from pkg_resources import resource_filename
+    from webtest import TestApp
+    from encoded.loadxl import load_all, load_all_parallel
+    inserts = resource_filename('encoded', 'tests/data/inserts/')
+    docsdir = [resource_filename('encoded', 'tests/data/documents/')]
+    environ = {
+        'HTTP_ACCEPT': 'application/json',
+        'REMOTE_USER': 'TEST',
+    }
+    lock = threading.Lock()
+
+    def serialized_app(environ, start_response):
+        # The test database is a single connection shared by every thread,
+        # so requests are taken one at a time, each with its own savepoint.
+        with lock:
+            transaction.manager.registerSynch(zsa_savepoints)
+            transaction.manager.registerSynch(check_constraints)
+            return list(app(environ, start_response))
+
+    tx = conn.begin_nested()
+    try:
+        load_all(TestApp(app, environ), inserts, docsdir)
+        serial = loaded_items(conn)
+    finally:
+        tx.rollback()
+
+    tx = conn.begin_nested()
+    try:
+        load_all_parallel(
+            TestApp(serialized_app, environ), inserts, docsdir, workers=2, batchsize=10)
+        parallel = loaded_items(conn)
+    finally:
+        tx.rollback()
+
+    item_counts, links = serial
+    assert item_counts['experiment'] > 0
+    assert parallel[0] == item_counts
+    assert parallel[1] == links
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+@pytest.mark.parametrize('text', [
+    '[{"a": 1}, {"a": 2, "b": [1, 2]}]',
+    '[\n    {\n        "a": 1\n    },\n    {\n        "a": 2,\n        "b": [1, 2]\n    }\n]\n',
+    '{"a": 1}\n{"a": 2, "b": [1, 2]}\n',
+])
+def test_loadxl_read_json_streams_objects(text, chunk_size):
+    import io
+    from encoded.loadxl import read_json
+    rows = read_json(io.StringIO(text), chunk_size=chunk_size)
+    assert next(rows) == {'a': 1}
+    assert list(rows) == [{'a': 2, 'b': [1, 2]}]
+
+
+def test_loadxl_read_json_single_object():
+    import io
+    from encoded.loadxl import read_json
+    assert list(read_json(io.StringIO('{"a": "b"}'))) == [{'a': 'b'}]
+    assert list(read_json(io.StringIO('[]'))) == []
+
+
+def test_loadxl_read_json_truncated():
+    import io
+    from encoded.loadxl import read_json
+    with pytest.raises(ValueError):
+        list(read_json(io.StringIO('[{"a": 1}, {"a"'), chunk_size=4))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64 * 1024])
+@pytest.mark.parametrize('text', [
+    '[1 2]',
+    '[{"a": 1} {"b": 2}]',
+    '[{"a": 1},,{"b": 2}]',
+    '[{"a": 1},]',
+    '[{"a": 1}] {"b": 2}',
+    '[{"a": 1}',
+    '"a"',
+    '{"a": 1}\n2\n',
+    '{"a": [1}',
+])
+def test_loadxl_read_json_rejects_malformed(text, chunk_size):
+    import io
+    from encoded.loadxl import read_json
+    with pytest.raises(ValueError):
+        list(read_json(io.StringIO(text), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5])
+def test_loadxl_read_json_strings_across_chunks(chunk_size):
+    import io
+    from encoded.loadxl import read_json
+    text = '[{"a": "}\\"{[", "b\\\\": "x"}, {"c": "\\u00e9"}]'
+    assert list(read_json(io.StringIO(text), chunk_size=chunk_size)) == [
+        {'a': '}"{[', 'b\\': 'x'},
+        {'c': '\u00e9'},
+    ]
+
+
+def test_loadxl_read_json_large_object_is_linear():
+    import io
+    import json
+    import time
+    from encoded.loadxl import read_json
+    item = {'values': ['x' * 100] * 100000}
+    text = json.dumps([item, item])
+    start = time.time()
+    rows = list(read_json(io.StringIO(text), chunk_size=4096))
+    assert rows == [item, item]
+    assert time.time() - start < 5
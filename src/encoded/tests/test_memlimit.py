@@ -0,0 +1,91 @@
+from unittest import mock
+
+
+def make_app(body=b'ok'):
+    def app(environ, start_response):
+        environ['encoded.resource_usage'].update(route='report', embed_count=3, es_count=1)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [body]
+    return app
+
+
+def call(app, environ=None):
+    from webob import Request
+    result = app(Request.blank('/report/', environ=environ).environ, mock.Mock())
+    try:
+        return b''.join(result)
+    finally:
+        result.close()
+
+
+def test_resource_accounting_records_route():
+    from encoded.memlimit import ExecuteOnCompletion2, ResourceAccounting, ResourceUsage
+    usage = ResourceUsage(window=2)
+    accounting = ResourceAccounting(usage, tracemalloc_sample_rate=1.0)
+    app = ExecuteOnCompletion2(make_app(), accounting.finish, accounting.start)
+    for _ in range(3):
+        assert call(app) == b'ok'
+    routes = usage.routes()
+    assert usage.requests == 3
+    assert routes['report']['requests'] == 2
+    assert routes['report']['embed_count']['max'] == 3
+    assert routes['report']['es_count']['p50'] == 1
+    assert routes['report']['tracemalloc_peak']['samples'] == 2
+    assert sum(routes['report']['rss_delta']['histogram'].values()) == 2
+    assert accounting.in_flight == 0
+
+
+def test_resource_accounting_recycles_after_response():
+    from encoded.memlimit import ExecuteOnCompletion2, ResourceAccounting, ResourceUsage
+    accounting = ResourceAccounting(ResourceUsage(), rss_limit=1)
+    app = ExecuteOnCompletion2(make_app(), accounting.finish, accounting.start)
+    with mock.patch('os.kill') as kill:
+        body = call(app, {'mod_wsgi.version': (4, 7, 1)})
+    assert body == b'ok'
+    assert accounting.recycle_pending
+    import signal
+    kill.assert_called_once_with(mock.ANY, signal.SIGUSR1)
+
+
+def test_resource_accounting_recycles_with_requests_in_flight():
+    from encoded.memlimit import ResourceAccounting, ResourceUsage
+    accounting = ResourceAccounting(ResourceUsage(), rss_limit=1)
+    other, environ = {}, {'mod_wsgi.version': (4, 7, 1)}
+    accounting.start(other)
+    accounting.start(environ)
+    with mock.patch('os.kill') as kill:
+        accounting.finish(environ)
+        accounting.finish(other)
+    assert kill.call_count == 1
+    assert accounting.in_flight == 0
+
+
+def test_resource_accounting_traces_a_single_request():
+    import tracemalloc
+    from encoded.memlimit import ENVIRON_KEY, ResourceAccounting, ResourceUsage
+    accounting = ResourceAccounting(ResourceUsage(), tracemalloc_sample_rate=1.0)
+    first, second = {}, {}
+    accounting.start(first)
+    accounting.start(second)
+    assert first[ENVIRON_KEY]['tracing']
+    assert not second[ENVIRON_KEY]['tracing']
+    accounting.finish(second)
+    assert tracemalloc.is_tracing()
+    accounting.finish(first)
+    assert not tracemalloc.is_tracing()
+    # The second request ran during the trace, so the peak is not kept.
+    samples = accounting.usage.routes()['unmatched']['tracemalloc_peak']['samples']
+    assert samples == 0
+
+
+def test_rss_histogram():
+    from encoded.memlimit import MB, rss_histogram
+    histogram = rss_histogram([-MB, 0, MB // 2, 2 * MB, 1024 * MB])
+    assert list(histogram.values()) == [2, 1, 1, 0, 0, 0, 1]
+
+
+def test_resource_usage_view(testapp):
+    res = testapp.get('/_resource_usage')
+    assert 'routes' in res.json
+    assert res.json['pid']
+
@@ -0,0 +1,65 @@
+import pytest
+
+
+def naive_closure(terms, term_id, edges):
+    closure = {term_id}
+    pending = [term_id]
+    while pending:
+        for parent in terms.get(pending.pop(), {}).get(edges, []):
+            if parent not in closure:
+                closure.add(parent)
+                pending.append(parent)
+    return closure
+
+
+@pytest.fixture
+def cyclic_terms():
+    return {
+        'T:1': {'data': []},
+        'T:2': {'data': ['T:1']},
+        'T:3': {'data': ['T:2', 'T:5']},
+        'T:4': {'data': ['T:3']},
+        'T:5': {'data': ['T:4']},
+        'T:6': {'data': ['T:5', 'X:missing']},
+    }
+
+
+def test_closure_engine_matches_naive_closure(cyclic_terms):
+    from encoded.commands.ontology_closure import ClosureEngine
+    engine = ClosureEngine(cyclic_terms, 'data')
+    for term_id in cyclic_terms:
+        assert engine.closure(term_id) == naive_closure(cyclic_terms, term_id, 'data')
+    assert engine.closure('T:4') == {'T:1', 'T:2', 'T:3', 'T:4', 'T:5'}
+
+
+def test_closure_engine_synthetic_dag():
+    from encoded.commands.ontology_closure import (
+        ClosureEngine,
+        synthetic_terms,
+    )
+    terms = synthetic_terms(2000, seed=1)
+    engine = ClosureEngine(terms, 'data')
+    assert len(engine.components) == len(terms)
+    for term_id in ['SYN:0000000', 'SYN:0000999', 'SYN:0001999']:
+        assert engine.closure(term_id) == naive_closure(terms, term_id, 'data')
+
+
+def test_slims_by_term(cyclic_terms):
+    from encoded.commands.ontology_closure import (
+        ClosureEngine,
+        slims_by_term,
+    )
+    for term in cyclic_terms.values():
+        term['data_with_develops_from'] = []
+    cyclic_terms['T:1']['data_with_develops_from'] = ['T:6']
+    engines = {
+        'closure': ClosureEngine(cyclic_terms, 'data'),
+        'closure_with_develops_from': ClosureEngine(cyclic_terms, 'data_with_develops_from'),
+    }
+    slims = slims_by_term(engines, [
+        ('organ', 'closure', {'T:5': 'five', 'T:1': 'one', 'T:6': 'six'}),
+        ('developmental', 'closure_with_develops_from', {'T:6': 'six'}),
+    ])
+    assert slims['T:1'] == {'organ': ['one'], 'developmental': ['six']}
+    assert slims['T:3'] == {'organ': ['five', 'one'], 'developmental': []}
+    assert slims['T:6'] == {'organ': ['five', 'one', 'six'], 'developmental': ['six']}
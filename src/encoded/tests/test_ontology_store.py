@@ -0,0 +1,53 @@
+import pytest
+
+
+@pytest.fixture
+def ontology_store(ontology, tmp_path):
+    from encoded.ontology_store import build_store, OntologyStore
+    ontology = dict(ontology)
+    ontology['EFO:0002067'] = {
+        'name': 'K562',
+        'synonyms': [],
+        'slims': {'organ': ['blood']},
+        'preferred_name': 'K562 cell',
+        'ünïcode': 'µ',
+    }
+    path = tmp_path / 'ontology.store'
+    build_store(ontology, str(path))
+    return ontology, OntologyStore(str(path))
+
+
+def test_ontology_store_matches_dict(ontology_store):
+    ontology, store = ontology_store
+    assert len(store) == len(ontology)
+    assert sorted(store) == sorted(ontology)
+    for term_id, term in ontology.items():
+        assert term_id in store
+        assert store[term_id] == term
+    assert store['EFO:0002067']['slims'] == {'organ': ['blood']}
+    assert store.get('UBERON:1231231', {}).get('name') == 'liver'
+
+
+def test_ontology_store_missing_terms(ontology_store):
+    ontology, store = ontology_store
+    assert 'UBERON:0000000' not in store
+    assert None not in store
+    assert store.get('UBERON:0000000') is None
+    with pytest.raises(KeyError):
+        store['ZZZ:9999999']
+
+
+def test_ontology_store_load_ontology_prefers_fresh_store(ontology, tmp_path):
+    import json
+    import os
+    from encoded.ontology_store import build_store, load_ontology, OntologyStore
+    json_path = tmp_path / 'ontology.json'
+    assert load_ontology(json_path) == {}
+    json_path.write_text(json.dumps(ontology))
+    assert load_ontology(json_path) == ontology
+    build_store(ontology, str(tmp_path / 'ontology.store'))
+    assert isinstance(load_ontology(json_path), OntologyStore)
+    # A newer ontology.json wins over a stale store
+    stat = json_path.stat()
+    os.utime(str(json_path), (stat.st_atime, stat.st_mtime + 60))
+    assert isinstance(load_ontology(json_path), dict)
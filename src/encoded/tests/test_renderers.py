@@ -38,3 +38,55 @@ def test_too_many_results_to_render_1000():
 
 def test_too_many_results_to_render_1001():
     assert too_many_results_to_render('1001')
+
+def test_render_cache_evicts_least_recently_used():
+    from encoded.renderers import RenderCache
+    cache = RenderCache(max_bytes=10)
+    cache.set('a', ('200 OK', [], b'aaaa'))
+    cache.set('b', ('200 OK', [], b'bbbb'))
+    assert cache.get('a') is not None
+    cache.set('c', ('200 OK', [], b'cccc'))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.size == 8
+    cache.set('d', ('200 OK', [], b'd' * 11))
+    assert cache.get('d') is None
+
+def test_cached_render_keeps_request_headers():
+    from pyramid.response import Response
+    from encoded.renderers import cached_render, render_cache_entry
+    first_in = Response(body=b'{}', content_type='application/json')
+    first_in.headers['Set-Cookie'] = 'session=first'
+    first_out = Response(body=b'<html/>', content_type='text/html')
+    first_out.headers['Set-Cookie'] = 'session=first'
+    entry = render_cache_entry(first_in, first_out)
+    second_in = Response(body=b'{}', content_type='application/json')
+    second_in.headers['Set-Cookie'] = 'session=second'
+    response = cached_render(second_in, entry, Response)
+    assert response.body == b'<html/>'
+    assert response.content_type == 'text/html'
+    assert response.headers.getall('Set-Cookie') == ['session=second']
+
+def test_render_cache_key_varies():
+    from pyramid.response import Response
+    from encoded.renderers import render_cache_key
+    request = mock.Mock()
+    request.registry.settings = {'snovault.app_version': 'v1'}
+    request.headers = {'Accept': 'text/html'}
+    response = Response(body=b'{"@id": "/"}', content_type='application/json')
+    response.headers['X-Request-URL'] = 'http://localhost/'
+    response.vary = ('Accept',)
+    key = render_cache_key(request, response)
+    assert render_cache_key(request, response) == key
+    request.headers = {'Accept': '*/*'}
+    assert render_cache_key(request, response) != key
+    request.headers = {'Accept': 'text/html'}
+    response.body = b'{"@id": "/other/"}'
+    assert render_cache_key(request, response) != key
+
+def test_render_cache_hit(anonhtmltestapp):
+    anonhtmltestapp.get('/', status=200)
+    res = anonhtmltestapp.get('/', status=200)
+    assert res.body.startswith(b'<!DOCTYPE html>')
+    assert 'render_cache_hits=1' in res.headers['X-Stats']
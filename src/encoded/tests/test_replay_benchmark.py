@@ -0,0 +1,33 @@
+def test_read_access_log():
+    from encoded.commands.replay_benchmark import read_access_log
+    lines = [
+        '1.2.3.4 - - [08/Jun/2016:21:30:00 +0000] "GET /search/?type=Experiment HTTP/1.1" 200 512 "-" "curl"',
+        '1.2.3.4 - - [08/Jun/2016:21:30:01 +0000] "POST /batch_download/ HTTP/1.1" 200 512 "-" "curl"',
+        '1.2.3.4 - - [08/Jun/2016:21:30:02 +0000] "GET /static/img/logo.png HTTP/1.1" 200 512 "-" "curl"',
+        '1.2.3.4 - - [08/Jun/2016:21:30:03 +0000] "HEAD /report/?type=File HTTP/1.1" 200 0 "-" "curl"',
+        'garbage',
+    ]
+    assert read_access_log(lines) == ['/search/?type=Experiment', '/report/?type=File']
+    assert read_access_log(lines, max_requests=1) == ['/search/?type=Experiment']
+
+
+def test_summarize_and_compare():
+    from encoded.commands.replay_benchmark import compare, summarize
+    baseline = summarize({'search': [0.1] * 10, 'report': [0.2] * 10}, {}, 3.0)
+    assert baseline['search']['p50'] == 100.0
+    assert baseline['search']['throughput'] == round(10 / 3.0, 2)
+    summary = summarize({'search': [0.1] * 99 + [1.0], 'report': [0.3] * 10}, {'search': 1}, 3.0)
+    assert summary['search']['p90'] == 100.0
+    assert summary['search']['max'] == 1000.0
+    assert compare(summary, baseline) == [
+        ('report', 'p50', 200.0, 300.0),
+        ('report', 'p90', 200.0, 300.0),
+        ('search', 'errors', 0, 1),
+    ]
+
+
+def test_route_name(testapp):
+    from encoded.commands.replay_benchmark import route_name
+    assert route_name(testapp.app, '/search/?type=Experiment') == 'search'
+    assert route_name(testapp.app, '/region-search/?region=chr1') == 'region-search'
+    assert route_name(object(), '/experiments/ENCSR000AAA/') == 'traverse:experiments'
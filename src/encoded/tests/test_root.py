@@ -0,0 +1,88 @@
+def test_name_namespaces():
+    from encoded.root import name_namespaces
+    assert name_namespaces('ENCSR000AAA') == ['page:location', 'accession', 'external_accession']
+    assert name_namespaces('encode:lab-alias') == ['page:location', 'alias', 'external_accession']
+    assert name_namespaces('help') == ['page:location', 'external_accession']
+
+
+def test_root_get_uuid_by_name_picks_namespace_by_priority():
+    from types import SimpleNamespace
+    from snovault import DBSESSION
+    from encoded.root import EncodedRoot
+    queries = []
+
+    class Query:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def filter(self, *criteria):
+            return self
+
+        def all(self):
+            return self.rows
+
+    def session():
+        return SimpleNamespace(query=lambda *columns: queries.append(columns) or Query(rows))
+
+    root = SimpleNamespace(registry={DBSESSION: session})
+    rows = [('external_accession', 'other'), ('accession', 'experiment')]
+    assert EncodedRoot.get_uuid_by_name(root, 'ENCSR000AAA') == 'experiment'
+    assert len(queries) == 1
+    rows = []
+    assert EncodedRoot.get_uuid_by_name(root, 'help') is None
+
+
+def test_name_cache_discard_item():
+    from encoded.root import NameCache
+    cache = NameCache()
+    cache.set('ENCSR000AAA', 'uuid-1')
+    cache.set('encode:old-alias', 'uuid-1')
+    cache.set('encode:new-alias', None)
+    cache.set('ENCSR000BBB', 'uuid-2')
+    cache.discard_item('uuid-1', ['ENCSR000AAA', 'encode:new-alias'])
+    assert cache.get('ENCSR000AAA') == (False, None)
+    assert cache.get('encode:old-alias') == (False, None)
+    assert cache.get('encode:new-alias') == (False, None)
+    assert cache.get('ENCSR000BBB') == (True, 'uuid-2')
+    assert 'uuid-1' not in cache.names_by_uuid
+
+
+def test_name_cache_expires_misses_first():
+    from unittest import mock
+    from encoded.root import NameCache
+    cache = NameCache(capacity=2, ttl=60, negative_ttl=5)
+    with mock.patch('encoded.root.time.time', return_value=1000):
+        cache.set('found', 'uuid')
+        cache.set('missing', None)
+        assert cache.get('found') == (True, 'uuid')
+        assert cache.get('missing') == (True, None)
+    with mock.patch('encoded.root.time.time', return_value=1010):
+        assert cache.get('found') == (True, 'uuid')
+        assert cache.get('missing') == (False, None)
+    with mock.patch('encoded.root.time.time', return_value=1100):
+        assert cache.get('found') == (False, None)
+
+
+def test_name_cache_capacity():
+    from encoded.root import NameCache
+    cache = NameCache(capacity=2)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, '1')
+
+
+def test_root_get_by_alias_after_miss(testapp):
+    alias = 'encode:root-name-cache-test'
+    testapp.get('/' + alias + '/', status=404)
+    item = {
+        'name': 'root-name-cache-test',
+        'title': 'Root name cache test',
+        'aliases': [alias],
+    }
+    source = testapp.post_json('/source', item, status=201).json['@graph'][0]
+    # Creating the item clears the cached miss
+    res = testapp.get('/' + alias + '/', status=301)
+    assert res.location.endswith(source['@id'])
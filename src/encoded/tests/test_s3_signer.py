@@ -0,0 +1,42 @@
+from moto import mock_s3
+
+
+@mock_s3
+def test_s3_signer_reuses_client_and_urls():
+    from encoded.s3_signer import S3Signer
+    signer = S3Signer()
+    assert signer.client() is signer.client()
+    assert signer.client(unsigned=True) is not signer.client()
+    url = signer.download_url('bucket', 'a/b.bam', 'ENCFF000AAA.bam')
+    assert 'Expires=' in url or 'X-Amz-Expires=' in url
+    assert 'ENCFF000AAA.bam' in url
+    assert signer.download_url('bucket', 'a/b.bam', 'ENCFF000AAA.bam') == url
+    assert signer.download_url('bucket', 'a/b.bam', 'other.bam') != url
+
+
+@mock_s3
+def test_s3_signer_unsigned_url():
+    from encoded.s3_signer import S3Signer
+    url = S3Signer().unsigned_url('bucket', 'a/b.bam')
+    assert url.startswith('https://bucket.s3.amazonaws.com/a/b.bam')
+    assert 'Signature' not in url
+
+
+def test_url_cache_ttl_is_bounded_by_expiry():
+    from encoded.s3_signer import S3Signer
+    signer = S3Signer(expires_in=600, url_cache_ttl=3600)
+    assert signer.download_urls.ttl == 300
+
+
+def test_url_cache_expires_and_evicts(mocker):
+    from encoded.s3_signer import URLCache
+    time = mocker.patch('encoded.s3_signer.time.time', return_value=1000.0)
+    cache = URLCache(2, ttl=10)
+    cache.set('a', 'url-a')
+    cache.set('b', 'url-b')
+    assert cache.get('a') == 'url-a'
+    cache.set('c', 'url-c')
+    assert cache.get('b') is None
+    time.return_value = 1010.0
+    assert cache.get('a') is None
+    assert len(cache.entries) == 1
@@ -0,0 +1,63 @@
+import threading
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_sampling_profiler_collapsed_stacks():
+    from encoded.sampling_profiler import SamplingProfiler
+    profiler = SamplingProfiler()
+    profiler.start(duration=10, interval=0.001, pattern='^/search/')
+    stop = threading.Event()
+    entered = threading.Event()
+
+    def serve(path):
+        if profiler.enter(path):
+            entered.set()
+        try:
+            busy_loop(stop)
+        finally:
+            profiler.leave()
+
+    threads = [
+        threading.Thread(target=serve, args=(path,))
+        for path in ('/search/', '/report/')
+    ]
+    for thread in threads:
+        thread.start()
+    entered.wait(5)
+    while profiler.samples < 20:
+        stop.wait(0.01)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    profiler.stop()
+    assert not profiler.running
+    assert profiler.status()['requests'] == 1
+    lines = profiler.collapsed().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert int(count) > 0
+        assert 'busy_loop' in stack.split(';')[-1] or 'serve' in stack
+
+
+def test_sampling_profiler_limits_stacks():
+    from encoded.sampling_profiler import TRUNCATED, SamplingProfiler
+    profiler = SamplingProfiler(max_stacks=1)
+    profiler.stacks['other'] = 1
+    profiler._threads[threading.get_ident()] = '/'
+    profiler.sample()
+    assert profiler.stacks == {'other': 1, TRUNCATED: 1}
+
+
+def test_profiler_view(testapp):
+    res = testapp.post_json('/_profiler', {'action': 'start', 'duration': 5})
+    assert res.json['running']
+    testapp.post_json('/_profiler', {'action': 'start'}, status=400)
+    res = testapp.post_json('/_profiler', {'action': 'stop'})
+    assert not res.json['running']
+    res = testapp.get('/_profiler?format=collapsed')
+    assert res.content_type == 'text/plain'
@@ -1234,3 +1234,17 @@ def test_search_views_homepage_search_view(index_workbook, testapp):
     assert r.status_code == 200
     assert 'debug' not in r.json
     assert 'columns' not in r.json
+
+
+def test_search_views_es_queries_capture(index_workbook, testapp):
+    res = testapp.post_json('/_es_queries', {'action': 'start', 'duration': 5})
+    assert res.json['running']
+    testapp.get('/search/?type=Experiment')
+    res = testapp.get('/_es_queries')
+    assert res.json['searches'] > 0
+    shape_id = res.json['shapes'][0]['shape_id']
+    res = testapp.post_json('/_es_queries', {'action': 'profile', 'shape_id': shape_id})
+    assert res.json['shards']
+    testapp.post_json('/_es_queries', {'action': 'profile', 'shape_id': 'unknown'}, status=400)
+    res = testapp.post_json('/_es_queries', {'action': 'stop'})
+    assert not res.json['running']
@@ -0,0 +1,213 @@
+import pytest
+import threading
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_searches_local_cache_normalize_params():
+    from encoded.searches.local_cache import normalize_params
+    assert normalize_params(
+        [('searchTerm', '  Heart   Left\tVentricle '), ('format', 'json')]
+    ) == (('searchTerm', 'heart left ventricle'),)
+    assert normalize_params(
+        [('q', 'CTCF'), ('genome', 'GRCh38')]
+    ) == normalize_params(
+        [('genome', 'GRCh38'), ('q', 'ctcf ')]
+    )
+    assert normalize_params([('type', 'Experiment')]) != normalize_params([('type', 'experiment')])
+
+
+def test_searches_local_cache_key_folds_query():
+    from pyramid.request import Request
+    from types import SimpleNamespace
+    from encoded.searches.local_cache import make_local_key
+
+    def key(query_string, principals=('system.Everyone',)):
+        request = Request.blank('/homepage-search/?' + query_string)
+        request = SimpleNamespace(params=request.params, effective_principals=list(principals))
+        return make_local_key('homepage-search', request)
+
+    assert key('searchTerm=ctcf') == key('searchTerm=CTCF')
+    assert key('searchTerm=ctcf') == key('searchTerm=ctcf&format=json')
+    assert key('searchTerm=ctcf') != key('searchTerm=ctcf', ('system.Everyone', 'group.admin'))
+
+
+def test_searches_local_cache_rewrites_id():
+    from types import SimpleNamespace
+    from encoded.searches.local_cache import with_request_id
+    request = SimpleNamespace(query_string='searchTerm=CTCF&format=json')
+    result = with_request_id({'@id': '/search/?searchTerm=ctcf'}, request)
+    assert result['@id'] == '/search/?searchTerm=CTCF&format=json'
+    assert with_request_id({'@id': '/suggest/'}, SimpleNamespace(query_string='')) == {'@id': '/suggest/'}
+    assert with_request_id(['raw'], request) == ['raw']
+
+
+def test_searches_local_cache_returns_copies():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(ttl=10, clock=Clock())
+    value, _ = cache.get_or_compute('suggest', 'a', lambda: {'@graph': []})
+    value['@graph'].append('changed')
+    value, state = cache.get_or_compute('suggest', 'a', lambda: None)
+    assert (value, state) == ({'@graph': []}, 'hit')
+    value['@graph'].append('changed')
+    assert cache.get_or_compute('suggest', 'a', lambda: None) == ({'@graph': []}, 'hit')
+
+
+def test_searches_local_cache_hit_and_miss():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(ttl=10, stale_ttl=0, clock=Clock())
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'@graph': []}
+
+    assert cache.get_or_compute('suggest', 'a', compute) == ({'@graph': []}, 'miss')
+    assert cache.get_or_compute('suggest', 'a', compute) == ({'@graph': []}, 'hit')
+    assert len(calls) == 1
+    assert cache.status()['metrics']['suggest']['hit'] == 1
+    assert cache.status()['metrics']['suggest']['miss'] == 1
+
+
+def test_searches_local_cache_expires():
+    from encoded.searches.local_cache import LocalSearchCache
+    clock = Clock()
+    cache = LocalSearchCache(ttl=10, stale_ttl=5, clock=clock)
+    cache.get_or_compute('suggest', 'a', lambda: 1)
+    clock.now = 16
+    assert cache.get_or_compute('suggest', 'a', lambda: 2) == (2, 'miss')
+
+
+def test_searches_local_cache_capacity():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(capacity=2, clock=Clock())
+    for key in 'abc':
+        cache.get_or_compute('suggest', key, lambda: key)
+    assert list(cache.entries) == ['b', 'c']
+
+
+def test_searches_local_cache_single_flight():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(clock=Clock())
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'value'
+
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('homepage-search', 'a', compute)))
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute('homepage-search', 'a', compute)))
+        for _ in range(3)
+    ]
+    for follower in followers:
+        follower.start()
+    while cache.status()['metrics']['homepage-search']['coalesced'] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [('value', 'coalesced')] * 3 + [('value', 'miss')]
+
+
+def test_searches_local_cache_error_is_not_cached():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(clock=Clock())
+
+    def compute():
+        raise ValueError('es unavailable')
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('suggest', 'a', compute)
+    assert cache.status()['metrics']['suggest']['error'] == 1
+    assert cache.get_or_compute('suggest', 'a', lambda: 1) == (1, 'miss')
+
+
+def test_searches_local_cache_stale_while_revalidate():
+    from encoded.searches.local_cache import LocalSearchCache
+    clock = Clock()
+    cache = LocalSearchCache(ttl=10, stale_ttl=60, clock=clock)
+    cache.get_or_compute('top-hits-raw', 'a', lambda: 'old')
+    clock.now = 20
+    release = threading.Event()
+
+    def refresh():
+        release.wait()
+        return 'new'
+
+    assert cache.get_or_compute('top-hits-raw', 'a', lambda: 'unused', refresh=refresh) == ('old', 'stale')
+    assert cache.get_or_compute('top-hits-raw', 'a', lambda: 'unused', refresh=refresh) == ('old', 'stale')
+    assert cache.status()['metrics']['top-hits-raw']['refresh'] == 1
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == 'local-search-cache-refresh':
+            thread.join()
+    assert cache.get_or_compute('top-hits-raw', 'a', lambda: 'unused') == ('new', 'hit')
+
+
+def test_searches_local_cache_waiters_get_leader_error():
+    from encoded.searches.local_cache import LocalSearchCache
+    cache = LocalSearchCache(clock=Clock())
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    errors = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        raise ValueError('es unavailable')
+
+    def get():
+        try:
+            cache.get_or_compute('suggest', 'a', compute)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=get)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=get) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while cache.status()['metrics']['suggest']['coalesced'] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1
+    assert len(errors) == 4
+
+
+def test_searches_local_cache_refresh_request_bypasses_cache():
+    from pyramid.request import Request
+    from encoded.searches.interfaces import LOCAL_SEARCH_CACHE
+    from encoded.searches.local_cache import LocalSearchCache, REFRESH_ENVIRON_KEY, local_search_cache
+    cache = LocalSearchCache(clock=Clock())
+
+    @local_search_cache('suggest')
+    def view(context, request):
+        return {'@id': '/suggest/?q=ctcf', '@graph': ['new']}
+
+    refreshed = {}
+    request = Request.blank('/suggest/?q=CTCF', environ={REFRESH_ENVIRON_KEY: refreshed})
+    request.registry = {LOCAL_SEARCH_CACHE: cache}
+    assert view(None, request) == {'@id': '/suggest/?q=CTCF', '@graph': ['new']}
+    assert refreshed['value'] == {'@id': '/suggest/?q=ctcf', '@graph': ['new']}
+    assert cache.entries == {}
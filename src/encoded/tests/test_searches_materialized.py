@@ -0,0 +1,163 @@
+import pytest
+
+
+class FakeES:
+
+    def __init__(self, xmin=None):
+        self.xmin = xmin
+        self.reads = 0
+
+    def get(self, **kwargs):
+        self.reads += 1
+        if self.xmin is None:
+            return {'found': False}
+        return {'found': True, '_source': {'xmin': self.xmin}}
+
+
+class FakeRegistry(dict):
+
+    def __init__(self, es):
+        from snovault.elasticsearch.interfaces import ELASTIC_SEARCH
+        super().__init__({ELASTIC_SEARCH: es})
+        self.settings = {'snovault.elasticsearch.index': 'snovault'}
+
+
+class FakeRoute:
+
+    def __init__(self, name):
+        self.name = name
+
+
+def test_searches_materialized_normalize_query():
+    from encoded.searches.materialized import normalize_query
+    assert normalize_query(
+        'type=Experiment&status=released&format=json'
+    ) == normalize_query(
+        'status=released&type=Experiment'
+    )
+    assert normalize_query('type=Experiment&status=released') != normalize_query('type=Experiment')
+    assert normalize_query('control_type!=*') == (('control_type!', '*'),)
+
+
+def test_searches_materialized_default_matrix_keys_cover_routes():
+    from encoded.searches.defaults import DEFAULT_MATRIX_QUERIES
+    from encoded.searches.materialized import DEFAULT_MATRIX_KEYS
+    assert set(DEFAULT_MATRIX_KEYS) == set(DEFAULT_MATRIX_QUERIES)
+    assert all(DEFAULT_MATRIX_KEYS.values())
+
+
+def test_searches_materialized_indexed_xmin_is_cached():
+    from encoded.searches.materialized import IndexedXmin
+    es = FakeES(xmin=10)
+    registry = FakeRegistry(es)
+    indexed_xmin = IndexedXmin(ttl=60)
+    assert indexed_xmin.get(registry) == 10
+    es.xmin = 11
+    assert indexed_xmin.get(registry) == 10
+    assert es.reads == 1
+    assert indexed_xmin.get(registry, refresh=True) == 11
+    assert es.reads == 2
+
+
+def test_searches_materialized_indexed_xmin_missing():
+    from encoded.searches.materialized import IndexedXmin
+    registry = FakeRegistry(FakeES())
+    assert IndexedXmin(ttl=0).get(registry) is None
+
+
+@pytest.mark.parametrize(
+    'route,query_string,expected', [
+        ('matrix', 'type=Experiment&control_type!=*&status=released&perturbed=false', True),
+        ('matrix', 'perturbed=false&status=released&control_type!=*&type=Experiment&format=json', True),
+        ('matrix', 'type=Experiment&control_type!=*&status=released', False),
+        ('entex-matrix', 'type=Experiment&status=released&internal_tags=ENTEx', True),
+        ('search', 'type=Experiment&status=released&internal_tags=ENTEx', False),
+    ]
+)
+def test_searches_materialized_is_default_matrix_request(dummy_request, route, query_string, expected):
+    from encoded.searches.interfaces import INDEXED_XMIN
+    from encoded.searches.materialized import IndexedXmin
+    from encoded.searches.materialized import is_default_matrix_request
+    dummy_request.registry[INDEXED_XMIN] = IndexedXmin()
+    dummy_request.registry[INDEXED_XMIN].get = lambda registry, refresh=False: 123
+    dummy_request.matched_route = FakeRoute(route)
+    dummy_request.environ['QUERY_STRING'] = query_string
+    assert is_default_matrix_request({}, dummy_request) is expected
+
+
+def test_searches_materialized_key_changes_with_xmin(dummy_request):
+    from encoded.searches.interfaces import INDEXED_XMIN
+    from encoded.searches.materialized import IndexedXmin
+    from encoded.searches.materialized import make_materialized_matrix_key
+    dummy_request.registry[INDEXED_XMIN] = IndexedXmin()
+    dummy_request.matched_route = FakeRoute('entex-matrix')
+    dummy_request.environ['QUERY_STRING'] = 'type=Experiment&status=released&internal_tags=ENTEx'
+    dummy_request.registry[INDEXED_XMIN].get = lambda registry, refresh=False: 123
+    first = make_materialized_matrix_key({}, dummy_request)
+    dummy_request.registry[INDEXED_XMIN].get = lambda registry, refresh=False: 124
+    second = make_materialized_matrix_key({}, dummy_request)
+    assert first.startswith('materialized-matrix.entex-matrix.123.')
+    assert second.startswith('materialized-matrix.entex-matrix.124.')
+    assert first.split('.', 3)[3] == second.split('.', 3)[3]
+    assert first.endswith('.type=Experiment&status=released&internal_tags=ENTEx')
+
+
+def test_searches_materialized_key_keeps_format_and_userid(dummy_request):
+    from encoded.searches.interfaces import INDEXED_XMIN
+    from encoded.searches.materialized import IndexedXmin
+    from encoded.searches.materialized import make_materialized_matrix_key
+
+    class PrincipalsRequest:
+        registry = dummy_request.registry
+        matched_route = FakeRoute('matrix')
+
+        def __init__(self, query_string, principals):
+            self.query_string = query_string
+            self.effective_principals = principals
+
+    dummy_request.registry[INDEXED_XMIN] = IndexedXmin()
+    dummy_request.registry[INDEXED_XMIN].get = lambda registry, refresh=False: 123
+    query_string = 'type=Experiment&control_type!=*&status=released&perturbed=false'
+    group = ['system.Everyone', 'system.Authenticated', 'group.submitter']
+    first = make_materialized_matrix_key({}, PrincipalsRequest(query_string, group + ['userid.1']))
+    second = make_materialized_matrix_key({}, PrincipalsRequest(query_string, group + ['userid.2']))
+    assert first != second
+    assert first != make_materialized_matrix_key({}, PrincipalsRequest(query_string, ['system.Everyone']))
+    assert first != make_materialized_matrix_key({}, PrincipalsRequest(query_string + '&format=json', group))
+
+
+class FakeResponse:
+
+    def __init__(self, status_int):
+        self.status_int = status_int
+        self.status = str(status_int)
+
+
+def test_searches_materialized_materializer_runs_in_background():
+    from pyramid.config import Configurator
+    from encoded.searches.defaults import DEFAULT_MATRIX_QUERIES
+    from encoded.searches.materialized import MatrixMaterializer
+    config = Configurator()
+    for route_name in DEFAULT_MATRIX_QUERIES:
+        config.add_route(route_name, '/{}{{slash:/?}}'.format(route_name))
+    config.commit()
+    import threading
+    release = threading.Event()
+    invoked = []
+
+    def invoke(registry, path):
+        release.wait()
+        invoked.append(path)
+        return FakeResponse(500 if path.startswith('/matrix/') else 200)
+
+    materializer = MatrixMaterializer(invoke=invoke)
+    assert materializer.start(config.registry, 123)
+    assert not materializer.start(config.registry, 124)
+    release.set()
+    materializer._thread.join()
+    status = materializer.status()
+    assert not status['running']
+    assert status['xmin'] == 123
+    assert '/entex-matrix/?type=Experiment&status=released&internal_tags=ENTEx' in status['materialized']
+    assert not any(path.startswith('/matrix/') for path in status['materialized'])
+    assert len(invoked) == sum(len(queries) for queries in DEFAULT_MATRIX_QUERIES.values())
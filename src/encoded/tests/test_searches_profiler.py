@@ -0,0 +1,189 @@
+import json
+import pytest
+
+
+QUERY = {
+    'query': {
+        'bool': {
+            'filter': [
+                {'terms': {'embedded.status': ['released', 'archived']}},
+                {'query_string': {'query': 'ctcf', 'fields': ['_all']}},
+            ]
+        }
+    },
+    'aggs': {
+        'assay_title': {
+            'terms': {'field': 'embedded.assay_title', 'size': 200},
+            'aggs': {'replicates': {'cardinality': {'field': 'embedded.replicates.uuid'}}},
+        },
+        'status': {'terms': {'field': 'embedded.status'}},
+    },
+    'size': 25,
+    '_source': ['embedded.accession'],
+}
+
+
+def make_response(took, total=10):
+    return {'took': took, 'hits': {'total': total, 'hits': []}}
+
+
+def test_searches_profiler_strip_values():
+    from encoded.searches.profiler import strip_values
+    assert strip_values(QUERY) == {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'terms': {'embedded.status': ['?']}},
+                    {'query_string': {'query': '?', 'fields': ['_all']}},
+                ]
+            }
+        },
+        'aggs': {
+            'assay_title': {
+                'terms': {'field': 'embedded.assay_title', 'size': '?'},
+                'aggs': {'replicates': {'cardinality': {'field': 'embedded.replicates.uuid'}}},
+            },
+            'status': {'terms': {'field': 'embedded.status'}},
+        },
+        'size': '?',
+        '_source': ['embedded.accession'],
+    }
+
+
+def test_searches_profiler_same_shape_for_other_values():
+    from encoded.searches.profiler import make_shape_id, strip_values
+    other = json.loads(json.dumps(QUERY))
+    other['query']['bool']['filter'][0]['terms']['embedded.status'] = ['released']
+    other['size'] = 100
+    assert make_shape_id(strip_values(other)) == make_shape_id(strip_values(QUERY))
+    other['aggs']['lab'] = {'terms': {'field': 'embedded.lab.title'}}
+    assert make_shape_id(strip_values(other)) != make_shape_id(strip_values(QUERY))
+
+
+def test_searches_profiler_count_aggregations():
+    from encoded.searches.profiler import count_aggregations
+    assert count_aggregations(QUERY) == 3
+    assert count_aggregations({'query': {'match_all': {}}}) == 0
+
+
+def test_searches_profiler_split_msearch():
+    from encoded.searches.profiler import split_searches
+    body = '\n'.join([
+        json.dumps({'index': 'experiment'}),
+        json.dumps(QUERY),
+        json.dumps({}),
+        json.dumps({'size': 0}),
+    ]) + '\n'
+    response = json.dumps({'responses': [make_response(5), make_response(7)]})
+    searches = split_searches('/snovault/_msearch', body, response)
+    assert [(path, result['took']) for path, _, result in searches] == [
+        ('/experiment/_search', 5),
+        ('/snovault/_search', 7),
+    ]
+    assert searches[1][1] == {'size': 0}
+
+
+def test_searches_profiler_slowest_shapes():
+    from encoded.searches.profiler import QueryCapture
+    now = [0.0]
+    capture = QueryCapture(window=3, clock=lambda: now[0])
+    capture.start(duration=60)
+    assert capture.running
+    capture.record('search', '/snovault/_search', {'size': 1}, make_response(50, 3))
+    capture.record('search', '/snovault/_search', QUERY, make_response(10))
+    capture.record('matrix', '/snovault/_search', QUERY, make_response(30, total={'value': 20}))
+    capture.record('report', '/snovault/_search', {'size': 2}, make_response(5))
+    capture.record('search', '/snovault/_search', dict(QUERY, profile=True), make_response(1000))
+    slowest = capture.slowest()
+    assert [item['took_total'] for item in slowest] == [40, 5]
+    assert slowest[0]['routes'] == {'search': 1, 'matrix': 1}
+    assert slowest[0]['hits_max'] == 20
+    assert slowest[0]['aggregations'] == 3
+    assert capture.status()['searches'] == 4
+    now[0] = 61.0
+    assert not capture.running
+
+
+
+def test_searches_profiler_keeps_latest_query_per_shape():
+    from encoded.searches.profiler import QueryCapture, make_shape_id, strip_values
+    capture = QueryCapture(window=3)
+    capture.start()
+    other = json.loads(json.dumps(QUERY))
+    other['query']['bool']['filter'][0]['terms']['embedded.status'] = ['released']
+    capture.record('search', '/snovault/_search', QUERY, make_response(10))
+    capture.record('search', '/experiment/_search', other, make_response(20))
+    assert all('query' not in sample for sample in capture.samples)
+    assert len(capture.queries) == 1
+    assert capture.latest(make_shape_id(strip_values(QUERY))) == ('/experiment/_search', other)
+
+
+class FakeTransport:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def perform_request(self, method, url, params=None, body=None):
+        self.calls.append((method, url, params, body))
+        return self.result
+
+
+class FakeClient:
+    def __init__(self, result):
+        self.transport = FakeTransport(result)
+
+
+def test_searches_profiler_profile():
+    from encoded.searches.profiler import QueryCapture, make_shape_id, strip_values
+    capture = QueryCapture()
+    capture.start()
+    capture.record('search', '/snovault/_search?request_cache=true', QUERY, make_response(10))
+    result = dict(make_response(12), profile={'shards': [
+        {
+            'searches': [{'query': [{
+                'type': 'BooleanQuery',
+                'description': '+embedded.status:released',
+                'time_in_nanos': 3000000,
+                'children': [{'type': 'TermQuery', 'description': 'embedded.status:released', 'time_in_nanos': 1000000}],
+            }]}],
+            'aggregations': [{
+                'type': 'GlobalOrdinalsStringTermsAggregator',
+                'description': 'assay_title',
+                'time_in_nanos': 5000000,
+            }],
+        },
+    ]})
+    client = FakeClient(result)
+    shape_id = make_shape_id(strip_values(QUERY))
+    summary = capture.profile(client, shape_id)
+    method, url, params, body = client.transport.calls[0]
+    assert (method, url, params) == ('POST', '/snovault/_search', {'request_cache': 'true'})
+    assert body['profile'] is True
+    assert summary['took'] == 12
+    assert summary['shards'] == 1
+    assert [item['type'] for item in summary['query']] == ['BooleanQuery', 'TermQuery']
+    assert summary['aggregation'][0]['time_ms'] == 5.0
+    with pytest.raises(KeyError):
+        capture.profile(client, 'unknown')
+
+
+def test_searches_profiler_capture_searches():
+    from types import SimpleNamespace
+    from pyramid.threadlocal import manager
+    from encoded.searches.interfaces import ES_QUERY_CAPTURE
+    from encoded.searches.profiler import QueryCapture, capture_searches
+    capture = QueryCapture()
+    request = SimpleNamespace(
+        registry={ES_QUERY_CAPTURE: capture},
+        matched_route=SimpleNamespace(name='search'),
+    )
+    manager.push({'request': request, 'registry': request.registry})
+    try:
+        capture_searches('/snovault/_search', json.dumps(QUERY).encode('utf-8'), json.dumps(make_response(9)))
+        capture.start()
+        capture_searches('/snovault/_doc/1', b'{}', '{}')
+        capture_searches('/snovault/_search', json.dumps(QUERY).encode('utf-8'), json.dumps(make_response(9)))
+    finally:
+        manager.pop()
+    assert [(sample['route'], sample['took']) for sample in capture.samples] == [('search', 9)]
+
@@ -52,3 +52,64 @@ def test_test_accession_server_defaults(admin, test_accession_anontestapp):
         res.location, {}, status=200,
         extra_environ=extra_environ,
     )
+
+
+def test_accession_pool_skips_taken_accessions():
+    from itertools import count
+    from encoded.server_defaults import AccessionPool
+    numbers = count()
+
+    def factory(accession_type):
+        return 'TST%s%06d' % (accession_type, next(numbers) % 8)
+
+    taken = {'TSTAB000001', 'TSTAB000002'}
+    pool = AccessionPool(None, factory, block_size=8)
+    pool.reserve('AB', lambda candidates: taken.intersection(candidates))
+    issued = {pool.get('AB') for _ in range(6)}
+    assert len(issued) == 6
+    assert not issued & taken
+    stats = pool.stats()['AB']
+    assert stats['depth'] == 0
+    assert stats['collisions'] == 2
+    assert stats['issued'] == 6
+    assert stats['collision_rate'] == 0.25
+
+
+def test_accession_pool_expires_old_accessions():
+    from encoded.server_defaults import AccessionPool, test_accession
+    pool = AccessionPool(None, test_accession, block_size=4, max_age=-1)
+    pool.reserve('AB', lambda candidates: set())
+    assert pool._pop('AB') is None
+    assert pool.stats()['AB']['expired'] == 4
+
+
+def test_accession_pool_rechecks_pooled_accessions_on_reserve():
+    from encoded.server_defaults import AccessionPool, test_accession
+    pool = AccessionPool(None, test_accession, block_size=4)
+    pool.reserve('AB', lambda candidates: set())
+    first = pool._pools['AB'][0][0]
+    checked = []
+
+    def taken(accessions):
+        checked.extend(accessions)
+        return {first}
+
+    pool.reserve('AB', taken)
+    assert first in checked
+    assert first not in [accession for accession, reserved_at in pool._pools['AB']]
+    stats = pool.stats()['AB']
+    assert stats['conflicts'] == 1
+    assert stats['depth'] >= 7
+
+
+def test_accession_pool_server_default(admin, anontestapp, testapp):
+    extra_environ = {'REMOTE_USER': str(admin['email'])}
+    accessions = {
+        anontestapp.post_json(
+            '/testing_server_default', {}, status=201, extra_environ=extra_environ,
+        ).json['@graph'][0]['accession']
+        for _ in range(3)
+    }
+    assert len(accessions) == 3
+    res = testapp.get('/_accession_pool')
+    assert res.json['accession_types']['AB']['issued'] >= 3
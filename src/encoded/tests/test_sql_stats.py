@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+
+def test_statement_shape():
+    from encoded.sql_stats import statement_shape
+    assert statement_shape(
+        'SELECT resources.rid\nFROM resources\nWHERE resources.rid IN (%(rid_1)s, %(rid_2)s,  %(rid_3)s)'
+    ) == 'SELECT resources.rid FROM resources WHERE resources.rid IN (?, ...)'
+    assert statement_shape('SELECT * FROM keys WHERE name = %(name_1)s AND value = %s') == (
+        'SELECT * FROM keys WHERE name = ? AND value = ?')
+
+
+def test_sql_stats_counts_repeated_shapes():
+    from pyramid.threadlocal import manager
+    from sqlalchemy import create_engine
+    from encoded.sql_stats import RequestStatements, SQLStats, listen
+    engine = create_engine('sqlite://')
+    sql_stats = SQLStats(n_plus_one=3)
+    listen(engine, sql_stats)
+    request = SimpleNamespace(_sql_statements=RequestStatements(), _stats={}, registry=None)
+    manager.push({'request': request, 'registry': None})
+    try:
+        with engine.connect() as connection:
+            for value in range(4):
+                connection.execute('SELECT ?', (value,))
+            connection.execute('SELECT 1, 2')
+    finally:
+        manager.pop()
+    assert request._stats['db_shapes'] == 2
+    assert request._stats['db_repeated'] == 3
+    sql_stats.record('item', request._sql_statements, db_time=50)
+    sql_stats.record('item', RequestStatements(), db_time=10)
+    route = sql_stats.routes()['item']
+    assert route['requests'] == 2
+    assert route['statements'] == 5
+    assert route['max_statements'] == 5
+    assert route['n_plus_one_requests'] == 1
+    assert route['db_time_per_request'] == 30
+    assert route['shapes'] == [{'shape': 'SELECT ?', 'repeats': 4}]
+
+
+def test_calling_property():
+    import sys
+    from encoded.sql_stats import calling_property
+
+    def biological_replicates():
+        return calling_property(codes, sys._getframe())
+
+    codes = {biological_replicates.__code__: 'File.biological_replicates'}
+    assert biological_replicates() == 'File.biological_replicates'
+    assert calling_property(codes, sys._getframe()) is None
+
+
+def test_sql_stats_view(testapp):
+    testapp.get('/')
+    res = testapp.get('/_sql_stats')
+    assert res.json['n_plus_one'] == 10
+    assert 'routes' in res.json
@@ -0,0 +1,42 @@
+def includeme(config):
+    config.registry['included'] = True
+
+
+def nested_includeme(config):
+    config.include(includeme)
+
+
+def test_startup_timing_wraps_include():
+    from pyramid.config import Configurator
+    from encoded.startup_timing import StartupTiming
+    timing = StartupTiming()
+    config = timing.wrap_include(Configurator(settings={}))
+    config.include('encoded.tests.test_startup_timing')
+    config.include(includeme)
+    config.include(nested_includeme)
+    assert config.registry['included']
+    assert [name for name, _ in timing.steps] == [
+        'include encoded.tests.test_startup_timing',
+        'include includeme',
+        'include nested_includeme',
+    ]
+
+
+def test_startup_timing_summary():
+    from encoded.startup_timing import StartupTiming
+    now = [0.0]
+    timing = StartupTiming(clock=lambda: now[0])
+
+    def step(seconds):
+        now[0] += seconds
+
+    timing.time('fast', step, 1.0)
+    timing.time('slow', step, 3.0)
+    timing.finish()
+    now[0] += 10.0
+    summary = timing.summary()
+    assert summary['total'] == 4.0
+    assert summary['steps'] == [('slow', 3.0), ('fast', 1.0)]
+    assert 'commit' in summary['note']
+    assert timing.summary(top=1)['steps'] == [('slow', 3.0)]
+
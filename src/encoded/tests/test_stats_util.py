@@ -0,0 +1,18 @@
+def test_percentile():
+    from encoded.stats_util import percentile
+    assert percentile([], 0.5) is None
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.5) == 2.5
+    assert percentile([1, 2, 3, 4], 1.0) == 4
+
+
+def test_route_name():
+    from types import SimpleNamespace
+    from encoded.stats_util import route_name
+
+    class Item:
+        pass
+
+    assert route_name(SimpleNamespace(matched_route=SimpleNamespace(name='search'))) == 'search'
+    assert route_name(SimpleNamespace(matched_route=None, context=Item(), view_name='object')) == 'Item@@object'
+    assert route_name(SimpleNamespace(matched_route=None, context=None)) is None
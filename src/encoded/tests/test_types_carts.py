@@ -64,6 +64,16 @@ def test_get_carts_by_user(cart, submitter, dummy_request, threadlocals):
     assert carts[0]['@id'] == cart['@id']
 
 
+def test_get_carts_by_user_filters_and_counts(cart, deleted_cart, other_cart, submitter, dummy_request, threadlocals):
+    from encoded.cart_view import get_cart_objects_by_user
+    userid = submitter['uuid']
+    carts = get_cart_objects_by_user(dummy_request, userid)
+    assert sorted(c['@id'] for c in carts) == sorted([cart['@id'], deleted_cart['@id']])
+    assert all(c['element_count'] == 0 and 'elements' not in c for c in carts)
+    carts = get_cart_objects_by_user(dummy_request, userid, blocked_statuses=['deleted'])
+    assert [c['@id'] for c in carts] == [cart['@id']]
+
+
 def test_create_cart(dummy_request, threadlocals, submitter):
     from encoded.types.cart import _create_cart
     user = dummy_request.root.get_by_uuid(submitter['uuid'])
@@ -107,29 +117,6 @@ def test_cart_object_get_carts_from_params(dummy_request):
     assert cart._get_carts_from_params() == ['abc123', 'def456']
 
 
-def test_cart_get_cart_object_or_error(cart, submitter, experiment, dummy_request, threadlocals, testapp):
-    testapp.patch_json(
-        cart['@id'],
-        {'elements': [experiment['@id']]}
-    )
-    from encoded.cart_view import Cart
-    c = Cart(dummy_request, uuids=[cart['uuid']])
-    cart_object = c._get_cart_object_or_error(cart['uuid'])
-    assert cart_object.get('@id') == cart['@id']
-    with pytest.raises(KeyError):
-        c._get_cart_object_or_error('abc')
-
-def test_cart_try_to_get_cart_object(cart, submitter, experiment, dummy_request, threadlocals, testapp):
-    testapp.patch_json(
-        cart['@id'],
-        {'elements': [experiment['@id']]}
-    )
-    from encoded.cart_view import Cart
-    c = Cart(dummy_request, uuids=[cart['uuid']])
-    cart_object = c._try_to_get_cart_object(cart['uuid'])
-    assert cart_object.get('@id') == cart['@id']
-    assert c._try_to_get_cart_object('abc') == {}
-
 def test_cart_object_try_to_get_elements_from_cart(cart, submitter, experiment, dummy_request, threadlocals, testapp):
     testapp.patch_json(
         cart['@id'],
@@ -249,14 +236,53 @@ def test_cart_object_two_carts(cart, submitter, experiment, dummy_request, threa
     assert c.as_params() == [
         ('@id', experiment['@id'])
     ]
-    assert dummy_request.embed.call_count == 2
+    # The uuid and @id resolve to the same cart version
+    assert dummy_request.embed.call_count == 1
     # Cache value
     assert c.as_params() == [
         ('@id', experiment['@id'])
     ]
+    assert dummy_request.embed.call_count == 1
+
+
+def test_cart_resolver_reused_until_cart_changes(cart, submitter, experiment, dummy_request, threadlocals, testapp, mocker):
+    testapp.patch_json(
+        cart['@id'],
+        {'elements': [experiment['@id']]}
+    )
+    from encoded.cart_view import Cart
+    mocker.spy(dummy_request, 'embed')
+    dummy_request.environ['QUERY_STRING'] = (
+        f'cart={cart["uuid"]}'
+    )
+    assert list(Cart(dummy_request).elements) == [experiment['@id']]
+    assert list(Cart(dummy_request).elements) == [experiment['@id']]
+    assert dummy_request.embed.call_count == 1
+    testapp.patch_json(
+        cart['@id'],
+        {'elements': []}
+    )
+    assert list(Cart(dummy_request).elements) == []
     assert dummy_request.embed.call_count == 2
 
 
+
+def test_cart_resolver_checks_view_permission_on_cache_hit(cart, submitter, experiment, dummy_request, threadlocals, testapp, mocker):
+    from pyramid.httpexceptions import HTTPForbidden
+    from encoded.cart_view import CartElementsCache, CartResolver
+    testapp.patch_json(
+        cart['@id'],
+        {'elements': [experiment['@id']], 'status': 'deleted'}
+    )
+    cache = CartElementsCache()
+    resolver = CartResolver(dummy_request, cache=cache)
+    item, version = resolver._get_version(cart['uuid'])
+    cache.set(version, (experiment['@id'],))
+    mocker.patch.object(dummy_request, 'embed', side_effect=HTTPForbidden())
+    with pytest.raises(HTTPForbidden):
+        resolver.get_elements(cart['uuid'])
+    assert dummy_request.embed.call_count == 1
+
 def test_cart_with_elements_object_init(dummy_request):
     from encoded.cart_view import CartWithElements
     cart = CartWithElements(dummy_request)
@@ -271,19 +297,6 @@ def test_cart_with_elements_object_init(dummy_request):
     cart.max_cart_elements == 5
 
 
-def test_cart_with_elements_object_try_to_get_cart_object(cart, submitter, experiment, dummy_request, threadlocals, testapp):
-    testapp.patch_json(
-        cart['@id'],
-        {'elements': [experiment['@id']]}
-    )
-    from encoded.cart_view import CartWithElements
-    c = CartWithElements(dummy_request, uuids=[cart['uuid']])
-    cart_object = c._try_to_get_cart_object(cart['uuid'])
-    assert cart_object.get('@id') == cart['@id']
-    with pytest.raises(HTTPBadRequest):
-        c._try_to_get_cart_object('abc')
-
-
 def test_cart_with_elements_object_try_to_get_elements_from_cart(cart, submitter, experiment, dummy_request, threadlocals, testapp):
     testapp.patch_json(
         cart['@id'],
@@ -0,0 +1,69 @@
+import pytest
+
+
+def make_upgrader():
+    from encoded.upgrade import CompiledSchemaUpgrader
+    upgrader = CompiledSchemaUpgrader('thing', '3')
+
+    def step_1_2(value, system):
+        value['steps'].append('1-2')
+
+    def step_2_3(value, system):
+        value['steps'].append('2-3')
+
+    upgrader.add_upgrade_step(step_1_2, '1', '2')
+    upgrader.add_upgrade_step(step_2_3, '2', '3')
+    return upgrader
+
+
+def test_compiled_upgrader_reuses_chain(mocker):
+    upgrader = make_upgrader()
+    compile_chain = mocker.spy(upgrader, 'compile_chain')
+    assert upgrader.upgrade({'steps': []}, '1')['steps'] == ['1-2', '2-3']
+    assert upgrader.upgrade({'steps': []}, '1')['steps'] == ['1-2', '2-3']
+    assert upgrader.upgrade({'steps': []}, '2')['steps'] == ['2-3']
+    assert compile_chain.call_count == 2
+
+
+def test_compiled_upgrader_errors():
+    from snovault.upgrader import (
+        UpgradePathNotFound,
+        VersionTooHigh,
+    )
+    upgrader = make_upgrader()
+    with pytest.raises(VersionTooHigh):
+        upgrader.upgrade({'steps': []}, '4')
+    with pytest.raises(UpgradePathNotFound):
+        upgrader.upgrade({'steps': []}, '', '3')
+
+
+def test_upgrade_counter_skips_batch_upgrade():
+    import transaction
+    from encoded.upgrade import upgrade_counter
+    upgrader = make_upgrader()
+    upgrade_counter.clear()
+    upgrader.upgrade({'steps': []}, '1')
+    upgrader.upgrade({'steps': []}, '3')
+    transaction.get().setExtendedInfo('upgrade', True)
+    try:
+        upgrader.upgrade({'steps': []}, '2')
+    finally:
+        transaction.abort()
+    assert upgrade_counter.as_dict() == {
+        'total': 1,
+        'upgrades': [{'type': 'thing', 'from': '1', 'to': '3', 'count': 1}],
+    }
+
+
+def test_upgrader_is_compiled(upgrader):
+    from encoded.upgrade import CompiledSchemaUpgrader
+    assert isinstance(upgrader['award'], CompiledSchemaUpgrader)
+
+
+def test_upgrade_stats_view(testapp, upgrader, award_1):
+    from encoded.upgrade import upgrade_counter
+    upgrade_counter.clear()
+    upgrader.upgrade('award', award_1, target_version='2')
+    res = testapp.get('/_upgrade_stats')
+    assert res.json['total'] == 1
+    assert res.json['upgrades'][0]['type'] == 'award'
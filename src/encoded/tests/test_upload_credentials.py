@@ -4,7 +4,7 @@ Tests for upload_credential.py
 """
 from unittest import TestCase
 
-import pytest  # pylint: disable=import-error, unused-import
+import pytest  # pylint: disable=import-error
 
 from moto import mock_sts  # pylint: disable=import-error, unused-import
 
@@ -20,6 +20,20 @@ from encoded.upload_credentials import  (
 CREDS_DATA_PATH = 'src/encoded/tests/data/upload_credentials'
 
 
+@pytest.fixture(autouse=True)
+def reset_upload_credentials_caches():
+    '''
+    The sts clients and policies are cached per process, a client built
+    under one moto mock must not be reused by the next test
+    '''
+    from encoded import upload_credentials
+    upload_credentials._STS_CLIENTS.clear()
+    upload_credentials._EXTERNAL_POLICIES.clear()
+    yield
+    upload_credentials._STS_CLIENTS.clear()
+    upload_credentials._EXTERNAL_POLICIES.clear()
+
+
 def test_save_policy_json():
     '''
     Tests the save json functionality
@@ -428,3 +442,51 @@ class TestUploadCredentials(TestCase):
             upload_credentials['upload_url'],
             upload_creds._upload_url
         )
+
+
+def test_load_external_bucket_policy_reloads_on_change(tmpdir, mocker):
+    '''
+    Tests the policy is parsed once and rebuilt when the bucket list changes
+    '''
+    import os
+    from encoded import upload_credentials
+    from encoded.upload_credentials import _load_external_bucket_policy
+    bucket_list = tmpdir.join('external_bucket_list')
+    bucket_list.write('test-bucket-one\n')
+    get_policy = mocker.spy(upload_credentials, '_get_external_bucket_policy')
+    first = _load_external_bucket_policy(str(bucket_list))
+    assert _load_external_bucket_policy(str(bucket_list)) is first
+    assert get_policy.call_count == 1
+    bucket_list.write('test-bucket-one\ntest-bucket-two\n')
+    mtime = os.stat(str(bucket_list) + '.json').st_mtime
+    os.utime(str(bucket_list), (mtime + 10, mtime + 10))
+    second = _load_external_bucket_policy(str(bucket_list))
+    assert get_policy.call_count == 2
+    assert len(second['Statement'][0]['Resource']) == 2
+
+
+
+def test_load_external_bucket_policy_rebuilds_corrupt_json(tmpdir):
+    '''
+    Tests a json newer than the bucket list that does not parse is rebuilt
+    '''
+    import os
+    from encoded.upload_credentials import _load_external_bucket_policy
+    bucket_list = tmpdir.join('external_bucket_list')
+    bucket_list.write('test-bucket-one\n')
+    policy_json = tmpdir.join('external_bucket_list.json')
+    policy_json.write('{"Version": ')
+    mtime = os.stat(str(bucket_list)).st_mtime
+    os.utime(str(policy_json), (mtime + 10, mtime + 10))
+    policy = _load_external_bucket_policy(str(bucket_list))
+    assert len(policy['Statement'][0]['Resource']) == 1
+    assert _load_external_bucket_policy(str(bucket_list)) is policy
+
+
+@mock_sts
+def test_get_sts_client_is_reused():
+    '''
+    Tests one sts client is built per profile
+    '''
+    from encoded.upload_credentials import _get_sts_client
+    assert _get_sts_client() is _get_sts_client()
@@ -0,0 +1,38 @@
+import datetime
+import io
+
+
+def make_workbook(rows, title='Sheet'):
+    import openpyxl
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.title = title
+    for row in rows:
+        sheet.append(row)
+    stream = io.BytesIO()
+    book.save(stream)
+    stream.seek(0)
+    return stream
+
+
+def test_xlreader_reads_rows_as_strings():
+    from encoded.xlreader import reader
+    stream = make_workbook([
+        ['name', 'count', 'ratio', 'flag', 'date', 'note'],
+        ['a', 2, 1.5, True, datetime.datetime(2020, 1, 2)],
+    ])
+    assert list(reader(stream)) == [
+        ['name', 'count', 'ratio', 'flag', 'date', 'note'],
+        ['a', '2', '1.5', 'TRUE', '2020-01-02', ''],
+    ]
+
+
+def test_xlreader_dict_reader_named_sheet():
+    from encoded.xlreader import DictReader
+    stream = make_workbook([['uuid', 'title'], ['1', 'one'], ['2', '']], title='lab')
+    assert list(DictReader(stream, sheetname='lab')) == [
+        {'uuid': '1', 'title': 'one'},
+        {'uuid': '2', 'title': ''},
+    ]
+    stream.seek(0)
+    assert list(DictReader(stream, sheetname='missing')) == []
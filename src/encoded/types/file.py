@@ -1,5 +1,4 @@
 from botocore.exceptions import ClientError
-from botocore.config import Config
 from snovault import (
     AfterModified,
     BeforeModified,
@@ -30,13 +29,13 @@ from urllib.parse import (
 )
 import base64
 import boto3
-import botocore
 import datetime
 import logging
 import json
 import pytz
 import time
 
+from encoded.s3_signer import S3_SIGNER
 from encoded.upload_credentials import UploadCredentials
 from snovault.util import ensure_list_and_filter_none
 from snovault.util import take_one_or_return_none
@@ -617,17 +616,7 @@ class File(Item):
             external = self._get_external_sheet()
         except HTTPNotFound:
             return None
-        conn = boto3.client('s3', config=Config(
-            signature_version=botocore.UNSIGNED,
-        ))
-        location = conn.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={
-                'Bucket': external['bucket'],
-                'Key': external['key']
-            },
-            ExpiresIn=0
-        )
+        location = self.registry[S3_SIGNER].unsigned_url(external['bucket'], external['key'])
         return {
             'url': location,
             'md5sum_base64': base64.b64encode(bytes.fromhex(md5sum)).decode("utf-8"),
@@ -1072,16 +1061,8 @@ def download(context, request):
             raise HTTPNotFound(_filename)
     external = context.propsheets.get('external', {})
     if external.get('service') == 's3':
-        conn = boto3.client('s3')
-        location = conn.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={
-                'Bucket': external['bucket'],
-                'Key': external['key'],
-                'ResponseContentDisposition': 'attachment; filename=' + filename
-            },
-            ExpiresIn=36*60*60
-        )
+        location = request.registry[S3_SIGNER].download_url(
+            external['bucket'], external['key'], filename)
     else:
         raise HTTPNotFound(
             detail='External service {} not expected'.format(external.get('service'))
@@ -1,14 +1,26 @@
+from collections import Counter
+from pkg_resources import parse_version
 from pyramid.interfaces import PHASE2_CONFIG
+from pyramid.view import view_config
 from snovault import (
     TYPES,
     UPGRADER,
 )
-from snovault.upgrader import default_upgrade_finalizer
+from snovault.upgrader import (
+    SchemaUpgrader,
+    UpgradePathNotFound,
+    VersionTooHigh,
+    default_upgrade_finalizer,
+)
+from snovault.util import get_root_request
+import threading
+import transaction
 
 LATE = 10
 
 
 def includeme(config):
+    config.add_route('_upgrade_stats', '/_upgrade_stats')
     config.scan()
 
     def callback():
@@ -36,6 +48,16 @@ def includeme(config):
 
     config.action('add_default_upgrades', default_upgrades, order=LATE)
 
+    def compile_upgrades():
+        """ swap in upgraders that remember their upgrade paths
+        """
+        upgrader = config.registry[UPGRADER]
+        for name, schema_upgrader in list(upgrader.schema_upgraders.items()):
+            upgrader.schema_upgraders[name] = CompiledSchemaUpgrader.from_upgrader(
+                schema_upgrader)
+
+    config.action('compile_upgrades', compile_upgrades, order=LATE + 1)
+
 
 @default_upgrade_finalizer
 def finalizer(value, system, version):
@@ -45,3 +67,133 @@ def finalizer(value, system, version):
 
 def run_finalizer(value, system):
     pass
+
+
+class UpgradeCounter(object):
+    """ Count of in memory upgrades per (type, from version, to version)
+    """
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def add(self, name, current_version, target_version):
+        with self.lock:
+            self.counts[(name, current_version, target_version)] += 1
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+    def as_dict(self):
+        with self.lock:
+            counts = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return {
+            'total': sum(count for _, count in counts),
+            'upgrades': [
+                {
+                    'type': name,
+                    'from': current_version,
+                    'to': target_version,
+                    'count': count,
+                }
+                for (name, current_version, target_version), count in counts
+            ],
+        }
+
+
+upgrade_counter = UpgradeCounter()
+
+
+def record_upgrade(name, current_version, target_version):
+    # Upgrades persisted by batch_upgrade are not request path upgrades.
+    if transaction.get().extension.get('upgrade'):
+        return
+    upgrade_counter.add(name, current_version, target_version)
+    request = get_root_request()
+    stats = getattr(request, '_stats', None)
+    if stats is not None:
+        stats['upgrade_count'] = stats.get('upgrade_count', 0) + 1
+
+
+class CompiledSchemaUpgrader(SchemaUpgrader):
+    """ SchemaUpgrader that finds the steps from one version to another once
+
+    Old items are upgraded in memory every time their properties are used,
+    so the path through upgrade_steps is kept per (current, target) version.
+    """
+    def __init__(self, name, version, finalizer=None):
+        super(CompiledSchemaUpgrader, self).__init__(name, version, finalizer)
+        self.chains = {}
+
+    @classmethod
+    def from_upgrader(cls, schema_upgrader):
+        compiled = cls(
+            schema_upgrader.__name__, schema_upgrader.version, schema_upgrader.finalizer)
+        compiled.upgrade_steps = schema_upgrader.upgrade_steps
+        return compiled
+
+    def add_upgrade_step(self, step, source='', dest=None):
+        super(CompiledSchemaUpgrader, self).add_upgrade_step(step, source, dest)
+        self.chains.clear()
+
+    def compile_chain(self, current_version, target_version):
+        if parse_version(current_version) > parse_version(target_version):
+            raise VersionTooHigh(self.__name__, current_version, target_version)
+
+        steps = []
+        version = current_version
+
+        # If no entry exists for the current_version, fallback to ''
+        if parse_version(version) not in self.upgrade_steps:
+            step = self.upgrade_steps.get(parse_version(''))
+            if step is not None and parse_version(step.dest) >= parse_version(version):
+                steps.append(step)
+                version = step.dest
+
+        while parse_version(version) < parse_version(target_version):
+            step = self.upgrade_steps.get(parse_version(version))
+            if step is None:
+                break
+            steps.append(step)
+            version = step.dest
+
+        if version != target_version:
+            raise UpgradePathNotFound(
+                self.__name__, current_version, target_version, version)
+
+        return tuple(steps), version
+
+    def upgrade(self, value, current_version='', target_version=None, **kw):
+        if target_version is None:
+            target_version = self.version
+
+        key = (current_version, target_version)
+        chain = self.chains.get(key)
+        if chain is None:
+            chain = self.chains[key] = self.compile_chain(current_version, target_version)
+        steps, version = chain
+        if current_version != target_version:
+            record_upgrade(self.__name__, current_version, target_version)
+
+        system = {}
+        system.update(kw)
+
+        for step in steps:
+            next_value = step(value, system)
+            if next_value is not None:
+                value = next_value
+
+        if self.finalizer is not None:
+            next_value = self.finalizer(value, system, version)
+            if next_value is not None:
+                value = next_value
+
+        return value
+
+
+@view_config(route_name='_upgrade_stats', request_method='GET', permission='index')
+def upgrade_stats(context, request):
+    """ In memory upgrades made by this process since it started
+    """
+    request.response.headers['Cache-Control'] = 'no-cache'
+    return upgrade_counter.as_dict()
@@ -3,6 +3,8 @@ Helper class to create user credentials to upload files to s3
 """
 import copy
 import json
+import os
+import threading
 
 import boto3
 import botocore
@@ -21,6 +23,9 @@ EXTERNAL_BUCKET_STATEMENTS = [
     },
 ]
 _FEDERATION_TOKEN_DURATION_SECONDS = 36 * 60 * 60
+_CACHE_LOCK = threading.Lock()
+_STS_CLIENTS = {}
+_EXTERNAL_POLICIES = {}
 
 
 def _compile_statements_from_list(buckets_list):
@@ -39,8 +44,11 @@ def _compile_statements_from_list(buckets_list):
 
 
 def _save_policy_json(policy_json, file_path):
-    with open(file_path + '.json', 'w') as file_handler:
+    # Written aside and renamed so a reader never sees a partial file
+    tmp_path = file_path + '.json.tmp'
+    with open(tmp_path, 'w') as file_handler:
         json.dump(policy_json, file_handler)
+    os.replace(tmp_path, file_path + '.json')
 
 
 def _build_external_bucket_json(file_path):
@@ -72,6 +80,56 @@ def _get_external_bucket_policy(file_path):
         return None
 
 
+def _get_mtime(file_path):
+    try:
+        return os.stat(file_path).st_mtime
+    except FileNotFoundError:  # pylint: disable=undefined-variable
+        return None
+
+
+def _load_external_bucket_policy(file_path):
+    '''
+    Cached _get_external_bucket_policy, building the json first if it is
+    missing or older than the bucket list. Reloaded when either file changes,
+    and rebuilt from the bucket list when the json does not parse.
+    '''
+    list_mtime = _get_mtime(file_path)
+    json_mtime = _get_mtime(file_path + '.json')
+    if list_mtime is not None and (json_mtime is None or list_mtime > json_mtime):
+        _build_external_bucket_json(file_path)
+        json_mtime = _get_mtime(file_path + '.json')
+    version = (list_mtime, json_mtime)
+    with _CACHE_LOCK:
+        cached = _EXTERNAL_POLICIES.get(file_path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    try:
+        external_policy = _get_external_bucket_policy(file_path)
+    except ValueError:
+        if list_mtime is None:
+            raise
+        _build_external_bucket_json(file_path)
+        version = (list_mtime, _get_mtime(file_path + '.json'))
+        external_policy = _get_external_bucket_policy(file_path)
+    with _CACHE_LOCK:
+        _EXTERNAL_POLICIES[file_path] = (version, external_policy)
+    return external_policy
+
+
+def _get_sts_client(profile_name=None):
+    '''
+    One sts client per profile and process, boto3 clients are thread safe
+    '''
+    conn = _STS_CLIENTS.get(profile_name)
+    if conn is None:
+        with _CACHE_LOCK:
+            conn = _STS_CLIENTS.get(profile_name)
+            if conn is None:
+                conn = boto3.Session(profile_name=profile_name).client('sts')
+                _STS_CLIENTS[profile_name] = conn
+    return conn
+
+
 class UploadCredentials(object):
     # pylint: disable=too-few-public-methods
     '''
@@ -116,7 +174,7 @@ class UploadCredentials(object):
 
     def _get_token(self, policy):
         try:
-            conn = boto3.Session(profile_name=self._profile_name).client('sts')
+            conn = _get_sts_client(self._profile_name)
         except botocore.exceptions.ProfileNotFound as ecp:
             print('Warning: ', ecp)
             return None
@@ -133,10 +191,7 @@ class UploadCredentials(object):
 
     def _check_external_policy(self, s3_transfer_allow, s3_transfer_buckets):
         if s3_transfer_allow and s3_transfer_buckets:
-            external_policy = _get_external_bucket_policy(s3_transfer_buckets)
-            if not isinstance(external_policy, dict):
-                _build_external_bucket_json(s3_transfer_buckets)
-                external_policy = _get_external_bucket_policy(s3_transfer_buckets)
+            external_policy = _load_external_bucket_policy(s3_transfer_buckets)
             if external_policy:
                 self._external_policy = external_policy
 
@@ -1,10 +1,14 @@
-"""csv compatible interface for xlrd sheets
+"""csv compatible interface for xlsx sheets
+
+Rows are streamed with openpyxl in read only mode. xlrd_reader loads the
+whole workbook and is kept for legacy xls files only.
 """
 
 import csv
 import datetime
 import os.path
 import xlrd
+import openpyxl
 import zipfile
 
 
@@ -37,21 +41,77 @@ def cell_value(cell, datemode):
 
 
 
+def openpyxl_cell_value(value):
+    """ Format openpyxl values the same way as cell_value formats xlrd cells
+    """
+    if value is None:
+        return ''
+
+    elif isinstance(value, bool):
+        return str(value).upper()
+
+    elif isinstance(value, (int, float)):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value)
+
+    elif isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0):
+            return value.date().isoformat()
+        return value.isoformat()
+
+    elif isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+
+    return value
+
+
+def openpyxl_reader(stream, sheetname=None):
+    """ Read rows one at a time without loading the whole workbook
+    """
+    book = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        if sheetname is None:
+            sheet, = book.worksheets
+        else:
+            try:
+                sheet = book[sheetname]
+            except KeyError:
+                return
+        # Rows are padded to the sheet width, as xlrd does.
+        for row in sheet.iter_rows(values_only=True):
+            yield [openpyxl_cell_value(value) for value in row]
+    finally:
+        book.close()
+
+
+def xlrd_reader(stream, sheetname=None):
+    # Loads the whole workbook, use reader for xlsx files.
+    filename = getattr(stream, 'name', None)
+    if isinstance(filename, str) and os.path.isfile(filename):
+        book = xlrd.open_workbook(filename)
+    else:
+        book = xlrd.open_workbook(file_contents=stream.read())
+    try:
+        if sheetname is None:
+            sheet, = book.sheets()
+        else:
+            try:
+                sheet = book.sheet_by_name(sheetname)
+            except xlrd.XLRDError:
+                return
+
+        datemode = sheet.book.datemode
+        for index in range(sheet.nrows):
+            yield [cell_value(cell, datemode) for cell in sheet.row(index)]
+    finally:
+        book.release_resources()
+
+
 def reader(stream, sheetname=None):
     """ Read named sheet or first and only sheet from xlsx file
     """
-    book = xlrd.open_workbook(file_contents=stream.read())
-    if sheetname is None:
-        sheet, = book.sheets()        
-    else:
-        try:
-            sheet = book.sheet_by_name(sheetname)
-        except xlrd.XLRDError:
-            return
-
-    datemode = sheet.book.datemode
-    for index in range(sheet.nrows):
-        yield [cell_value(cell, datemode) for cell in sheet.row(index)]
+    return openpyxl_reader(stream, sheetname)
 
 
 class DictReader: